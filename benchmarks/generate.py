@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+Generate synthetic WDL workflows for benchmarking the conversion to Vidarr.
+
+    pipenv run python benchmarks/generate.py -o /tmp/synthetic --inputs 100 --outputs 100 --tasks 10
+"""
+
+import argparse
+import os
+from typing import Dict
+
+
+def generate(inputs: int, outputs: int, tasks: int, struct_depth: int, imports: int, labels: int) -> Dict[str, str]:
+    """
+    Create the source files for a synthetic workflow
+
+    The root workflow, ``synthetic.wdl``, has the requested number of workflow inputs, workflow outputs, tasks that it
+    calls, nested struct definitions (used as an input), imported files (each with a task that is also called), and
+    outputs with a ``vidarr_label``.
+
+    :return: the source text of each file, by path relative to the root workflow
+    """
+    tasks = max(tasks, 1)
+    files = {}
+    lines = ["version 1.0", ""]
+    for i in range(imports):
+        lines.append(f'import "imports/lib_{i}.wdl" as lib_{i}')
+        files[f"imports/lib_{i}.wdl"] = "\n".join([
+            "version 1.0",
+            "",
+            f"task lib_{i}_task {{",
+            "    input {",
+            "        String s",
+            "        Int memory = 4",
+            "    }",
+            "    command <<<",
+            "        echo ~{s} > out.txt",
+            "    >>>",
+            "    output {",
+            '        File out = "out.txt"',
+            "    }",
+            "    parameter_meta {",
+            "        memory: {",
+            "            vidarr_retry: true",
+            "        }",
+            "    }",
+            "}",
+            ""])
+    lines.append("")
+
+    for depth in range(struct_depth):
+        lines.append(f"struct Level{depth} {{")
+        if depth:
+            lines.append(f"    Level{depth - 1} inner")
+        lines.append("    String name")
+        lines.append("    Array[Int] values")
+        lines.append("}")
+        lines.append("")
+
+    lines.append("workflow synthetic {")
+    lines.append("    input {")
+    for i in range(inputs):
+        lines.append(f"        String in_{i}")
+    if struct_depth:
+        lines.append(f"        Level{struct_depth - 1}? nested")
+    lines.append("    }")
+    lines.append("")
+    for t in range(tasks):
+        lines.append(f"    call task_{t} {{ input: s = {'in_' + str(t % inputs) if inputs else repr('x')} }}")
+    for i in range(imports):
+        lines.append(f'    call lib_{i}.lib_{i}_task {{ input: s = "{i}" }}')
+    lines.append("")
+    lines.append("    output {")
+    for o in range(outputs):
+        lines.append(f"        File out_{o} = task_{o % tasks}.out")
+    lines.append("    }")
+    lines.append("")
+    lines.append("    meta {")
+    lines.append("        output_meta: {")
+    for o in range(min(labels, outputs)):
+        lines.append(f"            out_{o}: {{")
+        lines.append(f'                vidarr_label: "label_{o}"')
+        lines.append("            }" + ("," if o < min(labels, outputs) - 1 else ""))
+    lines.append("        }")
+    lines.append("    }")
+    lines.append("}")
+    lines.append("")
+
+    for t in range(tasks):
+        lines.extend([
+            f"task task_{t} {{",
+            "    input {",
+            "        String s",
+            "        Int memory = 4",
+            "    }",
+            "    command <<<",
+            "        echo ~{s} > out.txt",
+            "    >>>",
+            "    output {",
+            '        File out = "out.txt"',
+            "    }",
+            "    parameter_meta {",
+            "        memory: {",
+            "            vidarr_retry: true",
+            "        }",
+            "    }",
+            "}",
+            ""])
+
+    files["synthetic.wdl"] = "\n".join(lines)
+    return files
+
+
+def write(directory: str, files: Dict[str, str]) -> str:
+    """
+    Write generated source files into a directory
+
+    :return: the path to the root workflow
+    """
+    for (path, text) in files.items():
+        full_path = os.path.join(directory, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, "w") as f:
+            f.write(text)
+    return os.path.join(directory, "synthetic.wdl")
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-o", "--output-directory", required=True, help="Directory to write the workflow into")
+    parser.add_argument("--inputs", type=int, default=10, help="Number of workflow inputs")
+    parser.add_argument("--outputs", type=int, default=10, help="Number of workflow outputs")
+    parser.add_argument("--tasks", type=int, default=1, help="Number of tasks")
+    parser.add_argument("--struct-depth", type=int, default=0, help="Depth of nested structs")
+    parser.add_argument("--imports", type=int, default=0, help="Number of imported files")
+    parser.add_argument("--labels", type=int, default=0, help="Number of outputs with a vidarr_label")
+    args = parser.parse_args()
+    print(write(args.output_directory, generate(
+        args.inputs, args.outputs, args.tasks, args.struct_depth, args.imports, args.labels)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Compare the indexed output type lookup in `vidarr.wdl` against a linear scan of the output mapping table.
+
+    pipenv run python benchmarks/output_mapping.py --outputs 5000
+"""
+
+import argparse
+import os
+import tempfile
+import timeit
+
+import WDL
+
+import vidarr.wdl
+
+# A declaration for each supported output type, covering the start, middle, and end of the mapping table
+_OUTPUT_DECLARATIONS = [
+    'File o{i} = "f{i}"',
+    'Array[File]+ o{i} = ["f{i}"]',
+    'Pair[File, Map[String, String]] o{i} = ("f{i}", {{"k": "v"}})',
+    'Boolean o{i} = true',
+    'File? o{i} = "f{i}"',
+    'Array[File] o{i} = []',
+    'Pair[Array[File]+, Map[String, String]]? o{i} = (["f{i}"], {{"k": "v"}})',
+    'Boolean? o{i} = false',
+]
+
+
+def generate(outputs: int) -> str:
+    declarations = "\n".join(
+        "        " + _OUTPUT_DECLARATIONS[i % len(_OUTPUT_DECLARATIONS)].format(i=i) for i in range(outputs))
+    return f"version 1.0\n\nworkflow synthetic {{\n    output {{\n{declarations}\n    }}\n}}\n"
+
+
+def linear_lookup(wdl_type: WDL.Type.Base):
+    for (vidarr_wdl_type, vidarr_type) in vidarr.wdl._output_mapping:
+        if wdl_type == vidarr_wdl_type:
+            return vidarr_type
+    return None
+
+
+def indexed_lookup(wdl_type: WDL.Type.Base):
+    return vidarr.wdl._output_index.get(vidarr.wdl._type_key(wdl_type))
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--outputs", type=int, default=5000, help="Number of outputs in the synthetic workflow")
+    parser.add_argument("--repeat", type=int, default=5, help="Number of times to repeat each measurement")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        wdl_path = os.path.join(directory, "synthetic.wdl")
+        with open(wdl_path, "w") as f:
+            f.write(generate(args.outputs))
+        doc = WDL.load(wdl_path)
+    types = [output.type for output in doc.workflow.outputs]
+
+    if [linear_lookup(t) for t in types] != [indexed_lookup(t) for t in types]:
+        raise AssertionError("Indexed lookup does not match linear lookup")
+
+    linear = min(timeit.repeat(lambda: [linear_lookup(t) for t in types], number=1, repeat=args.repeat))
+    indexed = min(timeit.repeat(lambda: [indexed_lookup(t) for t in types], number=1, repeat=args.repeat))
+    print(f"outputs: {len(types)}")
+    print(f"linear scan: {linear * 1000:.2f} ms")
+    print(f"indexed: {indexed * 1000:.2f} ms")
+    print(f"speedup: {linear / indexed:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
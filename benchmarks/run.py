@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Measure the time and peak memory needed to convert synthetic workflows of increasing size and compare them to a
+stored baseline.
+
+Times are compared relative to a fixed reference workload that is run in the same process, so the baseline can be
+checked on any machine; absolute times are only compared with --absolute.
+
+    pipenv run python benchmarks/run.py
+    pipenv run python benchmarks/run.py --update-baseline
+
+The exit status is non-zero if any size is slower, or uses more memory, than the baseline allows.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import generate
+import vidarr.wdl
+
+# Each size scales every dimension of the synthetic workflow
+SIZES = {
+    "small": dict(inputs=10, outputs=10, tasks=2, struct_depth=2, imports=2, labels=5),
+    "medium": dict(inputs=100, outputs=100, tasks=10, struct_depth=5, imports=5, labels=50),
+    "large": dict(inputs=1000, outputs=1000, tasks=50, struct_depth=8, imports=9, labels=500),
+}
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+# The metrics compared to the baseline; "seconds" is added by --absolute
+METRICS = ("relative", "peak_bytes")
+
+
+def _time(function) -> float:
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+
+def reference():
+    """
+    Run a fixed workload that uses neither vidarr-tools nor miniwdl, as a measure of the speed of this machine
+    """
+    value = {f"key{i}": [str(j) * (i % 7 + 1) for j in range(40)] for i in range(500)}
+    decoded = json.loads(json.dumps(value, sort_keys=True))
+    sorted((key, "".join(items)) for (key, items) in decoded.items())
+
+
+def measure(wdl_path: str, repeat: int, minimum_seconds: float = 1.0) -> dict:
+    # The conversion and the reference take turns, so a change in the load on the machine affects both alike. Small
+    # workflows are converted more times, until the minimum time has passed, since their times are noisier.
+    seconds = []
+    reference_seconds = []
+    while len(seconds) < repeat or sum(seconds) < minimum_seconds:
+        seconds.append(_time(lambda: vidarr.wdl.parse(wdl_path)))
+        reference_seconds.append(_time(reference))
+    tracemalloc.start()
+    try:
+        vidarr.wdl.parse(wdl_path)
+        (_, peak) = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {"seconds": min(seconds), "relative": min(seconds) / min(reference_seconds), "peak_bytes": peak}
+
+
+def main():
+    parser = argparse.ArgumentParser(formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("--sizes", nargs="+", choices=SIZES.keys(), default=list(SIZES.keys()),
+                        help="Sizes of synthetic workflows to measure")
+    parser.add_argument("--repeat", type=int, default=3, help="Minimum number of times to time each conversion")
+    parser.add_argument("--baseline", default=BASELINE, help="Baseline results to compare against")
+    parser.add_argument("--tolerance", type=float, default=1.5,
+                        help="Fail if a measurement exceeds the baseline by more than this factor")
+    parser.add_argument("--absolute", action="store_true",
+                        help="Also compare absolute times to the baseline; only meaningful on the machine that "
+                             "recorded it")
+    parser.add_argument("--update-baseline", action="store_true", help="Replace the baseline with these results")
+    parser.add_argument("-o", "--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            wdl_path = generate.write(os.path.join(directory, size), generate.generate(**SIZES[size]))
+            results[size] = measure(wdl_path, args.repeat)
+            print(f"{size}: {results[size]['seconds'] * 1000:.1f} ms ({results[size]['relative']:.2f}x reference), "
+                  f"{results[size]['peak_bytes'] / 1024 / 1024:.1f} MiB peak")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline.update(results)
+        with open(args.baseline, "w") as f:
+            json.dump(baseline, f, indent=2)
+            f.write("\n")
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}; use --update-baseline to create one.")
+        return
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    ok = True
+    metrics = METRICS + (("seconds",) if args.absolute else ())
+    for (size, result) in results.items():
+        if size not in baseline:
+            continue
+        for metric in metrics:
+            if metric not in baseline[size]:
+                continue
+            value = result[metric]
+            limit = baseline[size][metric] * args.tolerance
+            if value > limit:
+                print(f"REGRESSION {size} {metric}: {value:.4g} exceeds {limit:.4g} "
+                      f"({args.tolerance}x baseline {baseline[size][metric]:.4g})")
+                ok = False
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -3,15 +3,35 @@
 import argparse
 import json
 import os
-from typing import List
-import requests
-import subprocess
+from typing import Dict, List
 import sys
-import vidarr.wdl
+import tempfile
+import vidarr.build
+import vidarr.cache
+import vidarr.client
+import vidarr.deploy
+import vidarr.emit
+import vidarr.mirror
+import vidarr.report
+import vidarr.runner
+import vidarr.timing
+import vidarr.validate
 
 # In the future, other workflow languages should be added here.
+# WDL files are converted by the conversion daemon, if it is running, to avoid loading miniwdl in this process
 workflow_types = {
-    "wdl": vidarr.wdl.parse
+    "wdl": vidarr.client.parse
+}
+
+
+# Many root workflows are converted at once in a pool of worker processes
+def parse_many_wdl(paths, cache, mirror, trust_validated):
+    import vidarr.wdl
+    return vidarr.wdl.parse_many(paths, None, cache, mirror, trust_validated)
+
+
+batch_workflow_types = {
+    "wdl": parse_many_wdl
 }
 
 
@@ -25,6 +45,51 @@ class CustomArgumentParser(argparse.ArgumentParser):
             "--build-config",
             default="vidarrbuild.json",
             dest="build_config")
+        self.add_argument(
+            "--cache-dir",
+            default=vidarr.cache.default_directory(),
+            dest="cache_dir",
+            help="Directory to cache converted workflows in.")
+        self.add_argument(
+            "--no-cache",
+            action="store_true",
+            dest="no_cache",
+            help="Always convert the workflow instead of using a previously converted workflow.")
+        self.add_argument(
+            "--trust-validated",
+            action="store_true",
+            dest="trust_validated",
+            help="Skip typechecking any WDL file the cache records as having passed typechecking with the same "
+                 "contents and imports. Only use this for sources that have already been checked, such as in CI.")
+        self.add_argument(
+            "--json-format",
+            choices=sorted(vidarr.emit.STYLES),
+            default="default",
+            dest="json_format",
+            help="Layout of v.out: default, pretty (indented with sorted keys), compact (no whitespace), or canonical "
+                 "(compact with sorted keys).")
+        self.add_argument(
+            "--timings",
+            nargs="?",
+            const="-",
+            dest="timings",
+            help="Write a JSON report of the time spent in each phase to a file, or standard error if no file is "
+                 f"given. May also be set using the {vidarr.timing.TIMINGS_ENV} environment variable.")
+        self.add_argument(
+            "--profile",
+            dest="profile",
+            help="Profile the build and write the cProfile statistics to a file.")
+        self.add_argument(
+            "--mirror-dir",
+            dest="mirror_dir",
+            help="Read imported URLs through the local copies in this directory. Without this option, imported URLs "
+                 "are fetched every time unless --offline is given, which uses the VIDARR_MIRROR_DIR environment "
+                 "variable or imports in the cache directory.")
+        self.add_argument(
+            "--offline",
+            action="store_true",
+            dest="offline",
+            help="Only read imported URLs from the mirror instead of fetching ones that are missing.")
 
 
 # Create an instance of the custom argument parser
@@ -38,11 +103,21 @@ parser = CustomArgumentParser()
 #    "wdl": "myworkflow.wdl"
 # }
 #
+# or, for several root workflows, has a list of these as "roots"; see vidarr.build.read_config
 subparsers = parser.add_subparsers(dest="command")
 
 build_parser = subparsers.add_parser(
     "build",
     help="Run the build process to produce a Vidarr-compatible workflow bundle.")
+build_parser.add_argument(
+    "--watch",
+    action="store_true",
+    dest="watch",
+    help="Keep running and build again each time the workflow or any file it imports changes.")
+
+prefetch_parser = subparsers.add_parser(
+    "prefetch",
+    help="Fetch every URL imported by the workflow into the mirror, so it can be built offline.")
 
 # This looks unused, but it's not so much unused as implicitly the default
 test_parser = subparsers.add_parser(
@@ -71,6 +146,48 @@ test_parser.add_argument(
     dest="output_directory",
     help="Provide an explicit output directory for the test output files.")
 
+test_parser.add_argument(
+    "-j",
+    "--jobs",
+    dest="jobs",
+    type=int,
+    help="The maximum number of test files to run at once. By default, all test files are run at once.")
+
+test_parser.add_argument(
+    "--shards",
+    dest="shards",
+    type=int,
+    default=1,
+    help="Split the tests in each test file into this many shards that are run at the same time.")
+
+test_parser.add_argument(
+    "--durations",
+    dest="durations",
+    help="A JSON file containing the duration of each test, by root workflow, test file, and test id, used to balance "
+         "the shards. The durations of the tests that pass are added to it.")
+
+test_parser.add_argument(
+    "--junit",
+    dest="junit",
+    help="Write the outcome of each test to this file as a JUnit XML report.")
+
+test_parser.add_argument(
+    "--summary",
+    dest="summary",
+    help="Write the outcome and duration of each test to this file as JSON.")
+
+test_parser.add_argument(
+    "--force",
+    dest="force",
+    action="store_true",
+    help="Run all tests, even those that passed previously with the same workflow, test, and test configuration.")
+
+test_parser.add_argument(
+    "--fail-fast",
+    dest="fail_fast",
+    action="store_true",
+    help="Stop all tests as soon as any test file fails.")
+
 test_parser.add_argument(
     "--verbose",
     dest="verbose_mode",
@@ -124,6 +241,83 @@ deploy_parser.add_argument(
     dest="output_directory",
     help="Provide an explicit output directory for the test output files.")
 
+deploy_parser.add_argument(
+    "--connections",
+    dest="connections",
+    type=int,
+    default=vidarr.deploy.DEFAULT_JOBS,
+    help="The maximum number of concurrent requests to Vidarr servers.")
+
+deploy_parser.add_argument(
+    "--timeout",
+    dest="timeout",
+    type=float,
+    default=vidarr.deploy.DEFAULT_TIMEOUT,
+    help="The timeout, in seconds, for each request to a Vidarr server.")
+
+deploy_parser.add_argument(
+    "--retries",
+    dest="retries",
+    type=int,
+    default=vidarr.deploy.DEFAULT_RETRIES,
+    help="The number of times to retry a request to a Vidarr server that fails with a connection or server error. "
+         "Uploads are only retried if the connection could not be made.")
+
+deploy_parser.add_argument(
+    "--no-compress",
+    dest="compress",
+    action="store_false",
+    help="Upload the workflow uncompressed instead of gzip-compressed.")
+
+deploy_parser.add_argument(
+    "--dry-run",
+    dest="dry_run",
+    action="store_true",
+    help="Check which servers would receive the workflow and report the size of the upload, without running the "
+         "tests or uploading anything.")
+
+deploy_parser.add_argument(
+    "-j",
+    "--jobs",
+    dest="jobs",
+    type=int,
+    help="The maximum number of test files to run at once. By default, all test files are run at once.")
+
+deploy_parser.add_argument(
+    "--shards",
+    dest="shards",
+    type=int,
+    default=1,
+    help="Split the tests in each test file into this many shards that are run at the same time.")
+
+deploy_parser.add_argument(
+    "--durations",
+    dest="durations",
+    help="A JSON file containing the duration of each test, by root workflow, test file, and test id, used to balance "
+         "the shards. The durations of the tests that pass are added to it.")
+
+deploy_parser.add_argument(
+    "--junit",
+    dest="junit",
+    help="Write the outcome of each test to this file as a JUnit XML report.")
+
+deploy_parser.add_argument(
+    "--summary",
+    dest="summary",
+    help="Write the outcome and duration of each test to this file as JSON.")
+
+deploy_parser.add_argument(
+    "--force",
+    dest="force",
+    action="store_true",
+    help="Run all tests, even those that passed previously with the same workflow, test, and test configuration.")
+
+deploy_parser.add_argument(
+    "--fail-fast",
+    dest="fail_fast",
+    action="store_true",
+    help="Stop all tests as soon as any test file fails.")
+
 deploy_parser.add_argument(
     "--verbose",
     dest="verbose_mode",
@@ -131,10 +325,12 @@ deploy_parser.add_argument(
     help="Verbose mode. Helpful for troubleshooting")
 
 args = parser.parse_args()
+vidarr.timing.enable(args.timings)
+vidarr.timing.profile(args.profile)
 
 if not args.command:
     sys.stderr.write(
-        "Please supply a command: build, test, or deploy\n")
+        "Please supply a command: build, test, deploy, or prefetch\n")
     sys.exit(1)
 
 if not os.path.exists(args.build_config):
@@ -142,53 +338,59 @@ if not os.path.exists(args.build_config):
         f"Cannot find {args.build_config}. Are you in the right directory?\n")
     sys.exit(1)
 
-with open(args.build_config) as cf:
-    config = json.load(cf)
-
-if "names" not in config or not isinstance(config["names"], list) or any(
-        not isinstance(n, str) for n in config["names"]) or not config["names"]:
-    sys.stderr.write(
-        "The `names` property must be present in the configuration file and contain a list of workflow names for deployment.\n")
-    sys.exit(1)
-
-workflows = []
-# For each workflow type we know about (currently just WDL)
-for (workflow_key, workflow_parser) in workflow_types.items():
-    # Make sure a "wdl" field is in the build config
-    if workflow_key in config:
-        if not isinstance(config[workflow_key], str):
-            sys.stderr.write(
-                f"The `{workflow_key}` property must contain the name of the root workflow file.\n")
-            sys.exit(1)
-        # Get a path that looks like `/dir/where/vidarrbuild-dot-json/is/wdl`
-        # die if it doesn't exist
-        file_path = os.path.join(
-            os.path.dirname(
-                args.build_config),
-            config[workflow_key])
-        if not os.path.exists(file_path):
-            sys.stderr.write(f"Cannot find {file_path}.")
-            sys.exit(1)
-
-        # Add wdl2vidarr as a lambda
-        workflows.append(lambda: workflow_parser(file_path))
-
-# Why do we specify 'root' workflow here?
-if len(workflows) != 1:
-    sys.stderr.write(
-        "The configuration file must have exactly one root workflow.")
+try:
+    roots = vidarr.build.read_config(args.build_config)
+except ValueError as e:
+    sys.stderr.write(f"{e}\n")
     sys.exit(1)
+multiple_roots = len(roots) > 1
+
+cache = None if args.no_cache else vidarr.cache.Cache(args.cache_dir)
+# Without a mirror, the conversion daemon can be used since it has its own
+mirror = vidarr.mirror.Mirror(args.mirror_dir, offline=args.offline) if args.mirror_dir or args.offline else None
+
+if args.command == "prefetch":
+    import vidarr.wdl
+    try:
+        for root in roots:
+            for uri in vidarr.wdl.prefetch(root.path, args.mirror_dir):
+                print(uri)
+    except (OSError, ValueError) as e:
+        sys.stderr.write(f"{e}\n")
+        sys.exit(1)
+    sys.exit(0)
 
-# Run the lambda we appended to workflows earlier
-workflow = workflows[0]()
+# Watching reuses the loaded documents between builds, so it always converts in this process rather than the daemon
+if args.command == "build" and args.watch:
+    if multiple_roots:
+        sys.stderr.write("--watch can only be used with a single root workflow.\n")
+        sys.exit(1)
+    import vidarr.wdl
+    vidarr.wdl.watch(roots[0].path, lambda w: vidarr.emit.dump(roots[0].output, w, args.json_format), mirror=mirror)
+    sys.exit(0)
 
-if not workflow:
+# Convert each root workflow
+workflows = {}
+with vidarr.timing.phase("build"):
+    if multiple_roots:
+        for (root, result) in zip(roots, batch_workflow_types[roots[0].language](
+                [root.path for root in roots], cache, mirror, args.trust_validated)):
+            if "error" in result:
+                sys.stderr.write(f"Cannot build {root.path}: {result['error']['message']}\n")
+            else:
+                workflows[root.name] = result["workflow"]
+    else:
+        workflows[roots[0].name] = workflow_types[roots[0].language](
+            roots[0].path, cache, mirror=mirror, trust_validated=args.trust_validated)
+vidarr.timing.count("roots", len(roots))
+
+if len(workflows) != len(roots) or not all(workflows.values()):
     sys.exit(1)
 
-# wdl2vidarr supports custom output file names, but vidarr-build is written with the assumption
-# that there may be more than one parser, and who knows how the others would be implemented.
-with open("v.out", "w") as f:
-    json.dump(workflow, f)
+# Each built workflow is replaced atomically, so a failed write never leaves a truncated bundle behind.
+with vidarr.timing.phase("write"):
+    for root in roots:
+        vidarr.timing.count("bytes_written", vidarr.emit.dump(root.output, workflows[root.name], args.json_format))
 
 # Exit early if command is 'build', don't try tests or deploying
 if args.command == "build":
@@ -199,16 +401,18 @@ if args.command == "build":
 # [
 #   {
 #     "arguments": {
-#       "contents": {
-#         "configuration": "/path/to/test/data.fastq.gz",
-#         "externalIds": [
-#           {
-#             "id": "TEST",
-#             "provider": "TEST"
-#           }
-#         ]
-#       },
-#       "type": "EXTERNAL"
+#       "myWorkflow.fastq": {
+#         "contents": {
+#           "configuration": "/path/to/test/data.fastq.gz",
+#           "externalIds": [
+#             {
+#               "id": "TEST",
+#               "provider": "TEST"
+#             }
+#           ]
+#         },
+#         "type": "EXTERNAL"
+#       }
 #     },
 #     "description": "Tests that workflow does its thing",
 #     "engineArguments": {
@@ -217,12 +421,13 @@ if args.command == "build":
 #     },
 #     "id": "myTest1",
 #     "metadata": {
-#       "contents": [
-#         {
-#           "outputDirectory": "/path/to/output/dir"
-#         }
-#       ],
-#       "type": "ALL"
+#       "myWorkflow.report": {
+#         "contents": [
+#           {
+#             "outputDirectory": "/path/to/output/dir"
+#           }
+#         ],
+#         "type": "ALL"
 #       }
 #     },
 #     "validators": [
@@ -235,27 +440,31 @@ if args.command == "build":
 #      ]
 #   }
 # ]
-tests = [
-    os.path.join(
-        os.path.dirname(
-            args.build_config),
-        "vidarrtest-regression.json")]
-
-# Appended to tests without modification and sent to Vidarr all the same - assume same format
-if args.performance_test:
-    tests.append(
-        os.path.join(
-            os.path.dirname(
-                args.build_config),
-            "vidarrtest-performance.json"))
-
-for test in tests:
-    if not os.path.exists(test):
-        sys.stderr.write(f"Cannot find {test} containing required tests.\n")
-        sys.exit(1)
+# Performance tests are appended to tests without modification and sent to Vidarr all the same - assume same format
+tests = {root.name: root.test_files(bool(args.performance_test)) for root in roots}
 
-# If 'deploy', validate the registration URLs and that those vidarrs have the workflow installed
-registration_urls: List[str] = []
+for root_tests in tests.values():
+    for test in root_tests:
+        if not os.path.exists(test):
+            sys.stderr.write(f"Cannot find {test} containing required tests.\n")
+            sys.exit(1)
+
+# Check every test against the built workflow before anything is sent to a server or any `vidarr test` is started, so
+# that all the mistakes in the test files are reported at once
+with vidarr.timing.phase("validate_tests"):
+    test_errors = [error for root in roots
+                   for error in vidarr.validate.check_test_files(tests[root.name], workflows[root.name])]
+if test_errors:
+    for error in test_errors:
+        sys.stderr.write(error + "\n")
+    sys.stderr.write(f"Found {len(test_errors)} problem(s) in the test files.\n")
+    sys.exit(1)
+
+# If 'deploy', validate the registration URLs and that those vidarrs have the workflow installed. The same session is
+# used for every root workflow, so connections to each server are shared.
+registrations: Dict[str, List[vidarr.deploy.Registration]] = {root.name: [] for root in roots}
+payloads: Dict[str, vidarr.deploy.Payload] = {}
+deploy_results: List[vidarr.deploy.Result] = []
 if args.command == "deploy":
     vidarr_urls: List[str] = []
     vidarr_urls.extend(filter(lambda x: bool(x), args.vidarr_urls))
@@ -277,69 +486,175 @@ if args.command == "deploy":
             "Cannot perform a deployment without a Vidarr server to update. Use --url or set VIDARR_URLS.\n")
         sys.exit(1)
 
-    for vidarr_url in vidarr_urls:
-        for name in config["names"]:
-            res = requests.get(f"{vidarr_url}/api/workflow/{name}")
-            if res.status_code != 200:
-                print(
-                    f"Workflow {name} not registered on {vidarr_url}. Skipping.")
-                continue
-
-            registration_urls.append(
-                f"{vidarr_url}/api/workflow/{name}/{args.version}")
-    if not registration_urls:
-        print("""Could not find a server that wanted this workflow. :-(
-        Check that the "names" in the vidarrbuild.json are registered on the servers or update the names.
-        """)
+    session = vidarr.deploy.create_session(args.connections, args.retries)
+    vidarr.timing.count("servers", len(vidarr_urls))
+    for root in roots:
+        with vidarr.timing.phase("registration_checks"):
+            (registrations[root.name], check_results) = vidarr.deploy.find_registrations(
+                session, vidarr_urls, root.names, args.version, args.connections, args.timeout)
+        for result in check_results:
+            print(result.message)
+        deploy_results.extend(check_results)
+        if not registrations[root.name]:
+            print(f"""Could not find a server that wanted {"this workflow" if not multiple_roots else root.name}. :-(
+            Check that the "names" in the vidarrbuild.json are registered on the servers or update the names.
+            """)
+            sys.exit(1)
+
+    # Compare against any versions already on the servers so identical versions aren't uploaded again and conflicting
+    # versions are found before anything is uploaded or tested
+    preflight_ok = True
+    for root in roots:
+        with vidarr.timing.phase("preflight"):
+            (registrations[root.name], preflight_results) = vidarr.deploy.preflight(
+                session, registrations[root.name], workflows[root.name], args.connections, args.timeout)
+        for result in preflight_results:
+            print(result.message)
+        deploy_results.extend(preflight_results)
+        preflight_ok = preflight_ok and all(result.ok for result in preflight_results)
+    if not preflight_ok:
+        print(vidarr.deploy.summarize(deploy_results))
+        print("Awesomeness was a pipedream")
         sys.exit(1)
 
-# Actually run the tests. check_call() will kill the program if test's returncode is not 0
-for test in tests:
-    print(f"Running tests from {test}...")
-    sys.stdout.flush()
-    sys.stderr.flush()
-
-    # Logical operations to determine if output directory provided and/or verbose flag is enabled
-    # Based on those conditions this runs vidarr-cli with those respective arguments passed in
-    if args.output_directory and args.verbose_mode:  # verbose true
-        print("Output directory provided...")
-        subprocess.check_call(
-            ["vidarr", "test", "-c", args.test_config, "-w", "v.out", "-t", test, "-o", args.output_directory, "-v"])
-    elif args.output_directory:  # verbose false
-        print("Output directory provided...")
-        subprocess.check_call(
-            ["vidarr", "test", "-c", args.test_config, "-w", "v.out", "-t", test, "-o", args.output_directory])
-    elif args.verbose_mode:  # verbose true
-        print("No output directory provided...")
-        subprocess.check_call(
-            ["vidarr", "test", "-c", args.test_config, "-w", "v.out", "-t", test, "-v"])
-    else:  # verbose false
-        print("No output directory provided...")
-        subprocess.check_call(
-            ["vidarr", "test", "-c", args.test_config, "-w", "v.out", "-t", test])
-
-# Assuming we didn't die from tests failing, deploy to each server
-# `registration_urls` will be empty if our mode is not 'deploy'
-ok = True
-for registration_url in registration_urls:
-    print(f"Pushing to {registration_url} server...")
-    res = requests.post(registration_url, json=workflow)
-    if res.status_code not in [200, 201, 409]:
-        print(
-            f"Failed to register workflow version on {registration_url}: response status {res.status_code}")
-        if res.content:
-            print(f"{res.json()}")  # only read the response body if it is not empty
-        ok = False
-    elif res.status_code in [409]:
-        print(
-            f"This workflow version is different from the workflow version with the same name + version on {registration_url}")
-        ok = False
-    elif res.status_code in [200]:
-        print(f"Workflow version is already registered on {registration_url}")
-        registered = True  # TODO unused?
-    else:  # 201 means created
-        print(f"Registered on {registration_url}!")
-        registered = True
+    # Each workflow is encoded and compressed once, no matter how many servers it is uploaded to
+    for root in roots:
+        with vidarr.timing.phase("encode"):
+            payloads[root.name] = vidarr.deploy.encode(workflows[root.name])
+        print(payloads[root.name].describe(root.output))
+    if args.dry_run:
+        for root in roots:
+            for registration in registrations[root.name]:
+                print(f"Would push to {registration.url} server.")
+        if deploy_results:
+            print(vidarr.deploy.summarize(deploy_results))
+        sys.exit(0)
+
+# Actually run the tests. Each test file is run by a separate `vidarr test` process and, when an output directory is
+# provided, each process writes to its own subdirectory of it (and of a subdirectory for each root workflow, if there
+# are many)
+if args.output_directory:
+    print("Output directory provided...")
+else:
+    print("No output directory provided...")
+tests_passed: Dict[str, bool] = {}
+test_cases: List[vidarr.report.TestCase] = []
+measured_durations: Dict[vidarr.runner.TestKey, float] = {}
+recorded_durations = vidarr.runner.load_durations(args.durations)
+with tempfile.TemporaryDirectory() as shard_directory:
+    for root in roots:
+        label = f"{root.name}: " if multiple_roots else ""
+        root_tests = tests[root.name]
+        root_shard_directory = os.path.join(shard_directory, root.name)
+        os.makedirs(root_shard_directory)
+        output_directory = args.output_directory
+        if output_directory and multiple_roots:
+            output_directory = os.path.join(output_directory, root.name)
+
+        # Tests that passed before with the same workflow, test, and test configuration are skipped
+        cached_tests = []
+        if cache:
+            workflow_hash = vidarr.cache.canonical_hash(workflows[root.name])
+            with open(args.test_config) as tcf:
+                test_config_hash = vidarr.cache.canonical_hash(tcf.read())
+
+            def test_key(test) -> str:
+                return vidarr.cache.Cache.test_key(workflow_hash, test, test_config_hash)
+
+            if not args.force:
+                (root_tests, cached_tests) = vidarr.runner.exclude(
+                    root_tests, root_shard_directory, lambda test: cache.has_passed(test_key(test)), root.name)
+                for (key, _) in cached_tests:
+                    print(f"{label}{key.test_file}/{key.test_id}: passed (cached)")
+
+        test_runs = vidarr.runner.plan(root_tests, output_directory, args.shards, root_shard_directory,
+                                       recorded_durations, root.name)
+        for test_run in test_runs:
+            if test_run.output_directory and not output_directory:
+                print(f"{label}Running tests from {test_run.test_file}, writing output to "
+                      f"{test_run.output_directory}...")
+            else:
+                print(f"{label}Running tests from {test_run.test_file}...")
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        # The output of each run is prefixed with its name, since runs happen at the same time
+        def show_progress(event: vidarr.runner.TestEvent):
+            if event.kind == "start":
+                print(f"{label}{event.run.name}: started {', '.join(event.run.test_ids)}", flush=True)
+            elif event.kind == "output":
+                print(f"{label}{event.run.name}| {event.line}", flush=True)
+            else:
+                outcome = "passed" if event.returncode == 0 else "stopped" if event.returncode is None \
+                    else f"failed with exit status {event.returncode}"
+                print(f"{label}{event.run.name}: {outcome} after {event.elapsed:.1f}s", flush=True)
+
+        with vidarr.timing.phase("tests"):
+            test_results = vidarr.runner.run_tests(
+                test_runs, args.test_config, root.output, args.verbose_mode, args.jobs, args.fail_fast,
+                show_progress)
+        vidarr.timing.count("test_runs", len(test_runs))
+        test_cases.extend(vidarr.report.test_cases(root.name, test_results, [key for (key, _) in cached_tests]))
+        measured_durations.update(vidarr.runner.durations_by_test(test_results))
+        if cache:
+            for test_result in test_results:
+                if test_result.ok:
+                    with open(test_result.run.test_file) as trf:
+                        for test in json.load(trf):
+                            cache.record_pass(test_key(test))
+        for test_result in test_results:
+            if test_result.elapsed is None:
+                print(f"{label}Tests from {test_result.run.name} were not run.")
+        if args.shards > 1:
+            for (key, passed) in vidarr.runner.results_by_test(test_results).items():
+                print(f"{label}{key.test_file}/{key.test_id}: {'passed' if passed else 'failed'}")
+        tests_passed[root.name] = all(test_result.ok for test_result in test_results)
+        if not tests_passed[root.name]:
+            sys.stderr.write(f"Tests failed for {root.name}; it will not be deployed.\n" if multiple_roots
+                             else "Tests failed.\n")
+            if args.fail_fast:
+                break
+
+# Show where the time went and keep the durations for balancing the shards of later runs
+slowest = sorted((case for case in test_cases if case.elapsed is not None), key=lambda case: case.elapsed,
+                 reverse=True)[:5]
+if slowest:
+    print("Slowest tests:")
+    for case in slowest:
+        print(f"  {case.workflow + ': ' if multiple_roots else ''}{case.test_file}/{case.test_id}: "
+              f"{case.elapsed:.1f}s")
+for (key, recorded, measured) in vidarr.runner.slowdowns(recorded_durations, measured_durations):
+    print(f"{key} took {measured:.1f}s, up from {recorded:.1f}s.")
+if args.durations and measured_durations:
+    vidarr.runner.record_durations(args.durations, measured_durations)
+if args.junit:
+    vidarr.report.write_junit(args.junit, test_cases)
+if args.summary:
+    vidarr.report.write_summary(args.summary, test_cases)
+
+if not multiple_roots and not all(tests_passed.values()):
+    sys.exit(1)
+
+# Deploy each workflow whose tests passed to each server
+# `registrations` will be empty if our mode is not 'deploy'
+ok = all(result.ok for result in deploy_results) and len(tests_passed) == len(roots) and all(tests_passed.values())
+for root in roots:
+    if not tests_passed.get(root.name) or not registrations[root.name]:
+        continue
+    for registration in registrations[root.name]:
+        print(f"Pushing to {registration.url} server...")
+    with vidarr.timing.phase("upload"):
+        upload_results = vidarr.deploy.upload(
+            session, registrations[root.name], payloads[root.name], args.connections, args.timeout, args.compress)
+    vidarr.timing.count("uploads", len(upload_results))
+    payload = payloads[root.name]
+    vidarr.timing.count("upload_bytes", len(payload.compressed if args.compress else payload.raw))
+    for result in upload_results:
+        print(result.message)
+    deploy_results.extend(upload_results)
+    ok = ok and all(result.ok for result in upload_results)
+if deploy_results:
+    print(vidarr.deploy.summarize(deploy_results))
 
 if ok:
     print("EVERYTHING IS AWESOME!!!")
@@ -0,0 +1,36 @@
+import os
+from typing import List
+
+import WDL
+import pytest
+
+
+@pytest.fixture
+def dnaSeqQC(tmp_path) -> str:
+    """
+    A copy of the dnaSeqQC workflow and its imports in ``wdl`` in the temporary directory, so it can be modified
+
+    :return: the path to the root WDL file
+    """
+    wdl_dir = tmp_path / "wdl"
+    (wdl_dir / "imports").mkdir(parents=True)
+    test_dir = os.path.dirname(__file__)
+    for name in ("dnaSeqQC.wdl", "imports/pull_bwaMem.wdl", "imports/pull_bamQC.wdl"):
+        (wdl_dir / name).write_text(open(os.path.join(test_dir, name)).read())
+    return str(wdl_dir / "dnaSeqQC.wdl")
+
+
+@pytest.fixture
+def typechecked(monkeypatch) -> List[str]:
+    """
+    The file name of each WDL document typechecked during the test, in order
+    """
+    typecheck = WDL.Document.typecheck
+    checked = []
+
+    def record_typecheck(doc, *args, **kwargs):
+        checked.append(os.path.basename(doc.pos.abspath))
+        return typecheck(doc, *args, **kwargs)
+
+    monkeypatch.setattr(WDL.Document, "typecheck", record_typecheck)
+    return checked
@@ -0,0 +1,55 @@
+import json
+
+import pytest
+
+import vidarr.build
+
+
+def write_config(tmp_path, config) -> str:
+    (tmp_path / "wdl").mkdir(exist_ok=True)
+    for name in ("a.wdl", "b.wdl"):
+        (tmp_path / "wdl" / name).write_text("version 1.0\n")
+    path = tmp_path / "vidarrbuild.json"
+    path.write_text(json.dumps(config))
+    return str(path)
+
+
+def tests_read_config(tmp_path):
+    (root,) = vidarr.build.read_config(write_config(tmp_path, {"names": ["a", "a2"], "wdl": "wdl/a.wdl"}))
+    assert root == vidarr.build.Root(("a", "a2"), "wdl", str(tmp_path / "wdl/a.wdl"), "v.out", str(tmp_path))
+    assert root.test_files(True) == [
+        str(tmp_path / "vidarrtest-regression.json"), str(tmp_path / "vidarrtest-performance.json")]
+
+    roots = vidarr.build.read_config(write_config(tmp_path, {"roots": [
+        {"names": ["a"], "wdl": "wdl/a.wdl", "tests": "tests/a"},
+        {"names": ["b"], "wdl": "wdl/b.wdl", "output": "out/b.json"},
+    ]}))
+    assert [(root.name, root.output, root.test_directory) for root in roots] == [
+        ("a", "a.out", str(tmp_path / "tests/a")), ("b", "out/b.json", str(tmp_path / "wdl"))]
+
+    # Without `tests`, each root's tests are next to its workflow file rather than shared
+    (tmp_path / "wdl/c").mkdir()
+    (tmp_path / "wdl/c/c.wdl").write_text("version 1.0\n")
+    roots = vidarr.build.read_config(write_config(tmp_path, {"roots": [
+        {"names": ["a"], "wdl": "wdl/a.wdl"},
+        {"names": ["c"], "wdl": "wdl/c/c.wdl"},
+    ]}))
+    assert [root.test_files(False) for root in roots] == [
+        [str(tmp_path / "wdl/vidarrtest-regression.json")], [str(tmp_path / "wdl/c/vidarrtest-regression.json")]]
+
+
+@pytest.mark.parametrize("config,message", [
+    ({"wdl": "wdl/a.wdl"}, "names"),
+    ({"names": ["a"]}, "exactly one root workflow"),
+    ({"names": ["a"], "wdl": "wdl/missing.wdl"}, "Cannot find"),
+    ({"roots": []}, "roots"),
+    ({"roots": [{"names": ["a"], "wdl": "wdl/a.wdl"}, {"names": ["b"], "wdl": "wdl/b.wdl", "output": "a.out"}]},
+     "different `output`"),
+    ({"roots": [{"names": ["a"], "wdl": "wdl/a.wdl"}, {"names": ["a"], "wdl": "wdl/b.wdl", "output": "b.out"}]},
+     "different first name"),
+    ({"roots": [{"names": ["a"], "wdl": "wdl/a.wdl"}, {"names": ["b"], "wdl": "wdl/b.wdl"}]},
+     "different `tests` directory"),
+])
+def tests_read_config_invalid(tmp_path, config, message):
+    with pytest.raises(ValueError, match=message):
+        vidarr.build.read_config(write_config(tmp_path, config))
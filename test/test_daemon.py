@@ -0,0 +1,74 @@
+import os
+import threading
+
+import pytest
+
+import vidarr.cache
+import vidarr.client
+import vidarr.daemon
+import vidarr.wdl
+
+
+@pytest.fixture
+def daemon(tmp_path):
+    server = vidarr.daemon.Server(str(tmp_path / "d.sock"))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def tests_daemon(daemon, tmp_path, monkeypatch, dnaSeqQC):
+    wdl_path = dnaSeqQC
+    cache = vidarr.cache.Cache(str(tmp_path / "cache"))
+    expected = vidarr.wdl.parse(wdl_path)
+    assert vidarr.client.parse(wdl_path, cache, daemon.server_address) == expected
+    assert list(daemon.documents) == [wdl_path]
+
+    # The workflow held in memory is reused until an imported file changes
+    (dependencies, workflow) = daemon.documents[wdl_path]
+    assert len(dependencies) == 3
+    with monkeypatch.context() as patch:
+        patch.setattr(vidarr.wdl.Loader, "load", lambda *args: pytest.fail("Workflow loaded again"))
+        assert vidarr.client.parse(wdl_path, cache, daemon.server_address) == workflow
+
+    # Only the changed file and the files that import it are parsed again
+    parse_document = vidarr.wdl._parse_document
+    parsed = []
+
+    def record_parse(source_text, uri, abspath):
+        parsed.append(os.path.basename(abspath))
+        return parse_document(source_text, uri, abspath)
+
+    monkeypatch.setattr(vidarr.wdl, "_parse_document", record_parse)
+    with open(tmp_path / "wdl/imports/pull_bamQC.wdl", "a") as f:
+        f.write("\n")
+    assert vidarr.client.parse(wdl_path, cache, daemon.server_address) == vidarr.wdl.parse(wdl_path)
+    assert daemon.documents[wdl_path][0] != dependencies
+    assert sorted(parsed[:2]) == ["dnaSeqQC.wdl", "pull_bamQC.wdl"]
+
+
+def tests_daemon_crlf(daemon, tmp_path, monkeypatch):
+    source = open(os.path.join(os.path.dirname(__file__), "fastqc.wdl")).read()
+    wdl_path = tmp_path / "fastqc.wdl"
+    wdl_path.write_bytes(source.replace("\n", "\r\n").encode("utf-8"))
+    cache = vidarr.cache.Cache(str(tmp_path / "cache"))
+    workflow = vidarr.client.parse(str(wdl_path), cache, daemon.server_address)
+    monkeypatch.setattr(vidarr.wdl.Loader, "load", lambda *args: pytest.fail("Workflow loaded again"))
+    monkeypatch.setattr(vidarr.cache.Cache, "get", lambda *args: pytest.fail("Workflow read from the cache"))
+    assert vidarr.client.parse(str(wdl_path), cache, daemon.server_address) == workflow
+
+
+def tests_daemon_error(daemon, tmp_path):
+    bad_path = os.path.join(os.path.dirname(__file__), "bad.wdl")
+    with pytest.raises(ValueError):
+        vidarr.client.parse(bad_path, socket_path=daemon.server_address)
+    with pytest.raises(FileNotFoundError, match="No such WDL file"):
+        vidarr.client.parse(str(tmp_path / "missing.wdl"), socket_path=daemon.server_address)
+
+
+def tests_client_fallback(tmp_path):
+    wdl_path = os.path.join(os.path.dirname(__file__), "fastqc.wdl")
+    assert vidarr.client.parse(wdl_path, socket_path=str(tmp_path / "missing.sock")) == vidarr.wdl.parse(wdl_path)
@@ -0,0 +1,178 @@
+import gzip
+import http.server
+import json
+import threading
+
+import pytest
+
+import vidarr.deploy
+
+
+WORKFLOW = {"accessoryFiles": {}, "language": "WDL_1_0", "outputs": {"a": 1, "b": {"x": [1, 2], "y": None}},
+            "parameters": {"p": {"is": "optional", "inner": "string"}}, "workflow": "x"}
+
+
+def normalise(value):
+    """
+    Describe a workflow version the way a server might: with its own fields added, keys in a different order, and
+    no accessory files if there are none
+    """
+    if isinstance(value, dict):
+        if "workflow" in value:
+            value = dict(value, id="0123abcd", created="2024-01-01T00:00:00Z")
+            if not value.get("accessoryFiles"):
+                del value["accessoryFiles"]
+        return {key: normalise(item) for (key, item) in reversed(list(value.items()))}
+    return value
+
+
+class StubVidarr(http.server.BaseHTTPRequestHandler):
+    # Paths that fail with a server error the first time they are requested
+    flaky = {"/api/workflow/flaky", "/api/workflow/flaky/1.0"}
+    requested = []
+    # The decoded body and content encoding of each upload
+    uploaded = []
+    # The workflow versions created by uploads, by path
+    registered = {}
+
+    def _respond(self, status: int, body=None):
+        content = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        self.requested.append(("GET", self.path))
+        if self.path in self.flaky:
+            self.flaky.discard(self.path)
+            self._respond(503)
+        elif self.path == "/api/workflow/broken":
+            self._respond(500)
+        elif self.path in self.registered:
+            self._respond(200, normalise(self.registered[self.path]))
+        elif self.path == "/api/workflow/old/1.0":
+            self._respond(200, normalise(dict(WORKFLOW, name="old", version="1.0")))
+        elif self.path == "/api/workflow/changed/1.0":
+            self._respond(200, normalise(dict(WORKFLOW, name="changed", version="1.0", workflow="y")))
+        elif self.path == "/api/workflow/partial/1.0":
+            self._respond(200, {"name": "partial", "version": "1.0", "workflow": "x"})
+        elif self.path in ("/api/workflow/new", "/api/workflow/old", "/api/workflow/changed", "/api/workflow/flaky"):
+            self._respond(200, {})
+        else:
+            self._respond(404)
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        self.requested.append(("POST", self.path))
+        encoding = self.headers.get("Content-Encoding", "identity")
+        if encoding == "gzip":
+            if self.path.startswith("/api/workflow/plain"):
+                self._respond(415)
+                return
+            body = gzip.decompress(body)
+        self.uploaded.append((self.path, encoding, json.loads(body)))
+        if self.path in self.flaky:
+            self.flaky.discard(self.path)
+            self._respond(503)
+        elif self.path in ("/api/workflow/new/1.0", "/api/workflow/flaky/1.0", "/api/workflow/plain/1.0"):
+            self.registered[self.path] = json.loads(body)
+            self._respond(201)
+        elif self.path == "/api/workflow/old/1.0":
+            self._respond(200)
+        elif self.path == "/api/workflow/changed/1.0":
+            self._respond(409)
+        else:
+            self._respond(400, {"error": "bad"})
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    StubVidarr.requested.clear()
+    StubVidarr.uploaded.clear()
+    StubVidarr.registered.clear()
+    StubVidarr.flaky = {"/api/workflow/flaky", "/api/workflow/flaky/1.0"}
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), StubVidarr)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def tests_deploy(server):
+    session = vidarr.deploy.create_session(jobs=4, retries=2, backoff=0)
+    (registrations, results) = vidarr.deploy.find_registrations(
+        session, [server], ["new", "old", "changed", "flaky", "missing", "broken"], "1.0", jobs=4, timeout=5)
+    assert [registration.name for registration in registrations] == ["new", "old", "changed", "flaky"]
+    assert StubVidarr.requested.count(("GET", "/api/workflow/flaky")) == 2
+    assert [(result.name, result.status, result.ok) for result in results] == [
+        ("missing", "not registered", True), ("broken", "error", False)]
+
+    # A failed registration is not retried, since the server may have created the version anyway
+    results = vidarr.deploy.upload(session, registrations, {"workflow": "x"}, jobs=4, timeout=5)
+    assert [(result.name, result.status) for result in results] == [
+        ("new", "registered"), ("old", "already registered"), ("changed", "conflict"), ("flaky", "error")]
+    assert [result.ok for result in results] == [True, True, False, False]
+    assert StubVidarr.requested.count(("POST", "/api/workflow/flaky/1.0")) == 1
+
+    summary = vidarr.deploy.summarize(results).splitlines()
+    assert summary[0].split(" | ") == [
+        "server".ljust(len(server)), "registered", "already registered", "conflict", "not registered", "error"]
+    assert [cell.strip() for cell in summary[2].split(" | ")] == [server, "1", "1", "1", "0", "1"]
+
+
+def tests_deploy_unreachable():
+    session = vidarr.deploy.create_session(jobs=1, retries=0)
+    (registrations, results) = vidarr.deploy.find_registrations(
+        session, ["http://127.0.0.1:1"], ["new"], "1.0", jobs=1, timeout=1)
+    assert registrations == []
+    assert [(result.status, result.ok) for result in results] == [("error", False)]
+
+
+def tests_preflight(server):
+    session = vidarr.deploy.create_session(jobs=4, retries=0)
+    registrations = [vidarr.deploy.Registration(server, name, f"{server}/api/workflow/{name}/1.0")
+                     for name in ("new", "old", "changed", "partial")]
+    (remaining, results) = vidarr.deploy.preflight(session, registrations, WORKFLOW, jobs=4, timeout=5)
+    assert [registration.name for registration in remaining] == ["new", "partial"]
+    assert [(result.name, result.status) for result in results] == [
+        ("old", "already registered"), ("changed", "conflict")]
+    assert not any(method == "POST" for (method, _) in StubVidarr.requested)
+
+    # Once uploaded, the server's normalised copy of the version is recognised as the same workflow
+    vidarr.deploy.upload(session, remaining[:1], WORKFLOW, jobs=1, timeout=5)
+    (remaining, results) = vidarr.deploy.preflight(session, registrations[:1], WORKFLOW, jobs=1, timeout=5)
+    assert remaining == []
+    assert [(result.name, result.status) for result in results] == [("new", "already registered")]
+
+
+def tests_fingerprint():
+    assert vidarr.deploy.fingerprint({"outputs": {"x": 1, "y": 2}, "workflow": "z"}) == vidarr.deploy.fingerprint(
+        {"workflow": "z", "outputs": {"y": 2, "x": 1}, "accessoryFiles": None, "name": "a"})
+    assert vidarr.deploy.fingerprint({"workflow": "x"}) != vidarr.deploy.fingerprint({"workflow": "y"})
+    assert vidarr.deploy.fingerprint(WORKFLOW) == vidarr.deploy.fingerprint(normalise(WORKFLOW))
+
+
+def tests_upload_compression(server):
+    session = vidarr.deploy.create_session(jobs=2, retries=0)
+    workflow = {"workflow": "x" * 10000, "accessoryFiles": {"a.wdl": "y" * 10000}}
+    payload = vidarr.deploy.encode(workflow)
+    assert vidarr.deploy.encode(workflow) == payload
+    assert len(payload.compressed) < len(payload.raw)
+    assert payload.describe("v.out").startswith(f"v.out: {len(payload.raw):,} bytes, {len(payload.compressed):,} bytes")
+
+    registrations = [vidarr.deploy.Registration(server, name, f"{server}/api/workflow/{name}/1.0")
+                     for name in ("new", "plain")]
+    results = vidarr.deploy.upload(session, registrations, payload, jobs=2, timeout=5)
+    assert [(result.name, result.status) for result in results] == [("new", "registered"), ("plain", "registered")]
+    assert sorted((path, encoding) for (path, encoding, _) in StubVidarr.uploaded) == [
+        ("/api/workflow/new/1.0", "gzip"), ("/api/workflow/plain/1.0", "identity")]
+    assert all(body == workflow for (_, _, body) in StubVidarr.uploaded)
+
+    StubVidarr.uploaded.clear()
+    vidarr.deploy.upload(session, registrations[:1], workflow, jobs=1, timeout=5, compress=False)
+    assert [(path, encoding) for (path, encoding, _) in StubVidarr.uploaded] == [("/api/workflow/new/1.0", "identity")]
@@ -0,0 +1,40 @@
+import hashlib
+import io
+import json
+import os
+
+import pytest
+
+import vidarr.cache
+import vidarr.emit
+import vidarr.wdl
+
+JSON_OPTIONS = {
+    "default": {},
+    "pretty": {"indent": 4, "sort_keys": True},
+    "compact": {"separators": (",", ":"), "ensure_ascii": False},
+    "canonical": {"separators": (",", ":"), "ensure_ascii": False, "sort_keys": True},
+}
+
+
+@pytest.mark.parametrize("style", sorted(vidarr.emit.STYLES))
+def tests_write(style):
+    workflow = vidarr.wdl.parse(os.path.join(os.path.dirname(__file__), "dnaSeqQC.wdl"))
+    workflow["extra"] = {"zé": [1, {"nested": {}}], "empty": {}}
+    output = io.BytesIO()
+    written = vidarr.emit.write(workflow, output, style)
+    assert written == len(output.getvalue())
+    if vidarr.emit.orjson is None or style not in ("compact", "canonical"):
+        assert output.getvalue() == json.dumps(workflow, **JSON_OPTIONS[style]).encode("utf-8")
+    assert json.loads(output.getvalue()) == workflow
+    if style == "canonical":
+        assert hashlib.sha256(output.getvalue()).hexdigest() == vidarr.cache.canonical_hash(workflow)
+
+
+def tests_dump(tmp_path):
+    path = tmp_path / "out" / "v.out"
+    vidarr.emit.dump(str(path), {"a": 1})
+    with pytest.raises(TypeError):
+        vidarr.emit.dump(str(path), {"a": object()})
+    assert json.loads(path.read_text()) == {"a": 1}
+    assert os.listdir(tmp_path / "out") == ["v.out"]
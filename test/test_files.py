@@ -0,0 +1,9 @@
+import vidarr.files
+
+
+def tests_write_atomically(tmp_path):
+    path = tmp_path / "out" / "v.out"
+    vidarr.files.write_atomically(str(path), "{}")
+    vidarr.files.write_atomically(str(path), "[]")
+    assert path.read_text() == "[]"
+    assert [child.name for child in path.parent.iterdir()] == ["v.out"]
@@ -0,0 +1,106 @@
+import functools
+import http.server
+import threading
+
+import pytest
+
+import vidarr.mirror
+import vidarr.wdl
+
+COMMON = """version 1.0
+
+task common {
+    input {
+        String s
+    }
+    command <<<
+        echo ~{s}
+    >>>
+    output {
+        String out = read_string(stdout())
+    }
+}
+"""
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def remote(tmp_path):
+    """
+    A directory of WDL files served over HTTP, standing in for a remote host
+    """
+    served = tmp_path / "served"
+    (served / "lib").mkdir(parents=True)
+    (served / "lib/common.wdl").write_text(COMMON)
+    (served / "lib/remote.wdl").write_text('version 1.0\n\nimport "common.wdl" as common\n')
+    server = http.server.ThreadingHTTPServer(
+        ("127.0.0.1", 0), functools.partial(QuietHandler, directory=str(served)))
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    (tmp_path / "root.wdl").write_text(f"""version 1.0
+
+import "{base}/lib/remote.wdl" as remote
+
+workflow root {{
+    input {{
+        File f
+    }}
+    output {{
+        File out = f
+    }}
+}}
+""")
+    yield base, served
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def tests_mirror(remote, tmp_path):
+    (base, served) = remote
+    wdl_path = str(tmp_path / "root.wdl")
+    mirror_dir = str(tmp_path / "mirror")
+    assert vidarr.wdl.prefetch(wdl_path, mirror_dir) == [f"{base}/lib/common.wdl", f"{base}/lib/remote.wdl"]
+    expected = vidarr.wdl.parse(wdl_path, mirror=vidarr.mirror.Mirror(mirror_dir))
+    assert expected["accessoryFiles"] == {
+        f"{base}/lib/remote.wdl": (served / "lib/remote.wdl").read_text(),
+        f"{base}/lib/common.wdl": COMMON,
+    }
+
+    # Once mirrored, the remote host is not needed
+    (served / "lib/common.wdl").unlink()
+    (served / "lib/remote.wdl").unlink()
+    mirror = vidarr.mirror.Mirror(mirror_dir, offline=True)
+    assert vidarr.wdl.parse(wdl_path, mirror=mirror) == expected
+    assert not mirror.fetched
+
+
+def tests_mirror_offline(remote, tmp_path):
+    mirror = vidarr.mirror.Mirror(str(tmp_path / "mirror"), offline=True)
+    with pytest.raises(ValueError, match="offline"):
+        vidarr.wdl.parse(str(tmp_path / "root.wdl"), mirror=mirror)
+
+
+def tests_mirror_fetch(remote, tmp_path):
+    (base, _) = remote
+    mirror = vidarr.mirror.Mirror(str(tmp_path / "mirror"))
+    vidarr.wdl.parse(str(tmp_path / "root.wdl"), mirror=mirror)
+    assert mirror.fetched == {f"{base}/lib/common.wdl", f"{base}/lib/remote.wdl"}
+    assert mirror.get(f"{base}/lib/common.wdl") == COMMON
+
+
+def tests_mirror_opt_in(remote, tmp_path, monkeypatch):
+    (base, served) = remote
+    monkeypatch.setenv("VIDARR_MIRROR_DIR", str(tmp_path / "mirror"))
+    wdl_path = str(tmp_path / "root.wdl")
+    # Without a mirror, imported URLs are fetched for every conversion and nothing is stored
+    workflow = vidarr.wdl.parse(wdl_path)
+    assert workflow["accessoryFiles"][f"{base}/lib/common.wdl"] == COMMON
+    assert not (tmp_path / "mirror").exists()
+    (served / "lib/common.wdl").write_text(COMMON.replace("echo", "printf"))
+    assert vidarr.wdl.parse(wdl_path)["accessoryFiles"][f"{base}/lib/common.wdl"] != COMMON
@@ -0,0 +1,39 @@
+import json
+import xml.etree.ElementTree as ElementTree
+
+import vidarr.report
+import vidarr.runner
+
+
+def results():
+    return [
+        vidarr.runner.TestRunResult(vidarr.runner.TestRun("shard-1", "1.json", None, ("a", "b")), 0, 4.0),
+        vidarr.runner.TestRunResult(vidarr.runner.TestRun("shard-2", "2.json", None, ("c",)), 1, 3.0),
+        vidarr.runner.TestRunResult(vidarr.runner.TestRun("shard-3", "3.json", None, ("d",)), None),
+    ]
+
+
+def tests_write_junit(tmp_path):
+    cases = vidarr.report.test_cases("wf", results(), [vidarr.runner.TestKey("wf", "4", "e")])
+    path = tmp_path / "junit.xml"
+    vidarr.report.write_junit(str(path), cases)
+    root = ElementTree.parse(str(path)).getroot()
+    assert {key: root.get(key) for key in ("tests", "failures", "errors", "skipped", "time")} == {
+        "tests": "5", "failures": "1", "errors": "1", "skipped": "1", "time": "7.000"}
+    (suite,) = root
+    assert [(case.get("classname"), case.get("name"), case.get("time"), [child.tag for child in case])
+            for case in suite] == [
+        ("wf.4", "e", "0.000", ["skipped"]), ("wf.shard-1", "a", "2.000", []), ("wf.shard-1", "b", "2.000", []),
+        ("wf.shard-2", "c", "3.000", ["failure"]), ("wf.shard-3", "d", "0.000", ["error"])]
+
+
+def tests_write_summary(tmp_path):
+    path = tmp_path / "summary.json"
+    cases = vidarr.report.test_cases("wf", results(), [vidarr.runner.TestKey("wf", "4", "e")])
+    vidarr.report.write_summary(str(path), cases)
+    summary = json.loads(path.read_text())
+    assert summary["counts"] == {"passed": 2, "failed": 1, "cached": 1, "incomplete": 1}
+    assert summary["elapsed"] == 7.0
+    assert [test["id"] for test in summary["tests"]] == ["c", "a", "b", "e", "d"]
+    assert summary["tests"][0] == {"workflow": "wf", "file": "shard-2", "id": "c", "run": "shard-2", "status": "failed",
+                                   "elapsed": 3.0}
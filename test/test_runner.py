@@ -0,0 +1,172 @@
+import json
+import os
+import stat
+import time
+
+import pytest
+
+import vidarr.runner
+
+# A stand-in for the Vidarr CLI: each test file holds one test with the number of seconds to sleep and the exit status
+FAKE_VIDARR = r"""#!/bin/sh
+while [ $# -gt 0 ]; do
+  case "$1" in
+    -t) test_file="$2"; shift ;;
+    -o) output_directory="$2"; shift ;;
+  esac
+  shift
+done
+sleep_time=$(sed 's/.*"sleep": \([0-9.]*\).*/\1/' "$test_file")
+status=$(sed 's/.*"status": \([0-9]*\).*/\1/' "$test_file")
+[ -n "$output_directory" ] && echo "$test_file" > "$output_directory/ran"
+echo "Testing $test_file"
+sleep "$sleep_time"
+exit "$status"
+"""
+
+
+@pytest.fixture
+def fake_vidarr(tmp_path, monkeypatch):
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    executable = bin_dir / "vidarr"
+    executable.write_text(FAKE_VIDARR)
+    executable.chmod(executable.stat().st_mode | stat.S_IEXEC)
+    monkeypatch.setenv("PATH", f"{bin_dir}{os.pathsep}{os.environ['PATH']}")
+
+    def write_test(name: str, sleep_time: float, status: int) -> str:
+        path = tmp_path / f"{name}.json"
+        path.write_text(json.dumps([{"id": name, "sleep": sleep_time, "status": status}]))
+        return str(path)
+    return write_test
+
+
+def tests_run_concurrently(fake_vidarr, tmp_path):
+    tests = [fake_vidarr("vidarrtest-regression", 0.5, 0), fake_vidarr("vidarrtest-performance", 0.5, 0)]
+    runs = vidarr.runner.plan(tests, str(tmp_path / "output"))
+    assert [run.output_directory for run in runs] == [
+        str(tmp_path / "output" / "vidarrtest-regression"), str(tmp_path / "output" / "vidarrtest-performance")]
+    start = time.monotonic()
+    results = vidarr.runner.run_tests(runs, "config.json", "v.out")
+    assert time.monotonic() - start < 0.95
+    assert [result.returncode for result in results] == [0, 0]
+    for (run, test) in zip(runs, tests):
+        assert open(os.path.join(run.output_directory, "ran")).read().strip() == test
+
+
+def tests_plan_without_output_directory(fake_vidarr):
+    (run,) = vidarr.runner.plan([fake_vidarr("a", 0, 0)], None)
+    assert run.output_directory is None
+    runs = vidarr.runner.plan([fake_vidarr("a", 0, 0), fake_vidarr("b", 0, 0)], None)
+    assert len({run.output_directory for run in runs}) == 2
+    assert all(os.path.isdir(run.output_directory) for run in runs)
+    vidarr.runner.run_tests(runs, "config.json", "v.out")
+    for run in runs:
+        assert open(os.path.join(run.output_directory, "ran")).read().strip() == run.test_file
+
+
+def tests_run_jobs(fake_vidarr):
+    runs = vidarr.runner.plan([fake_vidarr("a", 0.3, 0), fake_vidarr("b", 0.3, 3)], None)
+    start = time.monotonic()
+    results = vidarr.runner.run_tests(runs, "config.json", "v.out", jobs=1)
+    assert time.monotonic() - start >= 0.6
+    assert [(result.returncode, result.ok) for result in results] == [(0, True), (3, False)]
+
+
+def tests_run_fail_fast(fake_vidarr):
+    runs = vidarr.runner.plan([fake_vidarr("slow", 10, 0), fake_vidarr("broken", 0, 1), fake_vidarr("later", 0, 0)],
+                              None)
+    start = time.monotonic()
+    results = vidarr.runner.run_tests(runs, "config.json", "v.out", jobs=2, fail_fast=True)
+    assert time.monotonic() - start < 5
+    assert [result.returncode for result in results] == [None, 1, None]
+
+
+def tests_partition():
+    assert vidarr.runner.partition([1, 1, 1, 1, 1], 2) == [[0, 2, 4], [1, 3]]
+    assert vidarr.runner.partition([10, 1, 1, 1, 6], 2) == [[0], [1, 2, 3, 4]]
+    assert vidarr.runner.partition([1], 3) == [[0]]
+
+
+def tests_plan_shards(tmp_path):
+    test_file = tmp_path / "vidarrtest-regression.json"
+    test_file.write_text(json.dumps([{"id": f"t{i}", "arguments": {}} for i in range(5)]))
+    shard_directory = tmp_path / "shards"
+    shard_directory.mkdir()
+    # Durations recorded for tests with the same id in another root workflow or test file are not used
+    durations = {vidarr.runner.TestKey("wf", "vidarrtest-regression", f"t{i}"): 40.0 if i == 0 else 10.0
+                 for i in range(5)}
+    durations[vidarr.runner.TestKey("other", "vidarrtest-regression", "t0")] = 10.0
+    durations[vidarr.runner.TestKey("wf", "vidarrtest-performance", "t0")] = 10.0
+    runs = vidarr.runner.plan([str(test_file)], str(tmp_path / "output"), shards=2,
+                              shard_directory=str(shard_directory), durations=durations, workflow="wf")
+    assert [run.name for run in runs] == ["vidarrtest-regression-shard-1", "vidarrtest-regression-shard-2"]
+    assert [run.test_ids for run in runs] == [("t0",), ("t1", "t2", "t3", "t4")]
+    assert runs[0].test_keys == (vidarr.runner.TestKey("wf", "vidarrtest-regression", "t0"),)
+    assert [test["id"] for test in json.load(open(runs[1].test_file))] == ["t1", "t2", "t3", "t4"]
+    assert runs[0].output_directory == str(tmp_path / "output" / "vidarrtest-regression-shard-1")
+
+
+def tests_run_shards(fake_vidarr, tmp_path):
+    passing = vidarr.runner.TestRun("a-shard-1", fake_vidarr("a", 0, 0), None, ("t1", "t2"), "wf", "a")
+    failing = vidarr.runner.TestRun("a-shard-2", fake_vidarr("b", 0, 1), None, ("t3",), "wf", "a")
+    # A test with the same id in another root workflow has its own result
+    other = vidarr.runner.TestRun("a", fake_vidarr("c", 0, 0), None, ("t3",), "other")
+    results = vidarr.runner.run_tests([passing, failing, other], "config.json", "v.out")
+    assert vidarr.runner.results_by_test(results) == {
+        vidarr.runner.TestKey("wf", "a", "t1"): True, vidarr.runner.TestKey("wf", "a", "t2"): True,
+        vidarr.runner.TestKey("wf", "a", "t3"): False, vidarr.runner.TestKey("other", "a", "t3"): True}
+
+
+def tests_exclude(tmp_path):
+    partial = tmp_path / "partial.json"
+    partial.write_text(json.dumps([{"id": "a"}, {"id": "b"}]))
+    complete = tmp_path / "complete.json"
+    complete.write_text(json.dumps([{"id": "c"}]))
+    untouched = tmp_path / "untouched.json"
+    untouched.write_text(json.dumps([{"id": "d"}]))
+    directory = tmp_path / "remaining"
+    directory.mkdir()
+    (test_files, excluded) = vidarr.runner.exclude(
+        [str(partial), str(complete), str(untouched)], str(directory), lambda test: test["id"] in ("a", "c"), "wf")
+    assert test_files == [str(directory / "partial.json"), str(untouched)]
+    assert json.load(open(test_files[0])) == [{"id": "b"}]
+    assert excluded == [(vidarr.runner.TestKey("wf", "partial", "a"), {"id": "a"}),
+                        (vidarr.runner.TestKey("wf", "complete", "c"), {"id": "c"})]
+
+
+def tests_run_listener(fake_vidarr):
+    runs = vidarr.runner.plan([fake_vidarr("a", 0.2, 0), fake_vidarr("b", 0, 2)], None)
+    events = []
+    results = vidarr.runner.run_tests(runs, "config.json", "v.out", listener=events.append)
+    assert [result.returncode for result in results] == [0, 2]
+    assert results[0].elapsed >= 0.2
+    for run in runs:
+        run_events = [event for event in events if event.run == run]
+        assert [event.kind for event in run_events] == ["start", "output", "finish"]
+        assert run_events[1].line == f"Testing {run.test_file}"
+        assert run_events[2].elapsed >= run_events[1].elapsed >= run_events[0].elapsed
+    assert [event.returncode for event in events if event.kind == "finish" and event.run == runs[1]] == [2]
+
+
+def tests_durations(tmp_path):
+    passing = vidarr.runner.TestRunResult(vidarr.runner.TestRun("a", "a.json", None, ("t1", "t2"), "wf"), 0, 10.0)
+    failing = vidarr.runner.TestRunResult(vidarr.runner.TestRun("b", "b.json", None, ("t3",), "wf"), 1, 3.0)
+    # The same ids in another root workflow are measured separately
+    other = vidarr.runner.TestRunResult(vidarr.runner.TestRun("a", "a.json", None, ("t1",), "other"), 0, 2.0)
+    durations = vidarr.runner.durations_by_test([passing, failing, other])
+    (t1, t2, t4) = (vidarr.runner.TestKey("wf", "a", test_id) for test_id in ("t1", "t2", "t4"))
+    other_t1 = vidarr.runner.TestKey("other", "a", "t1")
+    assert durations == {t1: 5.0, t2: 5.0, other_t1: 2.0}
+
+    history = tmp_path / "durations.json"
+    history.write_text(json.dumps({"wf": {"a": {"t1": 100.0, "t4": 7.0}}}))
+    assert vidarr.runner.slowdowns({t1: 1.0, t2: 4.0, other_t1: 1.5}, durations, minimum=1.0) == [(t1, 1.0, 5.0)]
+    vidarr.runner.record_durations(str(history), durations)
+    assert vidarr.runner.load_durations(str(history)) == {t1: 52.5, t2: 5.0, t4: 7.0, other_t1: 2.0}
+    assert json.loads(history.read_text()) == {
+        "other": {"a": {"t1": 2.0}}, "wf": {"a": {"t1": 52.5, "t2": 5.0, "t4": 7.0}}}
+
+    # A history keyed by test id alone is ignored
+    history.write_text(json.dumps({"t1": 100.0}))
+    assert vidarr.runner.load_durations(str(history)) == {}
@@ -0,0 +1,26 @@
+import json
+
+import vidarr.timing
+
+
+def tests_timings(tmp_path):
+    timings = vidarr.timing.Timings()
+    for _ in range(2):
+        with timings.phase("load"):
+            pass
+    timings.count("inputs", 3)
+    timings.count("inputs")
+    report_path = tmp_path / "timings.json"
+    timings.write(str(report_path))
+    report = json.load(open(report_path))
+    assert report["phases"]["load"]["calls"] == 2
+    assert report["phases"]["load"]["seconds"] >= 0
+    assert report["counts"] == {"inputs": 4}
+    assert report["total_seconds"] >= report["phases"]["load"]["seconds"]
+
+
+def tests_timings_disabled(monkeypatch):
+    monkeypatch.delenv(vidarr.timing.TIMINGS_ENV, raising=False)
+    assert vidarr.timing.enable() is None
+    with vidarr.timing.phase("load"):
+        vidarr.timing.count("inputs")
@@ -0,0 +1,88 @@
+import json
+import os
+
+import pytest
+
+import vidarr.validate
+
+
+def load_workflow(name):
+    with open(os.path.join(os.path.dirname(__file__), name)) as f:
+        return json.load(f)
+
+
+def external(path):
+    return {"type": "EXTERNAL", "contents": {"configuration": path, "externalIds": [{"id": "TEST", "provider": "TEST"}]}}
+
+
+def metadata(workflow):
+    return {name: {"type": "ALL", "contents": [{"outputDirectory": "/out"}]} for name in workflow["outputs"]}
+
+
+def tests_check_tests():
+    workflow = load_workflow("crosscheckFingerprints_retry.json")
+    test = {
+        "id": "ok",
+        "arguments": {
+            "crosscheckFingerprints.haplotypeMapFileName": "map.txt",
+            "crosscheckFingerprints.inputs": [external("/a.vcf"), external("/b.vcf")],
+            "crosscheckFingerprints.runCrosscheckFingerprints.jobMemory": [8, 16],
+            "crosscheckFingerprints.runCrosscheckFingerprints.picardMaxMemMb": 4000,
+            "crosscheckFingerprints.runCrosscheckFingerprints.lodThreshold": 0,
+            "crosscheckFingerprints.outputPrefix": None,
+        },
+        "description": "",
+        "engineArguments": {},
+        "metadata": metadata(workflow),
+        "validators": [],
+    }
+    assert vidarr.validate.check_tests([test], workflow) == []
+
+    bad = dict(test, arguments={
+        "crosscheckFingerprints.inputs": [external("/a.vcf"), {"type": "EXTERNAL", "contents": "/b.vcf"}],
+        "crosscheckFingerprints.runCrosscheckFingerprints.jobMemory": [8, "16"],
+        "crosscheckFingerprints.runCrosscheckFingerprints.threads": True,
+        "crosscheckFingerprints.typo": 1,
+    }, metadata={"crosscheckFingerprints.extra": {"type": "ALL", "contents": []}})
+    assert vidarr.validate.check_tests([test, bad, "x"], workflow) == [
+        "test ok: `id` is used by another test",
+        "test ok: missing argument crosscheckFingerprints.haplotypeMapFileName of type string",
+        "test ok: argument crosscheckFingerprints.inputs[1]: expected external file contents with `configuration` and a "
+        "list of `externalIds` but got \"/b.vcf\"",
+        "test ok: argument crosscheckFingerprints.runCrosscheckFingerprints.jobMemory[1]: expected integer but got "
+        "\"16\"",
+        "test ok: argument crosscheckFingerprints.runCrosscheckFingerprints.threads: expected integer but got true",
+        "test ok: unknown argument crosscheckFingerprints.typo",
+    ] + [f"test ok: missing metadata for output {name}" for name in workflow["outputs"]] + [
+        "test ok: metadata for unknown output crosscheckFingerprints.extra",
+        "test #2: expected an object but got \"x\"",
+    ]
+
+
+@pytest.mark.parametrize("vidarr_type,value,ok", [
+    ({"is": "pair", "left": "string", "right": "integer"}, {"left": "a", "right": 1}, True),
+    ({"is": "pair", "left": "string", "right": "integer"}, ["a", 1], False),
+    ({"is": "dictionary", "key": "string", "value": "floating"}, {"a": 1.5}, True),
+    ({"is": "dictionary", "key": "integer", "value": "string"}, [[1, "a"]], True),
+    ({"is": "dictionary", "key": "integer", "value": "string"}, {"1": "a"}, False),
+    ({"is": "object", "fields": {"a": "string", "b": {"is": "optional", "inner": "boolean"}}}, {"a": "x"}, True),
+    ({"is": "object", "fields": {"a": "string"}}, {"b": "x"}, False),
+    ({"is": "list", "inner": "directory"}, [{"type": "INTERNAL", "contents": ["vidarr:a/file/1"]}], True),
+    ({"is": "retry", "inner": {"is": "list", "inner": "integer"}}, [1, 2], True),
+    ("integer", 1.5, False),
+    ("floating", 1, True),
+    ("json", {"anything": [1]}, True),
+])
+def tests_check_value(vidarr_type, value, ok):
+    assert not list(vidarr.validate.check_value(vidarr_type, value, "x")) == ok
+
+
+def tests_check_test_files(tmp_path):
+    workflow = load_workflow("fastqc.json")
+    good = tmp_path / "good.json"
+    good.write_text(json.dumps([{"id": "a", "arguments": {"fastQC.fastqR1": external("/r1.fastq.gz")},
+                                 "metadata": metadata(workflow)}]))
+    broken = tmp_path / "broken.json"
+    broken.write_text("[{")
+    errors = vidarr.validate.check_test_files([str(good), str(broken), str(tmp_path / "missing.json")], workflow)
+    assert [error.split(":")[0] for error in errors] == [str(broken), str(tmp_path / "missing.json")]
@@ -1,8 +1,11 @@
+import asyncio
 import json
 import os
 
+import WDL
 import pytest
 
+import vidarr.cache
 import vidarr.wdl
 
 
@@ -60,3 +63,464 @@ def tests_bad():
     with pytest.raises(ValueError) as e:
         vidarr.wdl.parse(wdl_path)
     assert str(e.value) == f"Unable to load {wdl_path} due to the following errors:\nError 1 at line=13 and column=28:\nExpected Int instead of File"
+
+
+def tests_parse_many():
+    test_dir = os.path.dirname(__file__)
+    paths = [os.path.join(test_dir, name + ".wdl") for name in ("fastqc", "bad", "empty")]
+    results = list(vidarr.wdl.parse_many(paths, processes=2))
+    assert [result["path"] for result in results] == paths
+    assert ordered(results[0]["workflow"]) == ordered(json.load(open(os.path.join(test_dir, "fastqc.json"))))
+    assert results[1]["error"]["type"] == "ValueError"
+    assert "workflow" not in results[1]
+    assert ordered(results[2]["workflow"]) == ordered(json.load(open(os.path.join(test_dir, "empty.json"))))
+
+
+def tests_parse_many_glob():
+    test_dir = os.path.dirname(__file__)
+    results = list(vidarr.wdl.parse_many([os.path.join(test_dir, "imports", "*.wdl")], processes=1))
+    assert [os.path.basename(result["path"]) for result in results] == [
+        "pull_bamQC.wdl", "pull_bwaMem.wdl", "pull_fingerprintCollector.wdl"]
+
+
+def tests_cache(tmp_path, dnaSeqQC):
+    cache = vidarr.cache.Cache(str(tmp_path / "cache"))
+    wdl_path = dnaSeqQC
+    assert cache.get(wdl_path) is None
+    expected = vidarr.wdl.parse(wdl_path, cache)
+    assert cache.get(wdl_path) == expected
+    assert vidarr.wdl.parse(wdl_path, cache) == expected
+
+    # Changing an imported file must invalidate the cached workflow
+    with open(tmp_path / "wdl/imports/pull_bamQC.wdl", "a") as f:
+        f.write("\n")
+    assert cache.get(wdl_path) is None
+    assert vidarr.wdl.parse(wdl_path, cache) is not None
+    assert cache.get(wdl_path) is not None
+
+
+def tests_cache_source_changed(tmp_path, monkeypatch):
+    cache = vidarr.cache.Cache(str(tmp_path))
+    wdl_path = os.path.join(os.path.dirname(__file__), "fastqc.wdl")
+    vidarr.wdl.parse(wdl_path, cache)
+    assert cache.get(wdl_path) is not None
+    # A change to vidarr-tools that is not a new release must not return what the old code produced
+    monkeypatch.setattr(vidarr.cache, "VERSIONS", vidarr.cache.VERSIONS.replace("source=", "source=changed"))
+    assert cache.get(wdl_path) is None
+
+
+def tests_cache_unwritable(tmp_path, capsys):
+    # A cache directory inside a file can never be created
+    (tmp_path / "file").write_text("")
+    cache = vidarr.cache.Cache(str(tmp_path / "file/cache"))
+    wdl_path = os.path.join(os.path.dirname(__file__), "fastqc.wdl")
+    for _ in range(2):
+        assert vidarr.wdl.parse(wdl_path, cache) == vidarr.wdl.parse(wdl_path)
+    assert cache.get(wdl_path) is None
+    assert not cache.writable
+    assert capsys.readouterr().err.count("unable to write to the cache") == 1
+
+
+def tests_cache_eviction(tmp_path):
+    cache = vidarr.cache.Cache(str(tmp_path), max_size=0)
+    wdl_path = os.path.join(os.path.dirname(__file__), "fastqc.wdl")
+    vidarr.wdl.parse(wdl_path, cache)
+    assert cache.get(wdl_path) is None
+    assert not os.listdir(tmp_path)
+
+
+def tests_output_index():
+    candidates = [wdl_type for (wdl_type, _) in vidarr.wdl._output_mapping] + [
+        WDL.Type.Int(),
+        WDL.Type.Array(WDL.Type.File(optional=True)),
+        WDL.Type.Array(WDL.Type.StructInstance("Sample")),
+        WDL.Type.Map((WDL.Type.String(), WDL.Type.File())),
+        WDL.Type.Pair(WDL.Type.File(), WDL.Type.Map((WDL.Type.String(), WDL.Type.Int()))),
+    ]
+    for wdl_type in candidates:
+        expected = next((vidarr_type for (vidarr_wdl_type, vidarr_type) in vidarr.wdl._output_mapping
+                         if wdl_type == vidarr_wdl_type), None)
+        assert vidarr.wdl._output_index.get(vidarr.wdl._type_key(wdl_type)) == expected
+
+
+def tests_structures():
+    doc = WDL.parse_document("""version 1.0
+struct Outer { Array[Inner] inners Middle middle }
+struct Middle { Inner inner }
+struct Inner { Int x }
+""")
+    structures = vidarr.wdl._map_structures(doc.struct_typedefs)
+    assert structures["Inner"] == {"x": "integer"}
+    assert structures["Middle"] == {"inner": {"is": "object", "fields": {"x": "integer"}}}
+    assert structures["Outer"]["inners"] == {"is": "list", "inner": {"is": "object", "fields": {"x": "integer"}}}
+
+
+def tests_structures_cyclic():
+    doc = WDL.parse_document("""version 1.0
+struct A { B b Leaf leaf }
+struct B { Array[A] a }
+struct C { A a }
+struct Leaf { Int x }
+""")
+    with pytest.raises(ValueError) as e:
+        vidarr.wdl._map_structures(doc.struct_typedefs)
+    assert str(e.value) == "Structs have cyclic definitions: A, B"
+
+
+def tests_structures_undefined():
+    doc = WDL.parse_document("""version 1.0
+struct A { Missing m }
+""")
+    with pytest.raises(ValueError) as e:
+        vidarr.wdl._map_structures(doc.struct_typedefs)
+    assert str(e.value) == "Struct A uses undefined struct Missing"
+
+
+def tests_cache_test_results(tmp_path):
+    cache = vidarr.cache.Cache(str(tmp_path))
+    workflow_hash = vidarr.cache.canonical_hash({"b": 1, "a": [1, 2]})
+    assert workflow_hash == vidarr.cache.canonical_hash({"a": [1, 2], "b": 1})
+    key = vidarr.cache.Cache.test_key(workflow_hash, {"id": "t"}, "config")
+    assert key != vidarr.cache.Cache.test_key(workflow_hash, {"id": "t", "arguments": {}}, "config")
+    assert not cache.has_passed(key)
+    cache.record_pass(key)
+    assert cache.has_passed(key)
+
+
+@pytest.mark.parametrize("supported", [True, False])
+def tests_trust_validated(tmp_path, monkeypatch, dnaSeqQC, typechecked, supported):
+    # With a miniwdl release the internals were not tested with, only the public parser is used and every file is
+    # typechecked, even if trusted
+    monkeypatch.setattr(vidarr.wdl, "TRUST_SUPPORTED", supported)
+    cache = vidarr.cache.Cache(str(tmp_path / "cache"))
+    expected = vidarr.wdl.convert(vidarr.wdl.load(dnaSeqQC, cache=cache))
+    typechecked.clear()
+    assert vidarr.wdl.convert(vidarr.wdl.load(dnaSeqQC, cache=cache, trust_validated=True)) == expected
+    assert sorted(typechecked) == ([] if supported else ["dnaSeqQC.wdl", "pull_bamQC.wdl", "pull_bwaMem.wdl"])
+
+    # A changed file is not trusted, and neither is anything that imports it
+    typechecked.clear()
+    with open(tmp_path / "wdl/imports/pull_bamQC.wdl", "a") as f:
+        f.write("\n")
+    trusted = vidarr.wdl.convert(vidarr.wdl.load(dnaSeqQC, cache=cache, trust_validated=True))
+    assert sorted(typechecked) == (["dnaSeqQC.wdl", "pull_bamQC.wdl"] if supported else
+                                   ["dnaSeqQC.wdl", "pull_bamQC.wdl", "pull_bwaMem.wdl"])
+    assert trusted == vidarr.wdl.parse(dnaSeqQC)
+
+    # Invalid files are never recorded, so they are still rejected
+    bad_path = os.path.join(os.path.dirname(__file__), "bad.wdl")
+    for _ in range(2):
+        with pytest.raises(ValueError):
+            vidarr.wdl.load(bad_path, cache=cache, trust_validated=True)
+
+
+def tests_loader(tmp_path, dnaSeqQC):
+    wdl_dir = tmp_path / "wdl"
+    wdl_path = dnaSeqQC
+    loader = vidarr.wdl.Loader()
+    doc = loader.load(wdl_path)
+    assert vidarr.wdl.convert(doc) == vidarr.wdl.parse(wdl_path)
+    assert sorted(loader.paths) == sorted(str(wdl_dir / name) for name in (
+        "dnaSeqQC.wdl", "imports/pull_bwaMem.wdl", "imports/pull_bamQC.wdl"))
+    assert loader.load(wdl_path) is doc
+
+    # Only the changed import and the root are loaded again
+    imports = {imp.namespace: imp.doc for imp in doc.imports}
+    with open(wdl_dir / "imports/pull_bamQC.wdl", "a") as f:
+        f.write("\n")
+    reloaded = loader.load(wdl_path)
+    assert reloaded is not doc
+    reloaded_imports = {imp.namespace: imp.doc for imp in reloaded.imports}
+    assert reloaded_imports["bwaMem"] is imports["bwaMem"]
+    assert reloaded_imports["bamQC"] is not imports["bamQC"]
+    assert vidarr.wdl.convert(reloaded) == vidarr.wdl.parse(wdl_path)
+
+
+def tests_loader_error():
+    with pytest.raises(ValueError):
+        vidarr.wdl.Loader().load(os.path.join(os.path.dirname(__file__), "bad.wdl"))
+
+
+LIBRARY_TASK = """version 1.0
+
+task common {
+    input {
+        String s
+    }
+    command <<<
+        echo ~{s}
+    >>>
+    output {
+        String out = read_string(stdout())
+    }
+}
+"""
+
+
+def write_import_graph(wdl_dir, a_import: str):
+    (wdl_dir / "a").mkdir(parents=True)
+    (wdl_dir / "lib").mkdir()
+    (wdl_dir / "lib/common.wdl").write_text(LIBRARY_TASK)
+    (wdl_dir / "a/a.wdl").write_text(f'version 1.0\n\nimport "{a_import}" as common\n')
+    (wdl_dir / "b.wdl").write_text('version 1.0\n\nimport "lib/common.wdl" as common\n')
+    (wdl_dir / "root.wdl").write_text("""version 1.0
+
+import "a/a.wdl" as a
+import "b.wdl" as b
+
+workflow root {
+    input {
+        File f
+    }
+    output {
+        File out = f
+    }
+}
+""")
+    return str(wdl_dir / "root.wdl")
+
+
+def tests_import_graph(tmp_path):
+    wdl_path = write_import_graph(tmp_path, "../lib/common.wdl")
+    doc = vidarr.wdl.load(wdl_path)
+    (a, b) = (imp.doc for imp in doc.imports)
+    # The library imported through both paths is loaded once
+    assert a.imports[0].doc is b.imports[0].doc
+    workflow = vidarr.wdl.convert(doc)
+    assert workflow["accessoryFiles"] == {
+        "a/a.wdl": (tmp_path / "a/a.wdl").read_text(),
+        "b.wdl": (tmp_path / "b.wdl").read_text(),
+        "lib/common.wdl": LIBRARY_TASK,
+    }
+
+
+def tests_import_read_once(tmp_path):
+    wdl_path = write_import_graph(tmp_path, "../lib/common.wdl")
+    reads = []
+
+    async def read_source(uri, path, importer):
+        result = await vidarr.wdl._read_source(uri, path, importer)
+        reads.append(os.path.relpath(result.abspath, tmp_path))
+        return result
+
+    vidarr.wdl.Loader(read_source).load(wdl_path)
+    # The library is imported by both a/a.wdl and b.wdl, but only read once
+    assert sorted(reads) == ["a/a.wdl", "b.wdl", "lib/common.wdl", "root.wdl"]
+
+def tests_import_names(tmp_path):
+    # A copy of the library outside the root workflow's directory is imported under a different name
+    (tmp_path / "lib").mkdir()
+    (tmp_path / "lib/common.wdl").write_text(LIBRARY_TASK)
+    wdl_path = write_import_graph(tmp_path / "workflow", "../../lib/common.wdl")
+    workflow = vidarr.wdl.convert(vidarr.wdl.load(wdl_path))
+    # Each import is found by the workflow engine using its name, so identical files with different names are all kept
+    assert sorted(workflow["accessoryFiles"]) == ["../lib/common.wdl", "a/a.wdl", "b.wdl", "lib/common.wdl"]
+    for (name, source_text) in workflow["accessoryFiles"].items():
+        assert (tmp_path / "workflow" / name).read_text() == source_text
+
+
+def tests_import_cycle(tmp_path):
+    wdl_path = write_import_graph(tmp_path, "../root.wdl")
+    with pytest.raises(ValueError, match="circular imports"):
+        vidarr.wdl.load(wdl_path)
+
+
+def tests_parse_sources():
+    test_dir = os.path.dirname(__file__)
+    sources = {}
+    for name in ("dnaSeqQC.wdl", "imports/pull_bwaMem.wdl", "imports/pull_bamQC.wdl"):
+        with open(os.path.join(test_dir, name)) as f:
+            sources[os.path.join("virtual", name)] = f.read()
+    assert vidarr.wdl.parse_sources("virtual/dnaSeqQC.wdl", sources) == vidarr.wdl.parse(
+        os.path.join(test_dir, "dnaSeqQC.wdl"))
+
+    del sources["virtual/imports/pull_bamQC.wdl"]
+    with pytest.raises(ValueError, match="pull_bamQC"):
+        vidarr.wdl.parse_sources("virtual/dnaSeqQC.wdl", sources)
+    with pytest.raises(ValueError):
+        vidarr.wdl.parse_sources("missing.wdl", sources)
+
+
+def tests_parameter_meta():
+    task = """version 1.0
+
+task align {
+    input {
+        Int threads = 4
+        String reference = "hg38"
+    }
+    parameter_meta {
+        threads: {description: "Threads", vidarr_retry: true}
+        reference: {vidarr_type: "string"}
+    }
+    command <<<
+        echo ~{threads} ~{reference}
+    >>>
+    output {
+        File out = stdout()
+    }
+}
+"""
+    subworkflow = """version 1.0
+
+import "task.wdl" as tasks
+
+workflow sub {
+    input {
+        Int memory = 8
+    }
+    parameter_meta {
+        memory: {vidarr_retry: true}
+    }
+    call tasks.align as subAlign
+    output {
+        File out = subAlign.out
+    }
+}
+"""
+    root = """version 1.0
+
+import "task.wdl" as tasks
+import "sub.wdl" as sub
+
+workflow root {
+    call tasks.align as first
+    call tasks.align as second {
+        input:
+            threads = 1
+    }
+    call sub.sub as nested
+    output {
+        File out = nested.out
+    }
+}
+"""
+    workflow = vidarr.wdl.parse_sources("root.wdl", {"root.wdl": root, "sub.wdl": subworkflow, "task.wdl": task})
+    retry_integer = {"is": "optional", "inner": {"is": "retry", "inner": "integer"}}
+    string = {"is": "optional", "inner": "string"}
+    assert workflow["parameters"] == {
+        "root.first.threads": retry_integer,
+        "root.first.reference": string,
+        "root.second.reference": string,
+        "root.nested.memory": retry_integer,
+        "root.nested.subAlign.threads": retry_integer,
+        "root.nested.subAlign.reference": string,
+    }
+
+
+def tests_label_outputs(tmp_path):
+    wdl_path = tmp_path / "labels.wdl"
+    wdl_path.write_text("""version 1.0
+
+workflow labels {
+    input {
+        File f
+        File? g
+    }
+    output {
+        File a = f  File b = f
+        File? c = select_first([
+            g,
+            f
+        ])
+        Pair[File, Map[String, String]] d = (f, {"kind": "d"})
+    }
+    meta {
+        output_meta: {
+            a: {vidarr_label: "a"},
+            b: {vidarr_label: "b"},
+            c: {vidarr_label: "c"},
+            d: {vidarr_label: "d"}
+        }
+    }
+}
+""")
+    doc = vidarr.wdl.load(str(wdl_path))
+    source_lines = list(doc.source_lines)
+    workflow = vidarr.wdl.convert(doc)
+    assert workflow["outputs"] == {
+        "labels.a": "file-with-labels",
+        "labels.b": "file-with-labels",
+        "labels.c": "optional-file-with-labels",
+        "labels.d": "file-with-labels",
+    }
+    assert """        Pair[File, Map[String, String]] a = (f, {"vidarr_label": "a"})  Pair[File, Map[String, String]] b = (f, \
+{"vidarr_label": "b"})
+        Pair[File, Map[String,String]]? c = if defined(select_first([
+            g,
+            f
+        ])) then (select_first([select_first([
+            g,
+            f
+        ])]), {"vidarr_label": "c"}) else empty_optional_pair
+        Pair[File, Map[String, String]] d = (f, {"kind": "d", "vidarr_label": "d"})
+""" in workflow["workflow"]
+    WDL.parse_document(workflow["workflow"]).typecheck()
+
+    # Converting must not change the document, so it can be converted again
+    assert doc.source_lines == source_lines
+    assert vidarr.wdl.convert(doc) == workflow
+
+
+def tests_label_overridden(tmp_path, capsys):
+    wdl_path = tmp_path / "labels.wdl"
+    wdl_path.write_text("""version 1.0
+
+workflow labels {
+    input {
+        File f
+    }
+    output {
+        File a = f
+    }
+    meta {
+        output_meta: {
+            a: {vidarr_label: "a", vidarr_type: "file"}
+        }
+    }
+}
+""")
+    assert vidarr.wdl.parse(str(wdl_path))["outputs"] == {"labels.a": "file"}
+    # Batch mode writes the workflows to standard output, so the warning must not be mixed in with them
+    captured = capsys.readouterr()
+    assert not captured.out
+    assert "overriden by the specified vidarr_type" in captured.err
+
+def tests_parse_async():
+    wdl_paths = [os.path.join(os.path.dirname(__file__), name + ".wdl") for name in ("dnaSeqQC", "fastqc", "star")]
+
+    async def convert_all():
+        semaphore = asyncio.Semaphore(2)
+        ticks = 0
+
+        async def tick():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.001)
+                ticks += 1
+
+        ticker = asyncio.create_task(tick())
+        workflows = await asyncio.gather(
+            *(vidarr.wdl.parse_async(wdl_path, semaphore=semaphore) for wdl_path in wdl_paths))
+        ticker.cancel()
+        return workflows, ticks
+
+    (workflows, ticks) = asyncio.run(convert_all())
+    assert workflows == [vidarr.wdl.parse(wdl_path) for wdl_path in wdl_paths]
+    # The event loop kept running while the files were converted
+    assert ticks > 0
+
+
+def tests_parse_async_cancel():
+    wdl_path = os.path.join(os.path.dirname(__file__), "dnaSeqQC.wdl")
+
+    async def cancel():
+        task = asyncio.create_task(vidarr.wdl.parse_async(wdl_path))
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # Other conversions are unaffected
+        return await vidarr.wdl.parse_async(wdl_path)
+
+    assert asyncio.run(cancel()) == vidarr.wdl.parse(wdl_path)
@@ -0,0 +1,34 @@
+import threading
+
+import pytest
+
+import vidarr.cache
+import vidarr.watch
+
+
+@pytest.mark.parametrize("inotify", [True, False])
+def tests_wait_for_change(tmp_path, monkeypatch, inotify):
+    if inotify and vidarr.watch.inotify_simple is None:
+        pytest.skip("inotify_simple is not installed")
+    if not inotify:
+        monkeypatch.setattr(vidarr.watch, "inotify_simple", None)
+    path = tmp_path / "a.wdl"
+    path.write_text("version 1.0\n")
+    files = {str(path): vidarr.cache.hash_text("version 1.0\n")}
+    timer = threading.Timer(0.2, lambda: path.write_text("version 1.1\n"))
+    timer.start()
+    methods = []
+    vidarr.watch.wait_for_change(files, 0.05, methods.append)
+    timer.join()
+    assert path.read_text() == "version 1.1\n"
+    assert methods == ["using inotify" if inotify else "by polling; install inotify_simple to use inotify"]
+
+
+def tests_wait_for_creation(tmp_path):
+    path = tmp_path / "a.wdl"
+    timer = threading.Timer(0.2, lambda: path.write_text("version 1.0\n"))
+    timer.start()
+    vidarr.watch.wait_for_change({str(path): None}, 0.05)
+    timer.join()
+    assert path.exists()
+
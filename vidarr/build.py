@@ -0,0 +1,105 @@
+import json
+import os
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+# In the future, other workflow languages should be added here.
+LANGUAGES = ("wdl",)
+
+DEFAULT_OUTPUT = "v.out"
+
+
+class Root(NamedTuple):
+    """
+    A root workflow in a build configuration, which is built, tested, and deployed on its own
+    """
+    names: Tuple[str, ...]
+    """The workflow names on the Vidarr servers to deploy to"""
+    language: str
+    """The workflow language, which is one of :data:`LANGUAGES`"""
+    path: str
+    """The path to the root workflow file"""
+    output: str
+    """The path to write the built workflow to"""
+    test_directory: str
+    """The directory containing the regression and performance test files"""
+
+    @property
+    def name(self) -> str:
+        return self.names[0]
+
+    def test_files(self, performance: bool) -> List[str]:
+        """
+        Get the paths to the test files for this workflow
+
+        :param performance: whether to include the performance tests
+        """
+        names = ["vidarrtest-regression.json"] + (["vidarrtest-performance.json"] if performance else [])
+        return [os.path.join(self.test_directory, name) for name in names]
+
+
+def _read_root(entry: Any, config_directory: str, multiple: bool) -> Root:
+    if not isinstance(entry, dict):
+        raise ValueError("Each root workflow in the configuration file must be an object.")
+    names = entry.get("names")
+    if not isinstance(names, list) or not names or any(not isinstance(n, str) for n in names):
+        raise ValueError(
+            "The `names` property must be present in the configuration file and contain a list of workflow names for "
+            "deployment.")
+    languages = [language for language in LANGUAGES if language in entry]
+    if len(languages) != 1:
+        raise ValueError("The configuration file must have exactly one root workflow.")
+    (language,) = languages
+    if not isinstance(entry[language], str):
+        raise ValueError(f"The `{language}` property must contain the name of the root workflow file.")
+    # Get a path that looks like `/dir/where/vidarrbuild-dot-json/is/wdl`
+    path = os.path.join(config_directory, entry[language])
+    if not os.path.exists(path):
+        raise ValueError(f"Cannot find {path}.")
+    # With many roots, each is written to a separate file by default
+    output = entry.get("output", f"{names[0]}.out" if multiple else DEFAULT_OUTPUT)
+    if not isinstance(output, str) or not output:
+        raise ValueError("The `output` property must contain the path to write the built workflow to.")
+    # With many roots, the tests would all be in the same files if they were next to the configuration file, so each
+    # root's tests are next to its root workflow file by default
+    test_directory = os.path.dirname(path) if multiple else config_directory
+    if "tests" in entry:
+        if not isinstance(entry["tests"], str):
+            raise ValueError("The `tests` property must contain the directory of the workflow's test files.")
+        test_directory = os.path.normpath(os.path.join(config_directory, entry["tests"]))
+    return Root(tuple(names), language, path, output, test_directory)
+
+
+def read_config(config_path: str) -> List[Root]:
+    """
+    Read a vidarr-build configuration file
+
+    The file either describes a single root workflow, with its ``names`` and its file under the key for its language,
+    or has a list of such objects as ``roots``. Each root may also have an ``output`` path, relative to the current
+    directory, which defaults to ``v.out`` for a single root and the first name followed by ``.out`` otherwise, and a
+    ``tests`` directory, relative to the configuration file, containing its test files, which defaults to the directory
+    containing the configuration file for a single root and the directory containing the root's workflow file otherwise.
+    Each root must have a different test directory.
+
+    :param config_path: the path to the configuration file
+    :return: the root workflows
+    :raises ValueError: if the configuration is invalid
+    """
+    with open(config_path) as cf:
+        config: Dict[str, Any] = json.load(cf)
+    config_directory = os.path.dirname(config_path)
+    if isinstance(config, dict) and "roots" in config:
+        if not isinstance(config["roots"], list) or not config["roots"]:
+            raise ValueError("The `roots` property must contain a list of root workflows.")
+        roots = [_read_root(entry, config_directory, len(config["roots"]) > 1) for entry in config["roots"]]
+    else:
+        roots = [_read_root(config, config_directory, False)]
+    outputs = [os.path.normpath(root.output) for root in roots]
+    if len(set(outputs)) != len(outputs):
+        raise ValueError("Each root workflow must have a different `output`.")
+    names = [root.name for root in roots]
+    if len(set(names)) != len(names):
+        raise ValueError("Each root workflow must have a different first name.")
+    test_directories = [root.test_directory for root in roots]
+    if len(set(test_directories)) != len(test_directories):
+        raise ValueError("Each root workflow must have a different `tests` directory.")
+    return roots
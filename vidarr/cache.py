@@ -0,0 +1,271 @@
+import hashlib
+import importlib.metadata
+import json
+import os
+import sys
+from typing import Any, Dict, List, Optional, Tuple, TYPE_CHECKING
+
+import vidarr.files
+
+if TYPE_CHECKING:
+    import WDL
+
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024
+
+
+def _read_version() -> str:
+    try:
+        with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "VERSION")) as f:
+            return f.read().strip()
+    except OSError:
+        return "unknown"
+
+
+def _read_miniwdl_version() -> str:
+    try:
+        return importlib.metadata.version("miniwdl")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def _hash_sources() -> str:
+    # The VERSION file is only changed for releases, so the code itself is part of the key; otherwise, a modified
+    # converter would silently return what the previous code produced
+    digest = hashlib.sha256()
+    directory = os.path.dirname(os.path.abspath(__file__))
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".py"):
+            with open(os.path.join(directory, name), "rb") as f:
+                digest.update(name.encode("utf-8") + b"\0" + f.read() + b"\0")
+    return digest.hexdigest()
+
+
+VERSIONS = f"vidarr-tools={_read_version()};source={_hash_sources()};miniwdl={_read_miniwdl_version()}"
+
+
+def default_directory() -> str:
+    """
+    Get the cache directory used when none is specified
+
+    This is the ``VIDARR_CACHE_DIR`` environment variable, if set, or ``vidarr-tools`` in the user's cache directory.
+    """
+    if "VIDARR_CACHE_DIR" in os.environ:
+        return os.environ["VIDARR_CACHE_DIR"]
+    return os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+        "vidarr-tools")
+
+
+def hash_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def canonical_hash(value: Any) -> str:
+    """
+    Hash a JSON-compatible value such that the order of keys in objects does not change the hash
+    """
+    return hash_text(json.dumps(value, sort_keys=True, separators=(",", ":"), ensure_ascii=False))
+
+
+def imported_documents(doc: "WDL.Document") -> List[Tuple[str, "WDL.Document"]]:
+    """
+    Collect every document transitively imported by a document, with the URI used to import it
+    """
+    documents = []
+    for imported in doc.imports:
+        documents.append((imported.uri, imported.doc))
+        documents.extend(imported_documents(imported.doc))
+    return documents
+
+
+class Cache:
+    """
+    A persistent, content-addressed cache of converted Vidarr workflow definitions
+
+    Each converted workflow is stored under a key derived from the source of the root WDL file, the URI and source of
+    every transitively imported file, the version and source code of vidarr-tools, and the version of miniwdl. Since
+    the imports can only be discovered by loading the WDL file, a manifest for each root file records the absolute
+    paths of its imports so the key can be recomputed from the files on disk without invoking miniwdl.
+
+    The cache also records which tests have passed, so they can be skipped when nothing they depend on has changed,
+    and which WDL documents have passed typechecking, so the typechecking can be skipped for trusted sources.
+
+    When the cache grows beyond its maximum size, the least recently used files are removed.
+
+    The cache is only an optimisation, so if its directory cannot be read or written, a warning is shown and everything
+    carries on as if nothing were cached.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_size: int = DEFAULT_MAX_SIZE):
+        """
+        :param directory: the directory to store the cache in; see :func:`default_directory` if not provided
+        :param max_size: the maximum size, in bytes, of all files in the cache
+        """
+        self.directory = directory or default_directory()
+        self.max_size = max_size
+        self.writable = True
+        """Whether files can be stored in the cache; this is cleared once storing a file fails"""
+
+    def _path(self, kind: str, key: str) -> str:
+        return os.path.join(self.directory, f"{kind}-{key}.json")
+
+    def _manifest_key(self, wdl_file_path: str, source_text: str) -> str:
+        return hash_text(f"{VERSIONS}\0{os.path.abspath(wdl_file_path)}\0{hash_text(source_text)}")
+
+    @staticmethod
+    def _entry_key(source_text: str, imports: List[Tuple[str, str]]) -> str:
+        digest = hashlib.sha256(VERSIONS.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(hash_text(source_text).encode("utf-8"))
+        for (uri, imported_source_text) in imports:
+            digest.update(b"\0")
+            digest.update(uri.encode("utf-8"))
+            digest.update(b"\0")
+            digest.update(hash_text(imported_source_text).encode("utf-8"))
+        return digest.hexdigest()
+
+    def _load(self, path: str) -> Optional[Any]:
+        try:
+            with open(path) as f:
+                value = json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return value
+
+    def _store(self, path: str, value: Any):
+        if not self.writable:
+            return
+        try:
+            with vidarr.files.open_atomically(path) as f:
+                json.dump(value, f)
+        except OSError as e:
+            self.writable = False
+            sys.stderr.write(f"Warning: unable to write to the cache in {self.directory}, so it will not be used: "
+                             f"{e}\n")
+
+    def get(self, wdl_file_path: str) -> Optional[Dict[str, Any]]:
+        """
+        Find the converted Vidarr workflow definition for a WDL file
+
+        :param wdl_file_path: the path to the WDL file
+        :return: the Vidarr configuration object or None if the file, or any file it imports, has not been converted
+        """
+        try:
+            with open(wdl_file_path) as f:
+                source_text = f.read()
+        except OSError:
+            return None
+        manifest = self._load(self._path("manifest", self._manifest_key(wdl_file_path, source_text)))
+        if not isinstance(manifest, list):
+            return None
+        imports = []
+        for (uri, abspath) in manifest:
+            try:
+                with open(abspath) as f:
+                    imports.append((uri, f.read()))
+            except OSError:
+                return None
+        return self._load(self._path("entry", self._entry_key(source_text, imports)))
+
+    def put(self, wdl_file_path: str, doc: "WDL.Document", workflow: Dict[str, Any]):
+        """
+        Store the converted Vidarr workflow definition for a WDL file
+
+        :param wdl_file_path: the path to the WDL file
+        :param doc: the loaded WDL document, used to find the imported files
+        :param workflow: the Vidarr configuration object
+        """
+        imported = imported_documents(doc)
+        self._store(
+            self._path("manifest", self._manifest_key(wdl_file_path, doc.source_text)),
+            [(uri, imported_doc.pos.abspath) for (uri, imported_doc) in imported])
+        self._store(
+            self._path("entry", self._entry_key(
+                doc.source_text, [(uri, imported_doc.source_text) for (uri, imported_doc) in imported])),
+            workflow)
+        self.evict()
+
+    @staticmethod
+    def test_key(workflow_hash: str, test: Any, test_config_hash: str) -> str:
+        """
+        Create a key for a test that changes when anything that can affect the test's outcome changes
+
+        :param workflow_hash: the :func:`canonical_hash` of the built workflow definition
+        :param test: the test object
+        :param test_config_hash: the hash of the contents of the Vidarr test configuration file
+        """
+        return canonical_hash([workflow_hash, test, test_config_hash])
+
+    def has_passed(self, test_key: str) -> bool:
+        """
+        Check if a test has previously passed
+
+        :param test_key: the key for the test from :meth:`test_key`
+        """
+        return self._load(self._path("test", test_key)) is not None
+
+    def record_pass(self, test_key: str):
+        """
+        Record that a test has passed
+
+        :param test_key: the key for the test from :meth:`test_key`
+        """
+        self._store(self._path("test", test_key), True)
+        self.evict()
+
+    @staticmethod
+    def validation_key(source_hash: str, import_keys: List[str]) -> str:
+        """
+        Create a key for a WDL document that changes when anything that can affect whether it typechecks changes
+
+        :param source_hash: the :func:`hash_text` of the document's source
+        :param import_keys: the validation keys of the documents it imports, in the order they are imported
+        """
+        return canonical_hash([VERSIONS, source_hash, import_keys])
+
+    def is_validated(self, validation_key: str) -> bool:
+        """
+        Check if a WDL document has previously passed typechecking
+
+        :param validation_key: the key for the document from :meth:`validation_key`
+        """
+        return self._load(self._path("valid", validation_key)) is not None
+
+    def record_validated(self, validation_key: str):
+        """
+        Record that a WDL document has passed typechecking
+
+        Since many documents are recorded for each load, this does not evict old files; that happens when the
+        converted workflow is stored.
+
+        :param validation_key: the key for the document from :meth:`validation_key`
+        """
+        self._store(self._path("valid", validation_key), True)
+
+    def evict(self):
+        """
+        Remove the least recently used files until the cache fits in its maximum size
+        """
+        try:
+            files = [entry for entry in os.scandir(self.directory) if entry.is_file() and entry.name.endswith(".json")]
+        except OSError:
+            return
+        stats = []
+        for entry in files:
+            try:
+                stats.append((entry.stat(), entry.path))
+            except OSError:
+                pass
+        total = sum(stat.st_size for (stat, _) in stats)
+        for (stat, path) in sorted(stats, key=lambda item: item[0].st_mtime_ns):
+            if total <= self.max_size:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                continue
+            total -= stat.st_size
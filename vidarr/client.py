@@ -0,0 +1,160 @@
+import argparse
+import errno
+import json
+import os
+import socket
+import sys
+import tempfile
+from typing import Any, Dict, Optional
+
+import vidarr.cache
+import vidarr.emit
+import vidarr.mirror
+
+SOCKET_ENV = "VIDARR_DAEMON_SOCKET"
+
+# This module is imported before the daemon is contacted, so it must not import miniwdl (directly or through
+# vidarr.wdl) at the top level; doing so would pay the cost the daemon exists to avoid.
+
+
+def default_socket() -> str:
+    """
+    Get the path of the conversion daemon's socket
+
+    This is the ``VIDARR_DAEMON_SOCKET`` environment variable, if set, or ``vidarr-tools.sock`` in the user's runtime
+    directory.
+    """
+    if SOCKET_ENV in os.environ:
+        return os.environ[SOCKET_ENV]
+    runtime_directory = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_directory:
+        return os.path.join(runtime_directory, "vidarr-tools.sock")
+    return os.path.join(tempfile.gettempdir(), f"vidarr-tools-{os.getuid()}.sock")
+
+
+def send(socket_path: str, message: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Send a request to the conversion daemon
+
+    :param socket_path: the path to the daemon's socket
+    :param message: the request object
+    :return: the response object or None if no daemon is listening on the socket
+    """
+    connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        try:
+            connection.connect(socket_path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            return None
+        with connection.makefile("rwb") as stream:
+            stream.write(json.dumps(message).encode("utf-8") + b"\n")
+            stream.flush()
+            line = stream.readline()
+        if not line:
+            return None
+        return json.loads(line)
+    finally:
+        connection.close()
+
+
+def parse(wdl_file_path: str, cache: Optional[Any] = None, socket_path: Optional[str] = None,
+          mirror: Optional[Any] = None, trust_validated: bool = False) -> Dict[str, Any]:
+    """
+    Convert a WDL file into a Vidarr workflow definition using the conversion daemon, if one is running
+
+    If no daemon is running, or a mirror is provided, the file is converted in this process, exactly as
+    :func:`vidarr.wdl.parse` would.
+
+    :param wdl_file_path: the path to the WDL file
+    :param cache: the cache to use if converting in this process; if not provided, the daemon is also asked not to use
+    its caches
+    :param socket_path: the path to the daemon's socket; see :func:`default_socket` if not provided
+    :param mirror: the mirror to read imported URLs through; since the daemon has its own mirror, providing one
+    converts the file in this process
+    :param trust_validated: if true, documents recorded in the cache as having passed typechecking are not
+    typechecked again; see :class:`vidarr.wdl.Loader`
+    :return: the Vidarr configuration object
+    :raises ValueError: if the WDL file is invalid
+    :raises FileNotFoundError: if the WDL file does not exist
+    """
+    response = None
+    if mirror is None:
+        response = send(socket_path or default_socket(),
+                        {"path": os.path.abspath(wdl_file_path), "cache": cache is not None,
+                         "trust_validated": trust_validated})
+    if response is None:
+        import vidarr.wdl
+        return vidarr.wdl.parse(wdl_file_path, cache, mirror, trust_validated)
+    if "error" in response:
+        if response["error"]["type"] == "ValueError":
+            raise ValueError(response["error"]["message"])
+        if response["error"]["type"] == "FileNotFoundError":
+            raise FileNotFoundError(errno.ENOENT, "No such WDL file", wdl_file_path)
+        raise RuntimeError(f"{response['error']['type']}: {response['error']['message']}")
+    return response["workflow"]
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        description="Convert a WDL file using the conversion daemon, or in this process if the daemon is not running")
+    parser.add_argument(
+        "-i",
+        "--input-wdl-path",
+        required=True,
+        help="Source wdl path")
+    parser.add_argument(
+        "-o",
+        "--output-path",
+        required=False,
+        help="Output a file with contents of the workflow parameter dict")
+    parser.add_argument(
+        "--socket",
+        default=default_socket(),
+        help=f"Path to the daemon's socket; may also be set using the {SOCKET_ENV} environment variable")
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always load and convert the WDL file instead of using a previously converted workflow")
+    parser.add_argument(
+        "--trust-validated",
+        action="store_true",
+        help="Skip typechecking any WDL file the cache records as having passed typechecking with the same contents and "
+             "imports")
+    parser.add_argument(
+        "--json-format",
+        choices=sorted(vidarr.emit.STYLES),
+        default=None,
+        help="Layout of the JSON output: default, pretty (indented with sorted keys), compact (no whitespace), or "
+             "canonical (compact with sorted keys); defaults to pretty on standard output and default otherwise")
+    parser.add_argument(
+        "--mirror-dir",
+        default=None,
+        help="Read imported URLs through the local copies in this directory; since the daemon has its own mirror, "
+             "the file is converted in this process")
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Only read imported URLs from the mirror instead of fetching ones that are missing; the file is converted "
+             "in this process")
+    args = parser.parse_args()
+    cache = None
+    if not args.no_cache:
+        cache = vidarr.cache.Cache()
+    mirror = None
+    if args.mirror_dir or args.offline:
+        mirror = vidarr.mirror.Mirror(args.mirror_dir, offline=args.offline)
+
+    try:
+        workflow = parse(args.input_wdl_path, cache, args.socket, mirror, args.trust_validated)
+    except (FileNotFoundError, ValueError) as e:
+        sys.stderr.write(f"{e}\n")
+        sys.exit(1)
+    if args.output_path:
+        vidarr.emit.dump(args.output_path, workflow, args.json_format or "default")
+    else:
+        vidarr.emit.write_stdout(workflow, args.json_format or "pretty")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+import argparse
+import collections
+import errno
+import hashlib
+import io
+import json
+import os
+import signal
+import socket
+import socketserver
+import sys
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import vidarr.cache
+import vidarr.client
+import vidarr.mirror
+import vidarr.wdl
+
+DEFAULT_MAX_DOCUMENTS = 256
+
+
+def _hash_file(path: str) -> Optional[str]:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except OSError:
+        return None
+
+
+def _dependency(path: str, source_text: str) -> Optional[Tuple[str, str]]:
+    # Files are loaded as text, which normalises line endings, so the bytes on disk are hashed instead of the source;
+    # if the bytes no longer decode to the source, the file changed during the load and the result cannot be held
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if io.TextIOWrapper(io.BytesIO(data)).read() != source_text:
+        return None
+    return path, hashlib.sha256(data).hexdigest()
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        line = self.rfile.readline()
+        if not line:
+            return
+        try:
+            request = json.loads(line)
+            response = self.server.convert(request["path"], bool(request.get("cache", True)),
+                                           bool(request.get("trust_validated", False)))
+        except Exception as e:
+            response = {"error": {"type": type(e).__name__, "message": str(e)}}
+        self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+
+
+class Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    A long-running conversion server that keeps miniwdl loaded and the most recently converted workflows in memory
+
+    Each connection carries one request, a JSON object on a single line with the absolute ``path`` of a WDL file,
+    whether the ``cache`` may be used, and, optionally, whether to ``trust_validated`` documents. The response, also a
+    single line, is an object with either the converted ``workflow`` or an ``error`` with the ``type`` and ``message``
+    of the failure.
+
+    A workflow held in memory is reused as long as the WDL file and every file it imports have the same contents as
+    when it was converted. Otherwise, the on-disk cache, if any, is checked before converting the file. Each WDL file
+    also has a :class:`vidarr.wdl.Loader` that keeps its loaded documents, so when a file changes, only it and the files
+    that import it are parsed and typechecked again.
+    """
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, cache: Optional[vidarr.cache.Cache] = None,
+                 max_documents: int = DEFAULT_MAX_DOCUMENTS, mirror: Optional[vidarr.mirror.Mirror] = None):
+        """
+        :param socket_path: the path to listen on
+        :param cache: the on-disk cache to use, if any
+        :param max_documents: the maximum number of converted workflows, and of loaders, to keep in memory
+        :param mirror: the mirror to read imported URLs through; if not provided, URLs are fetched for each conversion
+        """
+        self.cache = cache
+        self.mirror = mirror
+        self.max_documents = max_documents
+        self.lock = threading.Lock()
+        self.documents: collections.OrderedDict[str, Tuple[List[Tuple[str, str]], Dict[str, Any]]] = \
+            collections.OrderedDict()
+        self.loaders: collections.OrderedDict[Tuple[str, bool], Tuple[threading.Lock, vidarr.wdl.Loader]] = \
+            collections.OrderedDict()
+        super().__init__(socket_path, _Handler)
+
+    def _loader(self, wdl_file_path: str, trusted: bool) -> Tuple[threading.Lock, vidarr.wdl.Loader]:
+        # Documents loaded while trusting the cache may not have been typechecked, so they are kept apart from those
+        # that were
+        key = (wdl_file_path, trusted)
+        with self.lock:
+            entry = self.loaders.get(key)
+            if entry is None:
+                entry = (threading.Lock(), vidarr.wdl.Loader(mirror=self.mirror))
+                self.loaders[key] = entry
+            self.loaders.move_to_end(key)
+            while len(self.loaders) > self.max_documents:
+                self.loaders.popitem(last=False)
+        return entry
+
+    def convert(self, wdl_file_path: str, use_cache: bool = True, trust_validated: bool = False) -> Dict[str, Any]:
+        """
+        Convert a WDL file, reusing a previous conversion if the WDL file and its imports are unchanged
+
+        :param wdl_file_path: the absolute path to the WDL file
+        :param use_cache: whether previously converted workflows can be used
+        :param trust_validated: whether documents recorded in the on-disk cache as having passed typechecking can skip
+        typechecking
+        :return: the response object
+        :raises FileNotFoundError: if the WDL file does not exist
+        """
+        if not os.path.isfile(wdl_file_path):
+            raise FileNotFoundError(errno.ENOENT, "No such WDL file", wdl_file_path)
+        if use_cache:
+            with self.lock:
+                entry = self.documents.get(wdl_file_path)
+            if entry is not None and all(_hash_file(path) == digest for (path, digest) in entry[0]):
+                with self.lock:
+                    if wdl_file_path in self.documents:
+                        self.documents.move_to_end(wdl_file_path)
+                return {"workflow": entry[1]}
+            if self.cache:
+                workflow = self.cache.get(wdl_file_path)
+                if workflow is not None:
+                    return {"workflow": workflow}
+        (loader_lock, loader) = self._loader(wdl_file_path, use_cache and trust_validated)
+        with loader_lock:
+            loader.cache = self.cache if use_cache else None
+            loader.trust_validated = trust_validated
+            doc = loader.load(wdl_file_path)
+            workflow = vidarr.wdl.convert(doc)
+        if self.cache and use_cache:
+            self.cache.put(wdl_file_path, doc, workflow)
+        # Only local files are checked for changes; imported URLs are not fetched again while the workflow is held
+        sources = [(doc.pos.abspath, doc.source_text)] + [
+            (imported.pos.abspath, imported.source_text) for (_, imported) in vidarr.cache.imported_documents(doc)
+            if not vidarr.mirror.is_remote(imported.pos.abspath)]
+        dependencies = [_dependency(path, text) for (path, text) in sources]
+        if not all(dependencies):
+            return {"workflow": workflow}
+        with self.lock:
+            self.documents[wdl_file_path] = (dependencies, workflow)
+            self.documents.move_to_end(wdl_file_path)
+            while len(self.documents) > self.max_documents:
+                self.documents.popitem(last=False)
+        return {"workflow": workflow}
+
+
+def _remove_stale_socket(socket_path: str):
+    if not os.path.exists(socket_path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except ConnectionRefusedError:
+        os.unlink(socket_path)
+        return
+    finally:
+        probe.close()
+    raise RuntimeError(f"A daemon is already listening on {socket_path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+        description="Run a server that converts WDL files for wdl2vidarr-client and vidarr-build")
+    parser.add_argument(
+        "--socket",
+        default=vidarr.client.default_socket(),
+        help=f"Path to listen on; may also be set using the {vidarr.client.SOCKET_ENV} environment variable")
+    parser.add_argument(
+        "--cache-dir",
+        default=vidarr.cache.default_directory(),
+        help="Directory to cache converted workflows in")
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Do not use the on-disk cache; converted workflows are still kept in memory")
+    parser.add_argument(
+        "--max-documents",
+        type=int,
+        default=DEFAULT_MAX_DOCUMENTS,
+        help="Maximum number of converted workflows to keep in memory")
+    parser.add_argument(
+        "--mirror-dir",
+        default=None,
+        help="Read imported URLs through the local copies in this directory, fetching only the ones that are missing; "
+             "with --offline, defaults to the VIDARR_MIRROR_DIR environment variable or imports in the cache "
+             "directory")
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Only read imported URLs from the mirror instead of fetching ones that are missing")
+    args = parser.parse_args()
+    cache = None if args.no_cache else vidarr.cache.Cache(args.cache_dir)
+    mirror = vidarr.mirror.Mirror(args.mirror_dir, offline=args.offline) if args.mirror_dir or args.offline else None
+
+    try:
+        _remove_stale_socket(args.socket)
+    except RuntimeError as e:
+        sys.stderr.write(f"{e}\n")
+        sys.exit(1)
+    old_umask = os.umask(0o177)
+    try:
+        server = Server(args.socket, cache, args.max_documents, mirror)
+    finally:
+        os.umask(old_umask)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        try:
+            os.unlink(args.socket)
+        except OSError:
+            pass
+
+
+if __name__ == "__main__":
+    main()
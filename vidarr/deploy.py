@@ -0,0 +1,278 @@
+import concurrent.futures
+import gzip
+import io
+from typing import Any, Dict, Iterable, List, NamedTuple, Set, Tuple, Union
+
+import requests
+import requests.adapters
+import urllib3.util.retry
+
+import vidarr.cache
+import vidarr.emit
+
+DEFAULT_JOBS = 8
+DEFAULT_RETRIES = 3
+DEFAULT_TIMEOUT = 30.0
+COMPRESSION_LEVEL = 6
+
+# The fields of a workflow definition that make up a workflow version on a Vidarr server; anything else the server
+# returns for a version, such as its name or when it was created, is the server's own bookkeeping
+IDENTITY_FIELDS = ("accessoryFiles", "language", "outputs", "parameters", "workflow")
+
+# The responses from a server that may mean it could not read a compressed request, so it is sent again uncompressed
+_COMPRESSION_REJECTED = (400, 415)
+
+
+class Registration(NamedTuple):
+    """
+    A workflow name on a Vidarr server that a version should be registered with
+    """
+    server: str
+    name: str
+    url: str
+
+
+class Result(NamedTuple):
+    """
+    The outcome of contacting a Vidarr server for one workflow name
+
+    The status is one of ``"not registered"`` (the server does not have the workflow, so it is skipped),
+    ``"registered"`` (the version was created), ``"already registered"`` (the identical version exists),
+    ``"conflict"`` (a different version with the same name and version exists), or ``"error"``.
+    """
+    server: str
+    name: str
+    status: str
+    message: str
+
+    @property
+    def ok(self) -> bool:
+        return self.status not in ("conflict", "error")
+
+
+class Payload(NamedTuple):
+    """
+    A workflow definition encoded for upload, both as JSON and as gzip-compressed JSON
+    """
+    raw: bytes
+    compressed: bytes
+
+    def describe(self, name: str) -> str:
+        """
+        Describe the size of the payload, with and without compression
+        """
+        ratio = len(self.compressed) / len(self.raw) if self.raw else 1.0
+        return f"{name}: {len(self.raw):,} bytes, {len(self.compressed):,} bytes compressed ({ratio:.1%})"
+
+
+def encode(workflow: Dict[str, Any]) -> Payload:
+    """
+    Encode a workflow definition for upload
+
+    This is done once, no matter how many servers the workflow is uploaded to.
+    """
+    buffer = io.BytesIO()
+    vidarr.emit.write(workflow, buffer, "compact")
+    raw = buffer.getvalue()
+    # A fixed timestamp makes the compressed form depend only on the workflow
+    return Payload(raw, gzip.compress(raw, compresslevel=COMPRESSION_LEVEL, mtime=0))
+
+
+def create_session(jobs: int = DEFAULT_JOBS, retries: int = DEFAULT_RETRIES,
+                   backoff: float = 0.5) -> requests.Session:
+    """
+    Create an HTTP session that reuses connections to each server and retries failed requests
+
+    Requests are retried, with exponential backoff, on connection errors and, for ``GET`` and ``HEAD`` requests, on
+    read errors and server errors (5xx responses). Registering a workflow version is not idempotent, so a ``POST``
+    is only retried if the connection could not be made, when the server cannot have received it.
+
+    :param jobs: the number of concurrent requests that will be made; each server will keep up to this many connections
+    :param retries: the number of times to retry a failed request
+    :param backoff: the backoff factor, in seconds, between retries
+    """
+    retry = urllib3.util.retry.Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=(500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        raise_on_status=False)
+    adapter = requests.adapters.HTTPAdapter(pool_connections=jobs, pool_maxsize=jobs, max_retries=retry)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def _check(session: requests.Session, server: str, name: str, version: str,
+           timeout: float) -> Union[Registration, Result]:
+    try:
+        res = session.get(f"{server}/api/workflow/{name}", timeout=timeout)
+    except requests.RequestException as e:
+        return Result(server, name, "error", f"Unable to check workflow {name} on {server}: {e}")
+    if res.status_code == 404:
+        return Result(server, name, "not registered", f"Workflow {name} not registered on {server}. Skipping.")
+    if res.status_code != 200:
+        return Result(server, name, "error",
+                      f"Unable to check workflow {name} on {server}: response status {res.status_code}")
+    return Registration(server, name, f"{server}/api/workflow/{name}/{version}")
+
+
+def find_registrations(session: requests.Session, servers: Iterable[str], names: Iterable[str], version: str,
+                       jobs: int = DEFAULT_JOBS,
+                       timeout: float = DEFAULT_TIMEOUT) -> Tuple[List[Registration], List[Result]]:
+    """
+    Check which servers have each workflow name installed
+
+    :param session: the HTTP session to use
+    :param servers: the Vidarr server URLs
+    :param names: the workflow names
+    :param version: the workflow version that will be registered
+    :param jobs: the maximum number of concurrent requests
+    :param timeout: the timeout, in seconds, for each request
+    :return: the registrations to perform and the result of checking each server and name pair, in input order; only
+    the results for names that are not installed or could not be checked are included
+    """
+    pairs = [(server, name) for server in servers for name in names]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        checks = list(executor.map(lambda pair: _check(session, pair[0], pair[1], version, timeout), pairs))
+    return ([check for check in checks if isinstance(check, Registration)],
+            [check for check in checks if isinstance(check, Result)])
+
+
+def fingerprint(workflow: Dict[str, Any]) -> str:
+    """
+    Compute a fingerprint of a Vidarr workflow definition that does not depend on the order of keys in it
+
+    Only the fields in :data:`IDENTITY_FIELDS` are included, so the other fields a server adds when it describes a
+    workflow version do not change the fingerprint. Accessory files that are missing or null count as none.
+    """
+    identity = {key: workflow.get(key) for key in IDENTITY_FIELDS}
+    identity["accessoryFiles"] = identity["accessoryFiles"] or {}
+    return vidarr.cache.canonical_hash(identity)
+
+
+def _preflight(session: requests.Session, registration: Registration, workflow: Dict[str, Any], expected: str,
+               timeout: float) -> Union[Registration, Result]:
+    try:
+        res = session.get(registration.url, timeout=timeout)
+    except requests.RequestException:
+        # Let the upload determine what the server has
+        return registration
+    if res.status_code != 200:
+        return registration
+    try:
+        registered = res.json()
+    except ValueError:
+        return registration
+    if not isinstance(registered, dict) or any(key not in registered for key in IDENTITY_FIELDS
+                                               if key != "accessoryFiles"):
+        # The server's description of the version can't be compared to this workflow, so let it decide
+        return registration
+    if fingerprint(registered) == expected:
+        return Result(registration.server, registration.name, "already registered",
+                      f"Workflow version is already registered on {registration.url}")
+    return Result(registration.server, registration.name, "conflict",
+                  "This workflow version is different from the workflow version with the same name + version on "
+                  f"{registration.url}")
+
+
+def preflight(session: requests.Session, registrations: Iterable[Registration], workflow: Dict[str, Any],
+              jobs: int = DEFAULT_JOBS, timeout: float = DEFAULT_TIMEOUT) -> Tuple[List[Registration], List[Result]]:
+    """
+    Compare a workflow definition to the versions already registered on Vidarr servers, without uploading it
+
+    :param session: the HTTP session to use
+    :param registrations: the servers and names to register the workflow version with
+    :param workflow: the Vidarr workflow definition
+    :param jobs: the maximum number of concurrent requests
+    :param timeout: the timeout, in seconds, for each request
+    :return: the registrations that still need to be uploaded and the results for the registrations where the version
+    is already registered, either identically or with a conflicting definition
+    """
+    expected = fingerprint(workflow)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        checks = list(executor.map(
+            lambda registration: _preflight(session, registration, workflow, expected, timeout), registrations))
+    return ([check for check in checks if isinstance(check, Registration)],
+            [check for check in checks if isinstance(check, Result)])
+
+
+def _post(session: requests.Session, registration: Registration, payload: Payload, compressed: bool,
+          timeout: float) -> requests.Response:
+    headers = {"Content-Type": "application/json"}
+    if compressed:
+        headers["Content-Encoding"] = "gzip"
+    return session.post(registration.url, data=payload.compressed if compressed else payload.raw, headers=headers,
+                        timeout=timeout)
+
+
+def _upload(session: requests.Session, registration: Registration, payload: Payload, uncompressed_servers: Set[str],
+            timeout: float) -> Result:
+    try:
+        compressed = registration.server not in uncompressed_servers
+        res = _post(session, registration, payload, compressed, timeout)
+        if compressed and res.status_code in _COMPRESSION_REJECTED:
+            res = _post(session, registration, payload, False, timeout)
+            if res.status_code not in _COMPRESSION_REJECTED:
+                # Other names on this server don't need to try compression again
+                uncompressed_servers.add(registration.server)
+    except requests.RequestException as e:
+        return Result(registration.server, registration.name, "error",
+                      f"Failed to register workflow version on {registration.url}: {e}")
+    if res.status_code == 201:
+        return Result(registration.server, registration.name, "registered", f"Registered on {registration.url}!")
+    if res.status_code == 200:
+        return Result(registration.server, registration.name, "already registered",
+                      f"Workflow version is already registered on {registration.url}")
+    if res.status_code == 409:
+        return Result(registration.server, registration.name, "conflict",
+                      "This workflow version is different from the workflow version with the same name + version on "
+                      f"{registration.url}")
+    message = f"Failed to register workflow version on {registration.url}: response status {res.status_code}"
+    if res.content:
+        message += f"\n{res.text}"
+    return Result(registration.server, registration.name, "error", message)
+
+
+def upload(session: requests.Session, registrations: Iterable[Registration],
+           workflow: Union[Dict[str, Any], Payload], jobs: int = DEFAULT_JOBS, timeout: float = DEFAULT_TIMEOUT,
+           compress: bool = True) -> List[Result]:
+    """
+    Register a workflow version on Vidarr servers
+
+    The workflow is encoded once and the same request body is sent to every server. Unless compression is disabled,
+    it is sent gzip-compressed; if a server rejects the compressed request, it is sent again uncompressed, and any
+    other names on that server are sent uncompressed.
+
+    :param session: the HTTP session to use
+    :param registrations: the servers and names to register the workflow version with
+    :param workflow: the Vidarr workflow definition or its :func:`encode` payload
+    :param jobs: the maximum number of concurrent requests
+    :param timeout: the timeout, in seconds, for each request
+    :param compress: whether to try sending the workflow compressed
+    :return: the result of each registration, in input order
+    """
+    payload = workflow if isinstance(workflow, Payload) else encode(workflow)
+    registrations = list(registrations)
+    uncompressed_servers = set() if compress else {registration.server for registration in registrations}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(
+            lambda registration: _upload(session, registration, payload, uncompressed_servers, timeout),
+            registrations))
+
+
+def summarize(results: Iterable[Result]) -> str:
+    """
+    Format a table counting the results for each server
+    """
+    statuses = ["registered", "already registered", "conflict", "not registered", "error"]
+    counts: Dict[str, Dict[str, int]] = {}
+    for result in results:
+        counts.setdefault(result.server, dict.fromkeys(statuses, 0))[result.status] += 1
+    header = ["server"] + statuses
+    rows = [[server] + [str(server_counts[status]) for status in statuses]
+            for (server, server_counts) in counts.items()]
+    widths = [max(len(row[column]) for row in [header] + rows) for column in range(len(header))]
+    return "\n".join(" | ".join(cell.ljust(width) for (cell, width) in zip(row, widths)).rstrip()
+                     for row in [header, ["-" * width for width in widths]] + rows)
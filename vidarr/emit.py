@@ -0,0 +1,106 @@
+import json
+import sys
+from typing import Any, BinaryIO, Callable, Dict, Iterator, Optional, Tuple
+
+import vidarr.files
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Each style is the indent, the item and key separators, whether to escape non-ASCII characters, and whether to sort
+# object keys, as the parameters of the same names in json.dumps
+STYLES: Dict[str, Tuple[Optional[int], Tuple[str, str], bool, bool]] = {
+    "default": (None, (", ", ": "), True, False),
+    "pretty": (4, (",", ": "), True, True),
+    "compact": (None, (",", ":"), False, False),
+    "canonical": (None, (",", ":"), False, True),
+}
+
+
+def _encoder(style: str) -> Callable[[Any], bytes]:
+    (indent, separators, ensure_ascii, sort_keys) = STYLES[style]
+    # orjson can only produce the compact layouts
+    if orjson is not None and indent is None and separators == (",", ":") and not ensure_ascii:
+        option = orjson.OPT_SORT_KEYS if sort_keys else 0
+        return lambda value: orjson.dumps(value, option=option)
+    return lambda value: json.dumps(value, indent=indent, separators=separators, ensure_ascii=ensure_ascii,
+                                    sort_keys=sort_keys).encode("utf-8")
+
+
+def _chunks(value: Any, encode: Callable[[Any], bytes], style: str, level: int) -> Iterator[bytes]:
+    (indent, (item_separator, key_separator), _, sort_keys) = STYLES[style]
+    if not isinstance(value, dict) or not value:
+        text = encode(value)
+        if indent is not None and level:
+            # JSON strings cannot contain a raw line break, so every line break is part of the layout
+            text = text.replace(b"\n", b"\n" + b" " * (indent * level))
+        yield text
+        return
+    items = sorted(value.items(), key=lambda item: item[0]) if sort_keys else value.items()
+    if indent is None:
+        (start, separator, end) = (b"{", item_separator.encode("ascii"), b"}")
+    else:
+        inner = "\n" + " " * (indent * (level + 1))
+        start = ("{" + inner).encode("ascii")
+        separator = (item_separator + inner).encode("ascii")
+        end = ("\n" + " " * (indent * level) + "}").encode("ascii")
+    yield start
+    for (index, (key, item)) in enumerate(items):
+        if index:
+            yield separator
+        yield encode(key) + key_separator.encode("ascii")
+        yield from _chunks(item, encode, style, level + 1)
+    yield end
+
+
+def write(value: Any, stream: BinaryIO, style: str = "default") -> int:
+    """
+    Write a value as JSON incrementally
+
+    Objects are written one member at a time and only the other values, such as each imported source in a workflow
+    definition, are encoded whole, so the encoded form of a large workflow definition is never held in memory at once.
+    The output is the same as ``json.dumps`` with the options for the style. If the optional ``orjson`` package is
+    installed, it is used to encode the compact styles.
+
+    :param value: the value to write; object keys must be strings
+    :param stream: the binary stream to write the UTF-8 encoded JSON to
+    :param style: ``"default"`` for the same layout as ``json.dumps``; ``"pretty"`` to indent and sort keys;
+    ``"compact"`` to leave out all whitespace; or ``"canonical"`` for the compact layout with sorted keys, which is the
+    text hashed by :func:`vidarr.cache.canonical_hash`
+    :return: the number of bytes written
+    """
+    encode = _encoder(style)
+    written = 0
+    for chunk in _chunks(value, encode, style, 0):
+        stream.write(chunk)
+        written += len(chunk)
+    return written
+
+
+def write_stdout(value: Any, style: str = "pretty") -> int:
+    """
+    Write a value as JSON incrementally to standard output
+
+    :param value: the value to write
+    :param style: the layout; see :func:`write`
+    :return: the number of bytes written
+    """
+    sys.stdout.flush()
+    written = write(value, sys.stdout.buffer, style)
+    sys.stdout.buffer.flush()
+    return written
+
+
+def dump(path: str, value: Any, style: str = "default") -> int:
+    """
+    Replace the contents of a file with a value as JSON, such that readers never see a partially written file
+
+    :param path: the file to write
+    :param value: the value to write
+    :param style: the layout; see :func:`write`
+    :return: the number of bytes written
+    """
+    with vidarr.files.open_atomically(path, "wb") as f:
+        return write(value, f, style)
@@ -0,0 +1,38 @@
+import contextlib
+import os
+import tempfile
+from typing import IO, Iterator
+
+
+@contextlib.contextmanager
+def open_atomically(path: str, mode: str = "w") -> Iterator[IO]:
+    """
+    Open a file to replace the contents of another such that readers never see a partially written file
+
+    The file is only replaced once the context exits without an error; otherwise, the original file is left as it was.
+
+    :param path: the file to replace
+    :param mode: the mode to open the new file with; either ``"w"`` or ``"wb"``
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    (handle, temp_path) = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(handle, mode) as f:
+            yield f
+        # mkstemp only grants the owner access, but this file should have the usual permissions
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(temp_path, 0o666 & ~umask)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def write_atomically(path: str, text: str):
+    """
+    Replace the contents of a file such that readers never see a partially written file
+    """
+    with open_atomically(path) as f:
+        f.write(text)
@@ -0,0 +1,154 @@
+import asyncio
+import errno
+import json
+import os
+import urllib.parse
+import urllib.request
+from typing import Any, Awaitable, Callable, List, Optional, Set
+
+import vidarr.cache
+import vidarr.files
+
+DEFAULT_TIMEOUT = 30.0
+
+# miniwdl is only needed once a workflow is being loaded, so it is not imported here to keep this module usable from
+# the thin client
+
+
+def default_directory() -> str:
+    """
+    Get the mirror directory used when none is specified
+
+    This is the ``VIDARR_MIRROR_DIR`` environment variable, if set, or ``imports`` in the cache directory.
+    """
+    if "VIDARR_MIRROR_DIR" in os.environ:
+        return os.environ["VIDARR_MIRROR_DIR"]
+    return os.path.join(vidarr.cache.default_directory(), "imports")
+
+
+def is_remote(uri: str) -> bool:
+    return uri.startswith("http://") or uri.startswith("https://")
+
+
+def download(uri: str, timeout: float = DEFAULT_TIMEOUT) -> str:
+    """
+    Get the contents of a URL from the remote server, without storing them
+
+    :param uri: the URL
+    :param timeout: the number of seconds to wait for the remote server
+    :raises OSError: if the remote server cannot provide the file
+    """
+    with urllib.request.urlopen(uri, timeout=timeout) as response:
+        return response.read().decode("utf-8")
+
+
+def reader(fallback: Callable[[str, List[str], Any], Awaitable[Any]],
+           fetch: Callable[[str], str] = download) -> Callable[[str, List[str], Any], Awaitable[Any]]:
+    """
+    Create a ``read_source`` function for miniwdl that reads URLs
+
+    Relative imports in files that were imported from a URL are resolved against that URL.
+
+    :param fallback: the ``read_source`` function to use for anything that is not a URL
+    :param fetch: the function to get the contents of a URL; if not provided, every URL is downloaded each time it is
+    read
+    """
+    import WDL
+
+    async def read_source(uri: str, path: List[str], importer: Optional[WDL.Document]) -> WDL.ReadSourceResult:
+        if importer is not None and is_remote(importer.pos.abspath) and not os.path.isabs(uri) and "://" not in uri:
+            uri = urllib.parse.urljoin(importer.pos.abspath, uri)
+        if not is_remote(uri):
+            return await fallback(uri, path, importer)
+        return WDL.ReadSourceResult(source_text=await asyncio.to_thread(fetch, uri), abspath=uri)
+
+    return read_source
+
+
+class Mirror:
+    """
+    A local copy of WDL files imported from URLs
+
+    Each URL is mapped to the hash of its contents, and the contents are stored by hash, so a file is only stored once
+    even if it is available from many URLs. Once a URL is in the mirror, it is not fetched again unless the mirror is
+    being refreshed, so builds do not wait on remote servers and can run without network access.
+    """
+
+    def __init__(self, directory: Optional[str] = None, offline: bool = False, refresh: bool = False,
+                 timeout: float = DEFAULT_TIMEOUT):
+        """
+        :param directory: the directory to store the mirror in; see :func:`default_directory` if not provided
+        :param offline: if true, URLs that are not in the mirror cannot be imported instead of being fetched
+        :param refresh: if true, URLs are always fetched and the mirror is updated
+        :param timeout: the number of seconds to wait for a remote server
+        """
+        self.directory = directory or default_directory()
+        self.offline = offline
+        self.refresh = refresh
+        self.timeout = timeout
+        self.fetched: Set[str] = set()
+        """The URLs fetched from remote servers by this mirror"""
+
+    def _uri_path(self, uri: str) -> str:
+        return os.path.join(self.directory, f"uri-{vidarr.cache.hash_text(uri)}.json")
+
+    def _source_path(self, source_hash: str) -> str:
+        return os.path.join(self.directory, f"source-{source_hash}.wdl")
+
+    def get(self, uri: str) -> Optional[str]:
+        """
+        Find the contents of a URL in the mirror
+
+        :return: the contents or None if the URL is not in the mirror
+        """
+        try:
+            with open(self._uri_path(uri)) as f:
+                entry = json.load(f)
+            with open(self._source_path(entry["hash"])) as f:
+                source_text = f.read()
+        except (OSError, ValueError, KeyError, TypeError):
+            return None
+        # Discard a damaged copy
+        if vidarr.cache.hash_text(source_text) != entry["hash"]:
+            return None
+        return source_text
+
+    def put(self, uri: str, source_text: str):
+        """
+        Store the contents of a URL in the mirror
+        """
+        source_hash = vidarr.cache.hash_text(source_text)
+        source_path = self._source_path(source_hash)
+        if not os.path.exists(source_path):
+            vidarr.files.write_atomically(source_path, source_text)
+        vidarr.files.write_atomically(self._uri_path(uri), json.dumps({"uri": uri, "hash": source_hash}))
+
+    def fetch(self, uri: str) -> str:
+        """
+        Get the contents of a URL, from the mirror if possible and otherwise from the remote server
+
+        :raises FileNotFoundError: if offline and the URL is not in the mirror
+        :raises OSError: if the remote server cannot provide the file
+        """
+        if not self.refresh or uri in self.fetched:
+            source_text = self.get(uri)
+            if source_text is not None:
+                return source_text
+        if self.offline:
+            raise FileNotFoundError(
+                errno.ENOENT,
+                f"Not in the import mirror at {self.directory} and running offline; prefetch the imports first",
+                uri)
+        source_text = download(uri, self.timeout)
+        self.put(uri, source_text)
+        self.fetched.add(uri)
+        return source_text
+
+    def reader(self, fallback: Callable[[str, List[str], Any], Awaitable[Any]]) -> Callable[
+            [str, List[str], Any], Awaitable[Any]]:
+        """
+        Create a ``read_source`` function for miniwdl that reads URLs through the mirror; see :func:`reader`
+
+        :param fallback: the ``read_source`` function to use for anything that is not a URL
+        """
+        return reader(fallback, self.fetch)
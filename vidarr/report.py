@@ -0,0 +1,108 @@
+import xml.etree.ElementTree as ElementTree
+from typing import Iterable, List, NamedTuple, Optional
+
+import vidarr.emit
+import vidarr.files
+import vidarr.runner
+
+# The outcome of a test: it passed; it failed; it was skipped because it passed before; or it was stopped, or never
+# started, because another run failed
+STATUSES = ("passed", "failed", "cached", "incomplete")
+
+
+class TestCase(NamedTuple):
+    """
+    The outcome of one test
+    """
+    workflow: str
+    """The name of the root workflow the test belongs to"""
+    test_file: str
+    """The name of the test file the test belongs to; see :class:`vidarr.runner.TestKey`"""
+    test_id: str
+    run: Optional[str]
+    """The name of the run that performed the test; None for cached tests"""
+    status: str
+    """One of :data:`STATUSES`"""
+    elapsed: Optional[float]
+    """The estimated duration of the test, in seconds, if it ran; see :func:`vidarr.runner.durations_by_test`"""
+
+
+def test_cases(workflow: str, results: List[vidarr.runner.TestRunResult],
+               cached: Iterable[vidarr.runner.TestKey] = ()) -> List[TestCase]:
+    """
+    Get the outcome of each test from the results of the runs
+
+    :param workflow: the name of the root workflow the tests belong to
+    :param results: the results of the runs
+    :param cached: the key of each test that was skipped because it passed before
+    """
+    cases = [TestCase(workflow, key.test_file, key.test_id, None, "cached", None) for key in cached]
+    for result in results:
+        if result.ok:
+            status = "passed"
+        elif result.returncode is None:
+            status = "incomplete"
+        else:
+            status = "failed"
+        elapsed = result.elapsed / len(result.run.test_ids) if result.elapsed is not None else None
+        cases.extend(TestCase(workflow, key.test_file, key.test_id, result.run.name, status, elapsed)
+                     for key in result.run.test_keys)
+    return cases
+
+
+def write_junit(path: str, cases: List[TestCase]):
+    """
+    Write the outcome of the tests as a JUnit XML report, with a test suite for each root workflow and a class for each
+    test file
+
+    Failed tests are reported as failures, incomplete tests as errors, and cached tests as skipped.
+
+    :param path: the file to write
+    :param cases: the outcome of each test
+    """
+    def attributes(element: ElementTree.Element, suite_cases: List[TestCase]):
+        element.set("tests", str(len(suite_cases)))
+        element.set("failures", str(sum(case.status == "failed" for case in suite_cases)))
+        element.set("errors", str(sum(case.status == "incomplete" for case in suite_cases)))
+        element.set("skipped", str(sum(case.status == "cached" for case in suite_cases)))
+        element.set("time", f"{sum(case.elapsed or 0.0 for case in suite_cases):.3f}")
+
+    root = ElementTree.Element("testsuites", name="vidarr-build")
+    attributes(root, cases)
+    for workflow in dict.fromkeys(case.workflow for case in cases):
+        suite_cases = [case for case in cases if case.workflow == workflow]
+        suite = ElementTree.SubElement(root, "testsuite", name=workflow)
+        attributes(suite, suite_cases)
+        for case in suite_cases:
+            element = ElementTree.SubElement(suite, "testcase", name=case.test_id,
+                                             classname=f"{workflow}.{case.test_file}",
+                                             time=f"{case.elapsed or 0.0:.3f}")
+            if case.status == "failed":
+                ElementTree.SubElement(element, "failure", message=f"Tests from {case.run} failed.")
+            elif case.status == "incomplete":
+                ElementTree.SubElement(element, "error", message=f"Tests from {case.run} did not run to completion.")
+            elif case.status == "cached":
+                ElementTree.SubElement(element, "skipped", message="Passed before with the same workflow, test, and "
+                                                                   "test configuration.")
+    ElementTree.indent(root)
+    with vidarr.files.open_atomically(path, "wb") as f:
+        ElementTree.ElementTree(root).write(f, encoding="utf-8", xml_declaration=True)
+
+
+def write_summary(path: str, cases: List[TestCase]):
+    """
+    Write the outcome of the tests as JSON
+
+    The file has the number of tests with each status, the total duration of the tests that ran, and the details of
+    each test, slowest first.
+
+    :param path: the file to write
+    :param cases: the outcome of each test
+    """
+    vidarr.emit.dump(path, {
+        "counts": {status: sum(case.status == status for case in cases) for status in STATUSES},
+        "elapsed": sum(case.elapsed or 0.0 for case in cases),
+        "tests": [{"workflow": case.workflow, "file": case.test_file, "id": case.test_id, "run": case.run,
+                   "status": case.status, "elapsed": case.elapsed}
+                  for case in sorted(cases, key=lambda case: case.elapsed or 0.0, reverse=True)],
+    }, "pretty")
@@ -0,0 +1,394 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import vidarr.files
+
+# The weight of each new measurement in the moving average of a test's duration
+HISTORY_WEIGHT = 0.5
+# A test is considered to have slowed down if it takes this many times as long as its recorded duration...
+SLOWDOWN_FACTOR = 1.5
+# ...and at least this many seconds longer
+SLOWDOWN_MINIMUM = 60.0
+
+
+class TestKey(NamedTuple):
+    """
+    Identifies a test across every root workflow and test file, since a test's ``id`` is only unique within its file
+    """
+    workflow: str
+    """The name of the root workflow the test belongs to"""
+    test_file: str
+    """The name of the test file, without its directory or extension, such as ``vidarrtest-regression``"""
+    test_id: str
+
+    def __str__(self) -> str:
+        return "/".join(self)
+
+
+class TestRun(NamedTuple):
+    """
+    An invocation of ``vidarr test`` for one file of tests, identified by the ``id`` of each test in it
+    """
+    name: str
+    test_file: str
+    output_directory: Optional[str]
+    test_ids: Tuple[str, ...] = ()
+    workflow: str = ""
+    """The name of the root workflow the tests belong to"""
+    source: Optional[str] = None
+    """The name of the test file the tests come from, if it is not the run's name, such as for a shard"""
+
+    @property
+    def test_keys(self) -> Tuple[TestKey, ...]:
+        return tuple(TestKey(self.workflow, self.source or self.name, test_id) for test_id in self.test_ids)
+
+
+class TestRunResult(NamedTuple):
+    """
+    The outcome of a ``vidarr test`` invocation
+
+    The return code is None if the run could not be started, was never started, or was stopped because another run
+    failed.
+    """
+    run: TestRun
+    returncode: Optional[int]
+    elapsed: Optional[float] = None
+    """The wall time, in seconds, the run took, if it was started"""
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+
+class TestEvent(NamedTuple):
+    """
+    Progress of a ``vidarr test`` invocation while the tests are running
+
+    The kind is ``start`` when the run begins, ``output`` for each line the run writes to standard output or standard
+    error, and ``finish`` when it ends.
+    """
+    kind: str
+    run: TestRun
+    elapsed: float
+    """The time, in seconds, since the run began"""
+    line: Optional[str] = None
+    """The line written, for ``output`` events"""
+    returncode: Optional[int] = None
+    """The exit status, for ``finish`` events; None if the run was stopped because another run failed"""
+
+
+def _test_id(test: Dict, index: int) -> str:
+    return str(test.get("id", f"#{index}")) if isinstance(test, dict) else f"#{index}"
+
+
+def _file_name(test_file: str) -> str:
+    return os.path.splitext(os.path.basename(test_file))[0]
+
+
+def load_durations(path: Optional[str]) -> Dict[TestKey, float]:
+    """
+    Read the recorded duration, in seconds, of each test
+
+    :param path: the path to a JSON object with an object for each root workflow, containing an object for each test
+    file, mapping each test ``id`` to its duration; if not provided or the file does not exist, no durations are known
+    :return: the duration of each test, by key
+    """
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        durations = json.load(f)
+    # Anything else, such as a history keyed by test id alone from an earlier version, is ignored
+    return {TestKey(workflow, test_file, test_id): float(duration)
+            for (workflow, test_files) in durations.items() if isinstance(test_files, dict)
+            for (test_file, tests) in test_files.items() if isinstance(tests, dict)
+            for (test_id, duration) in tests.items() if isinstance(duration, (int, float))}
+
+
+def durations_by_test(results: List["TestRunResult"]) -> Dict[TestKey, float]:
+    """
+    Determine the duration of each test in the runs that passed
+
+    ``vidarr test`` only reports on all the tests it ran, so the wall time of a run is split evenly between its tests.
+
+    :param results: the results of the runs
+    :return: the duration, in seconds, of each test, by key
+    """
+    return {key: result.elapsed / len(result.run.test_ids)
+            for result in results if result.ok and result.elapsed is not None
+            for key in result.run.test_keys}
+
+
+def record_durations(path: str, durations: Dict[TestKey, float],
+                     weight: float = HISTORY_WEIGHT) -> Dict[TestKey, float]:
+    """
+    Add test durations to a history file that can be read by :func:`load_durations`
+
+    The recorded duration of a test is a moving average, so a single unusually slow or fast run does not replace its
+    history. Tests that were not run keep their recorded durations.
+
+    :param path: the history file, which is created if it does not exist
+    :param durations: the durations measured, in seconds, by key
+    :param weight: the weight given to the new measurement, between 0 and 1
+    :return: the updated history
+    """
+    history = load_durations(path)
+    for (key, duration) in durations.items():
+        history[key] = duration if key not in history else history[key] * (1 - weight) + duration * weight
+    nested: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for ((workflow, test_file, test_id), duration) in history.items():
+        nested.setdefault(workflow, {}).setdefault(test_file, {})[test_id] = duration
+    with vidarr.files.open_atomically(path) as f:
+        json.dump(nested, f, indent=4, sort_keys=True)
+    return history
+
+
+def slowdowns(history: Dict[TestKey, float], durations: Dict[TestKey, float], factor: float = SLOWDOWN_FACTOR,
+              minimum: float = SLOWDOWN_MINIMUM) -> List[Tuple[TestKey, float, float]]:
+    """
+    Find the tests that took much longer than their recorded duration
+
+    :param history: the recorded duration of each test by key, as read by :func:`load_durations`
+    :param durations: the durations measured by key
+    :param factor: how many times longer than recorded a test must take to be reported
+    :param minimum: the number of seconds longer than recorded a test must take to be reported, so that short tests are
+    not reported for small changes
+    :return: the key, recorded duration, and measured duration of each slow test, slowest first
+    """
+    slow = [(key, history[key], duration) for (key, duration) in durations.items()
+            if key in history and duration > history[key] * factor and duration - history[key] >= minimum]
+    return sorted(slow, key=lambda entry: entry[2] - entry[1], reverse=True)
+
+
+def partition(weights: List[float], shards: int) -> List[List[int]]:
+    """
+    Split items into balanced shards
+
+    Items are assigned, heaviest first, to the shard with the least total weight. Within each shard, items keep their
+    original order.
+
+    :param weights: the weight (expected duration) of each item
+    :param shards: the number of shards; empty shards are not included
+    :return: the indices of the items in each shard
+    """
+    totals = [0.0] * shards
+    assignments: List[List[int]] = [[] for _ in range(shards)]
+    for index in sorted(range(len(weights)), key=lambda i: (-weights[i], i)):
+        target = min(range(shards), key=lambda shard: (totals[shard], shard))
+        totals[target] += weights[index]
+        assignments[target].append(index)
+    return [sorted(indices) for indices in assignments if indices]
+
+
+def exclude(test_files: List[str], directory: str, excluded: Callable[[Dict], bool],
+            workflow: str = "") -> Tuple[List[str], List[Tuple[TestKey, Dict]]]:
+    """
+    Remove tests from test files
+
+    Test files that contain excluded tests are replaced by copies, written to a directory, that contain only the
+    remaining tests. Test files where every test is excluded are dropped and test files with no excluded tests are
+    used as-is.
+
+    :param test_files: the paths to the test JSON files
+    :param directory: the directory to write the copies of the test files into
+    :param excluded: determines whether a test object should be removed
+    :param workflow: the name of the root workflow the tests belong to
+    :return: the paths to the test files to run and the key and test object of each excluded test
+    """
+    remaining_files = []
+    removed = []
+    for test_file in test_files:
+        with open(test_file) as f:
+            tests = json.load(f)
+        if not isinstance(tests, list):
+            remaining_files.append(test_file)
+            continue
+        remaining = []
+        for (index, test) in enumerate(tests):
+            if excluded(test):
+                removed.append((TestKey(workflow, _file_name(test_file), _test_id(test, index)), test))
+            else:
+                remaining.append(test)
+        if len(remaining) == len(tests):
+            remaining_files.append(test_file)
+        elif remaining:
+            remaining_file = os.path.join(directory, os.path.basename(test_file))
+            with open(remaining_file, "w") as f:
+                json.dump(remaining, f)
+            remaining_files.append(remaining_file)
+    return remaining_files, removed
+
+
+def plan(test_files: List[str], output_directory: Optional[str], shards: int = 1,
+         shard_directory: Optional[str] = None, durations: Optional[Dict[TestKey, float]] = None,
+         workflow: str = "") -> List[TestRun]:
+    """
+    Prepare the runs for each test file
+
+    If an output directory is provided, each run is given a separate subdirectory named after its test file and shard.
+    Otherwise, if there is more than one run, each run is given a new temporary directory, since runs happening at the
+    same time would all write to Vidarr's default output location.
+
+    :param test_files: the paths to the test JSON files
+    :param output_directory: the directory for test output, if any
+    :param shards: the number of shards to split each test file into
+    :param shard_directory: the directory to write the test files for each shard into; required if there is more than
+    one shard
+    :param durations: the recorded duration of each test by key, used to balance the shards; tests without a
+    recorded duration are assumed to take the average recorded duration
+    :param workflow: the name of the root workflow the tests belong to
+    """
+    durations = durations or {}
+    default_duration = sum(durations.values()) / len(durations) if durations else 1.0
+    runs = []
+    for test_file in test_files:
+        name = _file_name(test_file)
+        with open(test_file) as f:
+            tests = json.load(f)
+        test_ids = [_test_id(test, index) for (index, test) in enumerate(tests)] if isinstance(tests, list) else []
+        if shards <= 1 or not isinstance(tests, list):
+            # Malformed test files are passed along as-is for Vidarr to report
+            runs.append(TestRun(
+                name,
+                test_file,
+                os.path.join(output_directory, name) if output_directory else None,
+                tuple(test_ids),
+                workflow))
+            continue
+        weights = [durations.get(TestKey(workflow, name, test_id), default_duration) for test_id in test_ids]
+        for (index, indices) in enumerate(partition(weights, shards)):
+            shard_name = f"{name}-shard-{index + 1}"
+            shard_file = os.path.join(shard_directory, shard_name + ".json")
+            with open(shard_file, "w") as f:
+                json.dump([tests[i] for i in indices], f)
+            runs.append(TestRun(
+                shard_name,
+                shard_file,
+                os.path.join(output_directory, shard_name) if output_directory else None,
+                tuple(test_ids[i] for i in indices),
+                workflow,
+                name))
+    if not output_directory and len(runs) > 1:
+        runs = [run._replace(output_directory=tempfile.mkdtemp(prefix=f"vidarr-test-{run.name}-")) for run in runs]
+    return runs
+
+
+def results_by_test(results: List["TestRunResult"]) -> Dict[TestKey, bool]:
+    """
+    Determine whether each test passed
+
+    ``vidarr test`` only reports whether all the tests it ran passed, so every test in a run is given the result of the
+    run.
+
+    :param results: the results of the runs
+    :return: whether each test passed, by key
+    """
+    outcomes = {}
+    for result in results:
+        for key in result.run.test_keys:
+            outcomes[key] = outcomes.get(key, True) and result.ok
+    return outcomes
+
+
+def command(run: TestRun, test_config: str, workflow_path: str, verbose: bool) -> List[str]:
+    """
+    Create the command line to invoke ``vidarr test`` for a run
+    """
+    args = ["vidarr", "test", "-c", test_config, "-w", workflow_path, "-t", run.test_file]
+    if run.output_directory:
+        args.extend(["-o", run.output_directory])
+    if verbose:
+        args.append("-v")
+    return args
+
+
+def run_tests(runs: List[TestRun], test_config: str, workflow_path: str, verbose: bool = False,
+              jobs: Optional[int] = None, fail_fast: bool = False,
+              listener: Optional[Callable[[TestEvent], None]] = None) -> List[TestRunResult]:
+    """
+    Run ``vidarr test`` for each run, concurrently
+
+    :param runs: the runs to perform
+    :param test_config: the Vidarr plugin configuration file for running tests
+    :param workflow_path: the path to the built workflow definition
+    :param verbose: whether to run Vidarr in verbose mode
+    :param jobs: the maximum number of runs to perform at once; if not provided, all runs are started at once
+    :param fail_fast: if true, once any run fails, the runs in progress are stopped and no further runs are started
+    :param listener: if provided, the output of each run is captured, rather than written directly to standard output,
+    and this is called with each event as it happens; it is never called by two runs at once
+    :return: the result of each run, in input order
+    """
+    lock = threading.Lock()
+    listener_lock = threading.Lock()
+    slots = threading.Semaphore(jobs or len(runs) or 1)
+    failed = threading.Event()
+    processes: List[subprocess.Popen] = []
+    returncodes: List[Optional[int]] = [None] * len(runs)
+    elapsed: List[Optional[float]] = [None] * len(runs)
+
+    def notify(event: TestEvent):
+        if listener:
+            with listener_lock:
+                listener(event)
+
+    def perform(index: int):
+        try:
+            with lock:
+                if fail_fast and failed.is_set():
+                    return
+                run = runs[index]
+                try:
+                    if run.output_directory:
+                        os.makedirs(run.output_directory, exist_ok=True)
+                    start = time.monotonic()
+                    if listener:
+                        process = subprocess.Popen(command(run, test_config, workflow_path, verbose),
+                                                   stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                                                   errors="replace")
+                    else:
+                        process = subprocess.Popen(command(run, test_config, workflow_path, verbose))
+                except OSError as e:
+                    sys.stderr.write(f"Unable to run tests from {run.test_file}: {e}\n")
+                    failed.set()
+                    return
+                processes.append(process)
+            notify(TestEvent("start", run, 0.0))
+            if process.stdout:
+                for line in process.stdout:
+                    notify(TestEvent("output", run, time.monotonic() - start, line.rstrip("\n")))
+                process.stdout.close()
+            returncode = process.wait()
+            elapsed[index] = time.monotonic() - start
+            with lock:
+                processes.remove(process)
+                # A run terminated because another run failed has no result of its own
+                stopped = returncode < 0 and fail_fast and failed.is_set()
+                if not stopped:
+                    returncodes[index] = returncode
+                    if returncode != 0:
+                        failed.set()
+                        if fail_fast:
+                            for other in processes:
+                                other.terminate()
+            notify(TestEvent("finish", run, elapsed[index], returncode=returncodes[index]))
+        finally:
+            slots.release()
+
+    threads = []
+    for index in range(len(runs)):
+        slots.acquire()
+        if fail_fast and failed.is_set():
+            slots.release()
+            break
+        thread = threading.Thread(target=perform, args=(index,))
+        thread.start()
+        threads.append(thread)
+    for thread in threads:
+        thread.join()
+    return [TestRunResult(run, returncode, run_elapsed)
+            for (run, returncode, run_elapsed) in zip(runs, returncodes, elapsed)]
@@ -0,0 +1,109 @@
+import atexit
+import contextlib
+import cProfile
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, Iterator, Optional
+
+TIMINGS_ENV = "VIDARR_TIMINGS"
+
+
+class Timings:
+    """
+    Records the time spent in each phase of a run and counts of the things processed
+
+    Phases with the same name are combined, tracking the total time and the number of times the phase was entered.
+    """
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.phases: Dict[str, Dict[str, Any]] = {}
+        self.counts: Dict[str, int] = {}
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            phase = self.phases.setdefault(name, {"seconds": 0.0, "calls": 0})
+            phase["seconds"] += elapsed
+            phase["calls"] += 1
+
+    def count(self, name: str, value: int = 1):
+        self.counts[name] = self.counts.get(name, 0) + value
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            "total_seconds": time.perf_counter() - self.start,
+            "phases": self.phases,
+            "counts": self.counts,
+        }
+
+    def write(self, path: str):
+        """
+        Write the report as JSON to a file or, if the path is ``-``, standard error
+        """
+        if path == "-":
+            json.dump(self.report(), sys.stderr)
+            sys.stderr.write("\n")
+        else:
+            with open(path, "w") as f:
+                json.dump(self.report(), f)
+
+
+_current: Optional[Timings] = None
+
+
+def enable(path: Optional[str] = None) -> Optional[Timings]:
+    """
+    Start recording timings for this process
+
+    :param path: where to write the report when the process exits (a file or ``-`` for standard error); if not
+    provided, the ``VIDARR_TIMINGS`` environment variable is used and, if that is not set, timings are not recorded
+    :return: the timings being recorded, if any
+    """
+    global _current
+    path = path or os.environ.get(TIMINGS_ENV)
+    if not path:
+        return None
+    if _current is None:
+        _current = Timings()
+        atexit.register(_current.write, path)
+    return _current
+
+
+def profile(path: Optional[str]):
+    """
+    Profile this process with cProfile and write the statistics to a file when it exits
+
+    :param path: the file to write the statistics to; if not provided, the process is not profiled
+    """
+    if not path:
+        return
+    profiler = cProfile.Profile()
+
+    def finish():
+        profiler.disable()
+        profiler.dump_stats(path)
+
+    atexit.register(finish)
+    profiler.enable()
+
+
+def phase(name: str) -> contextlib.AbstractContextManager:
+    """
+    Time a phase if timings are being recorded
+    """
+    return _current.phase(name) if _current else contextlib.nullcontext()
+
+
+def count(name: str, value: int = 1):
+    """
+    Add to a count if timings are being recorded
+    """
+    if _current:
+        _current.count(name, value)
@@ -0,0 +1,212 @@
+import json
+from typing import Any, Dict, Iterator, List
+
+# The Vidarr input types that are written as a plain JSON value and the JSON types that are accepted for them;
+# booleans are checked separately since Python treats them as integers
+_PRIMITIVES = {
+    "boolean": (bool,),
+    "date": (str,),
+    "floating": (int, float),
+    "integer": (int,),
+    "string": (str,),
+}
+
+# The ways a file or directory can be provided to a workflow run
+FILE_SOURCES = ("EXTERNAL", "INTERNAL")
+
+
+def describe(vidarr_type: Any) -> str:
+    """
+    Write a Vidarr type in a form suitable for error messages
+
+    :param vidarr_type: the type, as it appears in a built workflow definition
+    """
+    if isinstance(vidarr_type, str):
+        return vidarr_type
+    if isinstance(vidarr_type, dict):
+        kind = vidarr_type.get("is")
+        if kind in ("list", "optional", "retry") and "inner" in vidarr_type:
+            return f"{kind}<{describe(vidarr_type['inner'])}>"
+        if kind == "pair":
+            return f"pair<{describe(vidarr_type.get('left'))}, {describe(vidarr_type.get('right'))}>"
+        if kind == "dictionary":
+            return f"dictionary<{describe(vidarr_type.get('key'))}, {describe(vidarr_type.get('value'))}>"
+        if kind == "object":
+            return "object {" + ", ".join(f"{name}: {describe(field)}"
+                                          for (name, field) in vidarr_type.get("fields", {}).items()) + "}"
+        if isinstance(kind, str):
+            return kind
+    return json.dumps(vidarr_type)
+
+
+def _show(value: Any) -> str:
+    text = json.dumps(value)
+    return text if len(text) <= 60 else text[:57] + "..."
+
+
+def _is_optional(vidarr_type: Any) -> bool:
+    return isinstance(vidarr_type, dict) and vidarr_type.get("is") == "optional"
+
+
+def check_value(vidarr_type: Any, value: Any, path: str) -> Iterator[str]:
+    """
+    Find the ways a JSON value does not match a Vidarr input type
+
+    Types that are not known, such as those added to Vidarr later, accept any value.
+
+    :param vidarr_type: the type, as it appears in the ``parameters`` of a built workflow definition
+    :param value: the value from the test's ``arguments``
+    :param path: the name of the value to use in error messages
+    :return: a description of each problem found
+    """
+    if isinstance(vidarr_type, str):
+        if vidarr_type in _PRIMITIVES:
+            if isinstance(value, bool) != (vidarr_type == "boolean") or \
+                    not isinstance(value, _PRIMITIVES[vidarr_type]):
+                yield f"{path}: expected {vidarr_type} but got {_show(value)}"
+        elif vidarr_type in ("file", "directory"):
+            if not isinstance(value, dict) or value.get("type") not in FILE_SOURCES or "contents" not in value:
+                yield f"{path}: expected {vidarr_type} as an object with a `type` of " \
+                      f"{' or '.join(FILE_SOURCES)} and `contents` but got {_show(value)}"
+            elif value["type"] == "EXTERNAL" and (
+                    not isinstance(value["contents"], dict) or
+                    not isinstance(value["contents"].get("externalIds"), list) or
+                    "configuration" not in value["contents"]):
+                yield f"{path}: expected external {vidarr_type} contents with `configuration` and a list of " \
+                      f"`externalIds` but got {_show(value['contents'])}"
+        return
+    if not isinstance(vidarr_type, dict):
+        return
+    kind = vidarr_type.get("is")
+    if kind == "optional":
+        if value is not None:
+            yield from check_value(vidarr_type["inner"], value, path)
+    elif kind == "retry":
+        # A retried value is either used for every attempt or is a list with a value for each attempt
+        inner = vidarr_type["inner"]
+        if isinstance(value, list) and not (isinstance(inner, dict) and inner.get("is") == "list"):
+            for (index, item) in enumerate(value):
+                yield from check_value(inner, item, f"{path}[{index}]")
+        else:
+            yield from check_value(inner, value, path)
+    elif kind == "list":
+        if not isinstance(value, list):
+            yield f"{path}: expected {describe(vidarr_type)} but got {_show(value)}"
+            return
+        for (index, item) in enumerate(value):
+            yield from check_value(vidarr_type["inner"], item, f"{path}[{index}]")
+    elif kind == "pair":
+        if not isinstance(value, dict) or set(value) != {"left", "right"}:
+            yield f"{path}: expected {describe(vidarr_type)} as an object with `left` and `right` but got " \
+                  f"{_show(value)}"
+            return
+        yield from check_value(vidarr_type["left"], value["left"], f"{path}.left")
+        yield from check_value(vidarr_type["right"], value["right"], f"{path}.right")
+    elif kind == "dictionary":
+        if isinstance(value, dict):
+            if vidarr_type["key"] != "string":
+                yield f"{path}: expected {describe(vidarr_type)} as a list of key-value pairs but got {_show(value)}"
+                return
+            for (key, item) in value.items():
+                yield from check_value(vidarr_type["value"], item, f"{path}[{json.dumps(key)}]")
+        elif isinstance(value, list):
+            for (index, entry) in enumerate(value):
+                if not isinstance(entry, list) or len(entry) != 2:
+                    yield f"{path}[{index}]: expected a key-value pair but got {_show(entry)}"
+                    continue
+                yield from check_value(vidarr_type["key"], entry[0], f"{path}[{index}].key")
+                yield from check_value(vidarr_type["value"], entry[1], f"{path}[{index}].value")
+        else:
+            yield f"{path}: expected {describe(vidarr_type)} but got {_show(value)}"
+    elif kind == "object":
+        if not isinstance(value, dict):
+            yield f"{path}: expected {describe(vidarr_type)} but got {_show(value)}"
+            return
+        fields: Dict[str, Any] = vidarr_type["fields"]
+        for (name, field_type) in fields.items():
+            if name in value:
+                yield from check_value(field_type, value[name], f"{path}.{name}")
+            elif not _is_optional(field_type):
+                yield f"{path}: missing required field {name} of type {describe(field_type)}"
+        for name in value:
+            if name not in fields:
+                yield f"{path}: unknown field {name}"
+
+
+def check_tests(tests: Any, workflow: Dict[str, Any]) -> List[str]:
+    """
+    Find the problems in a list of tests for a workflow
+
+    Each test must have a unique ``id``; ``arguments`` for every required parameter and only known parameters, with
+    values that match the parameter types; and ``metadata`` for exactly the outputs of the workflow.
+
+    :param tests: the contents of a test file
+    :param workflow: the built workflow definition, as produced by :func:`vidarr.wdl.convert`
+    :return: a description of each problem found
+    """
+    if not isinstance(tests, list):
+        return ["expected a list of tests"]
+    parameters: Dict[str, Any] = workflow.get("parameters", {})
+    outputs: Dict[str, Any] = workflow.get("outputs", {})
+    errors = []
+    seen = set()
+    for (index, test) in enumerate(tests):
+        if not isinstance(test, dict):
+            errors.append(f"test #{index}: expected an object but got {_show(test)}")
+            continue
+        test_id = test.get("id")
+        if not isinstance(test_id, str):
+            errors.append(f"test #{index}: `id` must be a string")
+            test_id = f"#{index}"
+        elif test_id in seen:
+            errors.append(f"test {test_id}: `id` is used by another test")
+        seen.add(test_id)
+        prefix = f"test {test_id}"
+        for (key, json_type, name) in (("engineArguments", dict, "an object"), ("validators", list, "a list")):
+            if key in test and test[key] is not None and not isinstance(test[key], json_type):
+                errors.append(f"{prefix}: `{key}` must be {name}")
+
+        arguments = test.get("arguments")
+        if not isinstance(arguments, dict):
+            errors.append(f"{prefix}: `arguments` must be an object of parameter values")
+        else:
+            for (name, parameter_type) in parameters.items():
+                if name in arguments:
+                    errors.extend(check_value(parameter_type, arguments[name], f"{prefix}: argument {name}"))
+                elif not _is_optional(parameter_type):
+                    errors.append(f"{prefix}: missing argument {name} of type {describe(parameter_type)}")
+            errors.extend(f"{prefix}: unknown argument {name}" for name in arguments if name not in parameters)
+
+        metadata = test.get("metadata")
+        if not isinstance(metadata, dict):
+            errors.append(f"{prefix}: `metadata` must be an object of output provisioning for each output")
+            continue
+        for name in outputs:
+            if name not in metadata:
+                errors.append(f"{prefix}: missing metadata for output {name}")
+            elif not isinstance(metadata[name], dict) or not isinstance(metadata[name].get("type"), str) or \
+                    "contents" not in metadata[name]:
+                errors.append(f"{prefix}: metadata for output {name}: expected an object with a `type` and "
+                              f"`contents` but got {_show(metadata[name])}")
+        errors.extend(f"{prefix}: metadata for unknown output {name}" for name in metadata if name not in outputs)
+    return errors
+
+
+def check_test_files(test_files: List[str], workflow: Dict[str, Any]) -> List[str]:
+    """
+    Find the problems in test files for a workflow, without running any of the tests
+
+    :param test_files: the paths to the test JSON files
+    :param workflow: the built workflow definition
+    :return: a description of each problem found, prefixed by the path of the file containing it
+    """
+    errors = []
+    for test_file in test_files:
+        try:
+            with open(test_file) as f:
+                tests = json.load(f)
+        except (OSError, ValueError) as e:
+            errors.append(f"{test_file}: {e}")
+            continue
+        errors.extend(f"{test_file}: {error}" for error in check_tests(tests, workflow))
+    return errors
@@ -0,0 +1,119 @@
+import os
+import sys
+import time
+from typing import Callable, Dict, Optional
+
+import vidarr.cache
+
+try:
+    import inotify_simple
+except ImportError:
+    inotify_simple = None
+
+DEFAULT_INTERVAL = 0.5
+
+
+def _hash_file(path: str) -> Optional[str]:
+    try:
+        with open(path) as f:
+            return vidarr.cache.hash_text(f.read())
+    except (OSError, UnicodeDecodeError):
+        return None
+
+
+def _changed(files: Dict[str, Optional[str]]) -> bool:
+    return any(_hash_file(path) != file_hash for (path, file_hash) in files.items())
+
+
+def _stat(path: str) -> Optional[tuple]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def _poll(files: Dict[str, Optional[str]], interval: float):
+    stats = {path: _stat(path) for path in files}
+    while True:
+        time.sleep(interval)
+        current = {path: _stat(path) for path in files}
+        touched = {path: stat for (path, stat) in current.items() if stat != stats[path]}
+        if touched:
+            if _changed({path: files[path] for path in touched}):
+                return
+            stats.update(touched)
+
+
+def _inotify(files: Dict[str, Optional[str]], interval: float, on_wait: Callable[[str], None]):
+    # Editors often save by replacing the file, so the directories are watched rather than the files themselves
+    flags = inotify_simple.flags
+    mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.CREATE | flags.DELETE | flags.MOVED_FROM | flags.ATTRIB
+    with inotify_simple.INotify() as inotify:
+        directories = {inotify.add_watch(directory, mask): directory
+                       for directory in {os.path.dirname(path) for path in files}}
+        on_wait("using inotify")
+        while True:
+            touched = {os.path.join(directories[event.wd], event.name)
+                       for event in inotify.read(read_delay=int(interval * 1000)) if event.wd in directories}
+            if _changed({path: file_hash for (path, file_hash) in files.items() if path in touched}):
+                return
+
+
+def wait_for_change(files: Dict[str, Optional[str]], interval: float = DEFAULT_INTERVAL,
+                    on_wait: Optional[Callable[[str], None]] = None):
+    """
+    Wait until the contents of any of a set of files change
+
+    Changes are detected using inotify if the ``inotify_simple`` package is installed; otherwise, the files are
+    polled. Only changes to the contents count, so saving a file without modifying it has no effect.
+
+    :param files: the hash of the contents of each file, by path, as computed by :func:`vidarr.cache.hash_text`, or
+    None if the file does not exist
+    :param interval: the time, in seconds, between checks when polling, or to wait for further events when using
+    inotify, so that multiple files saved together are handled at once
+    :param on_wait: if provided, this is called with a description of how changes are being detected, such as
+    ``using inotify``, once waiting begins
+    """
+    if not files:
+        raise ValueError("No files to watch")
+    on_wait = on_wait or (lambda how: None)
+    if inotify_simple is None:
+        on_wait("by polling; install inotify_simple to use inotify")
+    else:
+        try:
+            _inotify(files, interval, on_wait)
+            return
+        except OSError:
+            # inotify is unavailable (e.g., the watch limit has been reached) or a directory does not exist (yet), so
+            # fall back to polling
+            on_wait("by polling, since inotify is unavailable")
+    _poll(files, interval)
+
+
+def watch(build: Callable[[], Dict[str, Optional[str]]], interval: float = DEFAULT_INTERVAL):
+    """
+    Run a build and rerun it each time any of the files it used change, until interrupted
+
+    :param build: the build to run; it returns the hash of the contents of each file it read, by path, and is expected
+    to report its own errors but still return the files it read so that fixing the error triggers another build
+    :param interval: see :func:`wait_for_change`
+    """
+    reported = []
+
+    def report(how: str):
+        # Only say how changes are detected when it changes, rather than after every build
+        if reported != [how]:
+            reported[:] = [how]
+            sys.stderr.write(f"Watching for changes {how}.\n")
+
+    try:
+        while True:
+            files = build()
+            if not files:
+                sys.stderr.write("Nothing to watch.\n")
+                return
+            wait_for_change(files, interval, report)
+    except KeyboardInterrupt:
+        pass
+
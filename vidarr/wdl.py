@@ -1,10 +1,28 @@
 import argparse
-import json
+import asyncio
+import collections
+import concurrent.futures
+import contextlib
+import errno
+import functools
+import glob
+import importlib.metadata
+import multiprocessing
 import os
+import posixpath
 import sys
 import re
-from typing import Dict, Any
+import threading
+import urllib.parse
+from typing import Awaitable, Callable, Dict, Any, Iterable, Iterator, List, Optional, Tuple
 import WDL
+import WDL._parser
+
+import vidarr.cache
+import vidarr.emit
+import vidarr.mirror
+import vidarr.timing
+import vidarr.watch
 
 _output_mapping = [
     (WDL.Type.File(),
@@ -64,6 +82,25 @@ _output_mapping = [
 ]
 
 
+def _type_key(wdl_type: WDL.Type.Base) -> Tuple:
+    """
+    Create a hashable key for a WDL type such that two types have the same key exactly when they are equal, including
+    the optional and nonempty quantifiers of the type and its parameters
+    """
+    if isinstance(wdl_type, WDL.Type.StructInstance):
+        return "struct", wdl_type.type_name, wdl_type.optional
+    return (type(wdl_type).__name__,
+            wdl_type.optional,
+            isinstance(wdl_type, WDL.Type.Array) and wdl_type.nonempty,
+            tuple(_type_key(parameter) for parameter in wdl_type.parameters))
+
+
+# The first matching entry in _output_mapping wins, so later duplicates must not replace earlier ones
+_output_index: Dict[Tuple, str] = {}
+for (_vidarr_wdl_type, _vidarr_type) in _output_mapping:
+    _output_index.setdefault(_type_key(_vidarr_wdl_type), _vidarr_type)
+
+
 def _map_input(wdl_type: WDL.Type.Base, structures: Dict[str, Any]):
     if wdl_type.optional:
         return {
@@ -108,38 +145,78 @@ def _map_inner_input(wdl_type: WDL.Type.Base, structures: Dict[str, Any]):
     raise ValueError(f"No conversion for {wdl_type}")
 
 
+def _struct_dependencies(wdl_type: WDL.Type.Base) -> Iterator[str]:
+    if isinstance(wdl_type, WDL.Type.StructInstance):
+        # The parameters of a struct instance are its members, which are handled through the struct's own definition
+        yield wdl_type.type_name
+        return
+    for parameter in wdl_type.parameters:
+        yield from _struct_dependencies(parameter)
+
+
+def _map_structures(struct_typedefs: WDL.Env.Bindings[WDL.StructTypeDef]) -> Dict[str, Any]:
+    """
+    Convert every struct definition into the fields of a Vidarr object
+
+    The structs are converted in dependency order, so each struct is converted exactly once and any struct it contains
+    has already been converted.
+
+    :param struct_typedefs: the struct definitions in the document
+    :return: the Vidarr fields for each struct name
+    """
+    definitions = {binding.name: binding.value for binding in struct_typedefs}
+    dependencies = {}
+    dependents = collections.defaultdict(set)
+    for (name, definition) in definitions.items():
+        dependencies[name] = set()
+        for member_type in definition.members.values():
+            for dependency in _struct_dependencies(member_type):
+                if dependency not in definitions:
+                    raise ValueError(f"Struct {name} uses undefined struct {dependency}")
+                dependencies[name].add(dependency)
+                dependents[dependency].add(name)
+
+    # Kahn's algorithm: a struct can be converted once every struct it uses has been converted
+    remaining = {name: len(uses) for (name, uses) in dependencies.items()}
+    ready = collections.deque(name for (name, count) in remaining.items() if count == 0)
+    structures = {}
+    while ready:
+        name = ready.popleft()
+        del remaining[name]
+        structures[name] = {member_name: _map_input(member_type, structures) for (
+            member_name, member_type) in definitions[name].members.items()}
+        for dependent in dependents[name]:
+            remaining[dependent] -= 1
+            if remaining[dependent] == 0:
+                ready.append(dependent)
+
+    if remaining:
+        # Everything left is either in a cycle or uses a struct in a cycle; trim the structs that no other remaining
+        # struct uses until only the cycles are left
+        cyclic = set(remaining)
+        trimmed = True
+        while trimmed:
+            unused = {name for name in cyclic if not any(name in dependencies[other] for other in cyclic)}
+            cyclic -= unused
+            trimmed = bool(unused)
+        raise ValueError(f"Structs have cyclic definitions: {', '.join(sorted(cyclic))}")
+    return structures
+
+
 def _map_output(doc: WDL.Document, output: WDL.Decl, wdl_type: WDL.Type.Base, allow_complex: bool,
                 structures: WDL.Env.Bindings[WDL.StructTypeDef]):
     output_metadata = doc.workflow.meta.get("output_meta", {}).get(output.name, {})
-    for (vidarr_wdl_type, vidarr_type) in _output_mapping:
-        if wdl_type == vidarr_wdl_type:
-            if isinstance(output_metadata, dict) and "vidarr_label" in output_metadata:
-                if isinstance(wdl_type, WDL.Type.File) and not output.type.optional:
-                    return "file-with-labels"
-                elif isinstance(wdl_type, WDL.Type.File) and output.type.optional:
-                    return "optional-file-with-labels"
-                elif vidarr_type == "file-with-labels":
-                    vidarr_label = WDL.Expr.String(parts=['"', 'vidarr_label', '"'], pos=output.expr.right.items[0][0].pos)
-                    vidarr_label_value = WDL.Expr.String(parts=['"', output_metadata['vidarr_label'], '"'], pos=output.expr.right.items[0][0].pos)
-
-                    # Extracting existing entries from output.expr.right
-                    existing_entries = output.expr.right.items
-
-                    # Constructing a list of existing entries
-                    existing_entries_list = []
-                    for item in existing_entries:
-                        existing_entries_list.append(item)
-
-                    # Adding the new (vidarr_label, vidarr_label_value) tuple
-                    existing_entries_list.append((vidarr_label, vidarr_label_value))
-
-                    # Creating a new map with the updated list of items
-                    new_map = WDL.Expr.Map(pos=output.expr.pos, items=existing_entries_list)
-                    output.expr.right = new_map
-
-                else:
-                    raise ValueError(f"vidarr_label does not support {wdl_type}")
-            return vidarr_type
+    vidarr_type = _output_index.get(_type_key(wdl_type))
+    if vidarr_type is not None:
+        if isinstance(output_metadata, dict) and "vidarr_label" in output_metadata:
+            if isinstance(wdl_type, WDL.Type.File) and not output.type.optional:
+                return "file-with-labels"
+            elif isinstance(wdl_type, WDL.Type.File) and output.type.optional:
+                return "optional-file-with-labels"
+            elif vidarr_type != "file-with-labels":
+                raise ValueError(f"vidarr_label does not support {wdl_type}")
+            # Otherwise, the label is added to the existing labels when the source is rewritten by _label_outputs
+        return vidarr_type
     if allow_complex and isinstance(wdl_type, WDL.Type.Array):
         (inner,) = wdl_type.parameters
         if isinstance(inner, WDL.Type.StructInstance):
@@ -159,72 +236,547 @@ def _map_output(doc: WDL.Document, output: WDL.Decl, wdl_type: WDL.Type.Base, al
         f"Vidarr cannot process output type {wdl_type} in output.")
 
 
-def parse(wdl_file_path: str) -> Dict[str, Any]:
+_LOAD_ERRORS = (WDL.Error.ImportError, WDL.Error.MultipleValidationErrors, WDL.Error.SyntaxError,
+                WDL.Error.ValidationError)
+
+
+def _error_message(error: Exception) -> str:
+    # An import error only names the file that could not be imported, so include the reason it could not be
+    message = str(error)
+    if isinstance(error, WDL.Error.ImportError) and error.__cause__ is not None:
+        message += f"\n{_error_message(error.__cause__)}"
+    return message
+
+
+def _load_error(wdl_file_path: str, e: Exception) -> ValueError:
+    errors = e.exceptions if isinstance(e, WDL.Error.MultipleValidationErrors) else [e]
+    error_messages = [f"Error {i + 1} at line={error.pos.line} and column={error.pos.column}:\n{_error_message(error)}" for i, error in enumerate(errors)]
+    return ValueError(f"Unable to load {wdl_file_path} due to the following errors:\n{'\n'.join(error_messages)}")
+
+
+def load(wdl_file_path: str, mirror: Optional[vidarr.mirror.Mirror] = None,
+         cache: Optional[vidarr.cache.Cache] = None, trust_validated: bool = False) -> WDL.Document:
+    """
+    Read and typecheck a WDL file and all the files it imports
+
+    :param wdl_file_path: the path to the WDL file
+    :param mirror: the mirror to read imported URLs through; if not provided, URLs are fetched every time
+    :param cache: if provided, a cache to record the documents that pass typechecking in
+    :param trust_validated: if true, documents recorded in the cache as having passed typechecking are not
+    typechecked again; see :class:`Loader`
+    :return: the parsed WDL file
+    :raises ValueError: if the WDL file or any file it imports is invalid
+    """
+    return Loader(mirror=mirror, cache=cache, trust_validated=trust_validated).load(wdl_file_path)
+
+
+def _is_url(uri: str) -> bool:
+    return re.match(r"^[a-z][a-z0-9+.-]*://", uri) is not None
+
+
+def _read_text(path: str) -> str:
+    with open(path) as f:
+        return f.read()
+
+
+async def _read_source(uri: str, path: List[str], importer: Optional[WDL.Document]) -> WDL.ReadSourceResult:
+    # The same as WDL.read_source_default, except that the file is read in another thread so that files can be read
+    # in parallel
+    abspath = await WDL.resolve_file_import(uri, path, importer)
+    return WDL.ReadSourceResult(source_text=await asyncio.to_thread(_read_text, abspath), abspath=abspath)
+
+
+def _import_key(uri: str, importer: Optional[WDL.Document]) -> str:
+    # Where an import is expected to be read from, so that a file imported by many files is only read once; this does
+    # not need to be exact, since the documents are also matched by the absolute path the file was read from
+    if _is_url(uri):
+        return uri
+    if importer is None or os.path.isabs(uri):
+        return os.path.abspath(uri)
+    if _is_url(importer.pos.abspath):
+        return urllib.parse.urljoin(importer.pos.abspath, uri)
+    return os.path.normpath(os.path.join(os.path.dirname(importer.pos.abspath), uri))
+
+
+class _CircularImportError(WDL.Error.ImportError):
+    pass
+
+
+# miniwdl's parser collects comments in a global buffer, so only one document can be parsed at a time
+_parse_lock = threading.Lock()
+
+
+# The miniwdl releases that the internals used by _parse_document and _prepare_validated were tested with; these
+# internals may change in any release, so with another release, only the public interface is used and documents are
+# always typechecked in full, even when trusting validated documents
+MINIWDL_TESTED = ((1, 12), (1, 15))
+
+
+def _miniwdl_tested() -> bool:
+    try:
+        version = tuple(int(part) for part in importlib.metadata.version("miniwdl").split(".")[:2])
+    except (importlib.metadata.PackageNotFoundError, ValueError):
+        return False
+    return MINIWDL_TESTED[0] <= version <= MINIWDL_TESTED[1] and \
+        all(hasattr(WDL.Tree, name) for name in ("_import_structs", "_initialize_struct_typedefs", "_resolve_calls"))
+
+
+TRUST_SUPPORTED = _miniwdl_tested()
+"""Whether the installed miniwdl release is one that skipping typechecking of validated documents was tested with"""
+
+
+def _parse_document(source_text: str, uri: str, abspath: str) -> WDL.Document:
+    # WDL.parse_document does not accept the absolute path, which is needed to resolve relative imports, so the same
+    # parser used by WDL.load is called directly
+    with _parse_lock:
+        if TRUST_SUPPORTED:
+            return WDL._parser.parse_document(source_text, uri=uri, abspath=abspath)
+        doc = WDL.parse_document(source_text, uri=uri)
+    doc.pos = doc.pos._replace(abspath=abspath)
+    return doc
+
+
+def _prepare_validated(doc: WDL.Document):
+    # The subset of Document.typecheck that conversion relies on: struct definitions (including imported ones) are
+    # resolved for the struct types and each call is bound to its callee for the workflow's available inputs
+    WDL.Tree._import_structs(doc)
+    for struct_binding in doc.struct_typedefs:
+        doc._struct_types = doc._struct_types.bind(struct_binding.name, struct_binding.value.members)
+    WDL.Tree._initialize_struct_typedefs(doc.struct_typedefs, doc._struct_types)
+    WDL.Tree._resolve_calls(doc)
+
+
+class _Node:
+    """
+    A file in the import graph
+
+    If the file is unchanged since the previous load, it is not parsed again and ``template`` is the previous document;
+    otherwise, ``template`` is the newly parsed, but not typechecked, document.
+    """
+
+    def __init__(self, source: WDL.ReadSourceResult, source_hash: str):
+        self.source = source
+        self.source_hash = source_hash
+        self.template: Optional[WDL.Document] = None
+        self.parsed = False
+        self.validation_key: Optional[str] = None
+        self.imports: List[str] = []
+        """The absolute path of each import, in the same order as the template's imports"""
+
+
+class Loader:
+    """
+    Loads WDL files and their transitive imports, reusing the documents from the previous load that are unaffected by
+    any changes
+
+    Loading happens in two passes. First, the import graph is discovered by reading all the imports of each file in
+    parallel; each file is read and parsed only once, even if it is imported by many files. Then, the documents are
+    typechecked from the leaves up, stopping with an error if the imports are circular.
+
+    A document is reused if its source and the sources of every file it imports, directly or indirectly, are unchanged.
+    Otherwise, it is parsed and typechecked again, but the documents for any unchanged files it imports are still
+    reused, so an edit to one imported file does not cause its siblings to be parsed again.
+
+    If a cache is provided, every document that passes typechecking is recorded in it, keyed by its source and the
+    sources of everything it imports. When trusting validated documents, a recorded document is not typechecked;
+    only the work conversion depends on, resolving imported structs and the targets of calls, is done. This is only
+    safe for sources that have already been checked, such as in CI; any document that is not recorded is still fully
+    typechecked. Since this relies on miniwdl internals, it is only done with the miniwdl releases in
+    :data:`MINIWDL_TESTED`; with any other release, every document is typechecked.
+    """
+
+    def __init__(self, read_source: Optional[Callable[[str, List[str], Optional[WDL.Document]],
+                                                      Awaitable[WDL.ReadSourceResult]]] = None,
+                 executor: Optional[concurrent.futures.Executor] = None,
+                 mirror: Optional[vidarr.mirror.Mirror] = None, cache: Optional[vidarr.cache.Cache] = None,
+                 trust_validated: bool = False):
+        """
+        :param read_source: the function to read each file, with the same behaviour as ``WDL.read_source_default``;
+        if not provided, files are read from disk and URLs are read through the mirror, if any, or downloaded
+        :param executor: the executor to parse and typecheck documents in when loading asynchronously; if not
+        provided, the event loop's default executor is used
+        :param mirror: the mirror to read imported URLs through, if ``read_source`` is not provided; if not provided,
+        URLs are fetched every time
+        :param cache: if provided, a cache to record the documents that pass typechecking in
+        :param trust_validated: if true, documents recorded in the cache as having passed typechecking are not
+        typechecked again; this has no effect unless :data:`TRUST_SUPPORTED`
+        """
+        self.read_source = read_source or (mirror.reader if mirror else vidarr.mirror.reader)(_read_source)
+        self.executor = executor
+        self.cache = cache
+        self.trust_validated = trust_validated
+        self._documents: Dict[str, Tuple[str, WDL.Document]] = {}
+        self.paths: Dict[str, str] = {}
+        """The hash of every file read by the most recent load, by absolute path"""
+
+    def load(self, wdl_file_path: str) -> WDL.Document:
+        """
+        Read and typecheck a WDL file and all the files it imports
+
+        :param wdl_file_path: the path to the WDL file
+        :return: the parsed WDL file, which is the same object as returned by the previous load if nothing changed
+        :raises ValueError: if the WDL file or any file it imports is invalid
+        """
+        async def parse_inline(source_text: str, uri: str, abspath: str) -> WDL.Document:
+            return _parse_document(source_text, uri, abspath)
+
+        nodes: Dict[str, _Node] = {}
+        try:
+            with vidarr.timing.phase("load"):
+                root = asyncio.run(self._discover(wdl_file_path, None, nodes, {}, parse_inline))
+                return self._build(root, nodes, {}, [root])
+        except _LOAD_ERRORS as e:
+            raise _load_error(wdl_file_path, e) from e
+        finally:
+            self.paths = {abspath: node.source_hash for (abspath, node) in nodes.items()}
+
+    async def load_async(self, wdl_file_path: str) -> WDL.Document:
+        """
+        Read and typecheck a WDL file and all the files it imports without blocking the event loop
+
+        Files are read asynchronously, and parsing and typechecking are done in the executor. If cancelled, any parsing
+        or typechecking in progress in the executor runs to completion but the result is discarded.
+
+        :param wdl_file_path: the path to the WDL file
+        :return: the parsed WDL file, which is the same object as returned by the previous load if nothing changed
+        :raises ValueError: if the WDL file or any file it imports is invalid
+        """
+        loop = asyncio.get_running_loop()
+
+        async def parse_in_executor(source_text: str, uri: str, abspath: str) -> WDL.Document:
+            return await loop.run_in_executor(self.executor, _parse_document, source_text, uri, abspath)
+
+        nodes: Dict[str, _Node] = {}
+        try:
+            with vidarr.timing.phase("load"):
+                root = await self._discover(wdl_file_path, None, nodes, {}, parse_in_executor)
+                return await loop.run_in_executor(self.executor, self._build, root, nodes, {}, [root])
+        except _LOAD_ERRORS as e:
+            raise _load_error(wdl_file_path, e) from e
+        finally:
+            self.paths = {abspath: node.source_hash for (abspath, node) in nodes.items()}
+
+    async def _discover(self, uri: str, importer: Optional[WDL.Document], nodes: Dict[str, _Node],
+                        reads: Dict[str, "asyncio.Future[WDL.ReadSourceResult]"],
+                        parse: Callable[[str, str, str], Awaitable[WDL.Document]]) -> str:
+        # Every import of the same file waits for the same read
+        key = _import_key(uri, importer)
+        if key not in reads:
+            reads[key] = asyncio.ensure_future(self.read_source(uri, [], importer))
+        source = await reads[key]
+        if source.abspath in nodes:
+            return source.abspath
+        node = _Node(source, vidarr.cache.hash_text(source.source_text))
+        # Record the node before parsing, so that other imports of the same file wait for this one
+        nodes[source.abspath] = node
+        previous = self._documents.get(source.abspath)
+        if previous is not None and previous[0] == node.source_hash:
+            node.template = previous[1]
+        else:
+            node.template = await parse(source.source_text, uri, source.abspath)
+            node.parsed = True
+        node.imports = list(await asyncio.gather(
+            *(self._discover_import(node.template, imp, nodes, reads, parse) for imp in node.template.imports)))
+        return source.abspath
+
+    async def _discover_import(self, importer: WDL.Document, imp: WDL.Tree.DocImport, nodes: Dict[str, _Node],
+                               reads: Dict[str, "asyncio.Future[WDL.ReadSourceResult]"],
+                               parse: Callable[[str, str, str], Awaitable[WDL.Document]]) -> str:
+        try:
+            return await self._discover(imp.uri, importer, nodes, reads, parse)
+        except Exception as e:
+            raise WDL.Error.ImportError(imp.pos, imp.uri) from e
+
+    def _build(self, abspath: str, nodes: Dict[str, _Node], built: Dict[str, WDL.Document],
+               chain: List[str]) -> WDL.Document:
+        if abspath in built:
+            return built[abspath]
+        node = nodes[abspath]
+        imported = []
+        for (imp, import_path) in zip(node.template.imports, node.imports):
+            if import_path in chain:
+                cycle = chain[chain.index(import_path):] + [import_path]
+                raise _CircularImportError(imp.pos, imp.uri, f"circular imports: {' -> '.join(cycle)}")
+            try:
+                imported.append(self._build(import_path, nodes, built, chain + [import_path]))
+            except _CircularImportError:
+                raise
+            except Exception as e:
+                raise WDL.Error.ImportError(imp.pos, imp.uri) from e
+        if self.cache:
+            node.validation_key = vidarr.cache.Cache.validation_key(
+                node.source_hash, [nodes[import_path].validation_key for import_path in node.imports])
+        if not node.parsed and all(subdoc is imp.doc for (subdoc, imp) in zip(imported, node.template.imports)):
+            vidarr.timing.count("documents_reused")
+            built[abspath] = node.template
+            return node.template
+        doc = node.template if node.parsed else _parse_document(
+            node.source.source_text, node.template.pos.uri, abspath)
+        for (i, subdoc) in enumerate(imported):
+            imp = doc.imports[i]
+            doc.imports[i] = WDL.Tree.DocImport(pos=imp.pos, uri=imp.uri, namespace=imp.namespace,
+                                                aliases=imp.aliases, doc=subdoc)
+        if self.cache and self.trust_validated and TRUST_SUPPORTED and self.cache.is_validated(node.validation_key):
+            _prepare_validated(doc)
+            vidarr.timing.count("documents_trusted")
+        else:
+            doc.typecheck()
+            if self.cache:
+                self.cache.record_validated(node.validation_key)
+        vidarr.timing.count("documents_loaded")
+        self._documents[abspath] = (node.source_hash, doc)
+        built[abspath] = doc
+        return doc
+
+
+def parse(wdl_file_path: str, cache: Optional[vidarr.cache.Cache] = None,
+          mirror: Optional[vidarr.mirror.Mirror] = None, trust_validated: bool = False) -> Dict[str, Any]:
     """
     Read a WDL file and convert it into a Vidarr workflow definition
 
     :param wdl_file_path: the path to the WDL file; this must be a path on disk in case the WDL file imports other files
+    :param cache: if provided, a cache to check for a previously converted workflow definition before loading the WDL
+    file and to store the converted workflow definition in; the documents that pass typechecking are also recorded in it
+    :param mirror: the mirror to read imported URLs through; if not provided, URLs are fetched every time
+    :param trust_validated: if true, documents recorded in the cache as having passed typechecking are not
+    typechecked again; see :class:`Loader`
     :return: the Vidarr configuration object
     """
-    try:
-        doc = WDL.load(wdl_file_path)
-    except (WDL.Error.MultipleValidationErrors, WDL.Error.SyntaxError, WDL.Error.ValidationError) as e:
-        errors = e.exceptions if isinstance(e, WDL.Error.MultipleValidationErrors) else [e]
-        error_messages = [f"Error {i + 1} at line={error.pos.line} and column={error.pos.column}:\n{error}" for i, error in enumerate(errors)]
-        raise ValueError(f"Unable to load {wdl_file_path} due to the following errors:\n{'\n'.join(error_messages)}") from e
+    if cache:
+        with vidarr.timing.phase("cache_lookup"):
+            workflow = cache.get(wdl_file_path)
+        if workflow is not None:
+            vidarr.timing.count("cache_hits")
+            return workflow
+    doc = load(wdl_file_path, mirror, cache, trust_validated)
 
-    return convert(doc)
+    with vidarr.timing.phase("convert"):
+        workflow = convert(doc)
+    if cache:
+        with vidarr.timing.phase("cache_store"):
+            cache.put(wdl_file_path, doc, workflow)
+    return workflow
 
 
-def convert(doc: WDL.Document) -> Dict[str, Any]:
+async def parse_async(wdl_file_path: str, cache: Optional[vidarr.cache.Cache] = None,
+                      executor: Optional[concurrent.futures.Executor] = None,
+                      semaphore: Optional[asyncio.Semaphore] = None,
+                      mirror: Optional[vidarr.mirror.Mirror] = None,
+                      trust_validated: bool = False) -> Dict[str, Any]:
     """
-    Convert a parsed WDL file into a Vidarr workflow definition
-    :param doc:  the parsed WDL file
+    Read a WDL file and convert it into a Vidarr workflow definition without blocking the event loop
+
+    This is the asynchronous equivalent of :func:`parse`, for use in services. Imports are read asynchronously and the
+    CPU-bound parsing, typechecking, and conversion are done in an executor. Conversions can be cancelled; any work in
+    progress in the executor runs to completion, but nothing further is done and the result is discarded.
+
+    :param wdl_file_path: the path to the WDL file
+    :param cache: if provided, a cache to check for a previously converted workflow definition before loading the WDL
+    file and to store the converted workflow definition in
+    :param executor: the executor for the CPU-bound work; if not provided, the event loop's default executor is used
+    :param semaphore: if provided, the conversion waits to acquire it before starting, limiting the number of
+    conversions in progress at once
+    :param mirror: the mirror to read imported URLs through; if not provided, URLs are fetched every time
+    :param trust_validated: if true, documents recorded in the cache as having passed typechecking are not
+    typechecked again; see :class:`Loader`
     :return: the Vidarr configuration object
     """
-    workflow_name = doc.workflow.name
-    structures = {}
-    unprocessed_structs = [s for s in doc.struct_typedefs]
-    while unprocessed_structs:
-        structs_needing_unprocessed = []
-        for structure in unprocessed_structs:
-            try:
-                structures[structure.name] = {member_name: _map_input(member_type, structures) for (
-                    member_name, member_type) in structure.value.members.items()}
-            except KeyError:
-                structs_needing_unprocessed.append(structure)
-        assert len(structs_needing_unprocessed) < len(unprocessed_structs)
-        unprocessed_structs = structs_needing_unprocessed
+    async with semaphore or contextlib.nullcontext():
+        loop = asyncio.get_running_loop()
+        if cache:
+            with vidarr.timing.phase("cache_lookup"):
+                workflow = await loop.run_in_executor(executor, cache.get, wdl_file_path)
+            if workflow is not None:
+                vidarr.timing.count("cache_hits")
+                return workflow
+        doc = await Loader(executor=executor, mirror=mirror, cache=cache,
+                           trust_validated=trust_validated).load_async(wdl_file_path)
+        with vidarr.timing.phase("convert"):
+            workflow = await loop.run_in_executor(executor, convert, doc)
+        if cache:
+            with vidarr.timing.phase("cache_store"):
+                await loop.run_in_executor(executor, cache.put, wdl_file_path, doc, workflow)
+        return workflow
 
-    workflow_inputs = {}
 
-    def read_output(output: WDL.Decl):
-        output_metadata = doc.workflow.meta.get(
-            "output_meta", {}).get(
-            output.name, {})
-        if isinstance(
-                output_metadata,
-                dict) and "vidarr_type" in output_metadata:
-            if "vidarr_label" in output_metadata:
-                print("Warning: There is a label inside output_meta that is being overriden by the specified vidarr_type")
-            return output_metadata["vidarr_type"]
+def _virtual_path(path: str) -> str:
+    if _is_url(path):
+        return path
+    return posixpath.normpath(posixpath.join("/", path))
+
+
+def _read_memory_source(sources: Dict[str, str]) -> Callable[[str, List[str], Optional[WDL.Document]],
+                                                                 Awaitable[WDL.ReadSourceResult]]:
+    files = {_virtual_path(path): text for (path, text) in sources.items()}
+
+    async def read_source(uri: str, path: List[str], importer: Optional[WDL.Document]) -> WDL.ReadSourceResult:
+        if importer is None or _is_url(uri):
+            abspath = _virtual_path(uri)
         else:
-            return _map_output(
-                doc, output, output.type, True, doc.struct_typedefs)
+            abspath = _virtual_path(posixpath.join(posixpath.dirname(importer.pos.abspath), uri))
+        if abspath not in files:
+            raise FileNotFoundError(errno.ENOENT, os.strerror(errno.ENOENT), uri)
+        return WDL.ReadSourceResult(source_text=files[abspath], abspath=abspath)
+
+    return read_source
+
+
+def parse_sources(root_name: str, sources: Dict[str, str]) -> Dict[str, Any]:
+    """
+    Convert a WDL file, and the files it imports, held in memory into a Vidarr workflow definition
 
+    No files are read from disk. Relative imports are resolved against the path of the importing file, as they would be
+    on disk, and imports of URLs must be provided using the URL as the path.
+
+    :param root_name: the path of the WDL file to convert in the sources
+    :param sources: the text of each file by path; paths are relative to an imaginary root directory
+    :return: the Vidarr configuration object
+    :raises ValueError: if the WDL file or any file it imports is invalid or missing from the sources
+    """
+    try:
+        doc = Loader(_read_memory_source(sources)).load(root_name)
+    except FileNotFoundError as e:
+        raise ValueError(f"Unable to load {root_name}: not in the provided sources") from e
+    with vidarr.timing.phase("convert"):
+        return convert(doc)
+
+
+def watch(wdl_file_path: str, write: Callable[[Dict[str, Any]], None],
+          interval: float = vidarr.watch.DEFAULT_INTERVAL, mirror: Optional[vidarr.mirror.Mirror] = None):
+    """
+    Convert a WDL file, and convert it again each time it or any file it imports changes, until interrupted
+
+    Errors are written to standard error and the file is converted again once they are fixed.
+
+    :param wdl_file_path: the path to the WDL file
+    :param write: called with each new Vidarr configuration object
+    :param interval: see :func:`vidarr.watch.wait_for_change`
+    :param mirror: the mirror to read imported URLs through; if not provided, URLs are fetched every time
+    """
+    loader = Loader(mirror=mirror)
+    previous = None
+
+    def build() -> Dict[str, Optional[str]]:
+        nonlocal previous
+        try:
+            doc = loader.load(wdl_file_path)
+            if doc is not previous:
+                with vidarr.timing.phase("convert"):
+                    workflow = convert(doc)
+                write(workflow)
+                previous = doc
+                sys.stderr.write(f"Converted {wdl_file_path}\n")
+        except (OSError, ValueError) as e:
+            sys.stderr.write(f"{e}\n")
+        # Only local files are watched; imported URLs are read again whenever a local file changes
+        files = {path: file_hash for (path, file_hash) in loader.paths.items() if not vidarr.mirror.is_remote(path)}
+        return files or {os.path.abspath(wdl_file_path): None}
+
+    vidarr.watch.watch(build, interval)
+
+
+def prefetch(wdl_file_path: str, mirror_directory: Optional[str] = None) -> List[str]:
+    """
+    Fetch every URL imported by a WDL file, directly or indirectly, into a mirror, replacing any copies already there
+
+    :param wdl_file_path: the path to the WDL file
+    :param mirror_directory: the directory of the mirror; if not provided, the default mirror is used
+    :return: the URLs fetched
+    :raises ValueError: if the WDL file or any file it imports is invalid
+    """
+    mirror = vidarr.mirror.Mirror(mirror_directory, refresh=True)
+    load(wdl_file_path, mirror)
+    return sorted(mirror.fetched)
+
+
+def _expand_paths(wdl_file_paths: Iterable[str]) -> List[str]:
+    paths = []
+    for wdl_file_path in wdl_file_paths:
+        if glob.has_magic(wdl_file_path):
+            paths.extend(sorted(glob.glob(wdl_file_path, recursive=True)))
+        else:
+            paths.append(wdl_file_path)
+    return paths
+
+
+def _parse_result(wdl_file_path: str, cache: Optional[vidarr.cache.Cache] = None,
+                  mirror: Optional[vidarr.mirror.Mirror] = None, trust_validated: bool = False) -> Dict[str, Any]:
+    try:
+        return {"path": wdl_file_path, "workflow": parse(wdl_file_path, cache, mirror, trust_validated)}
+    except Exception as e:
+        return {"path": wdl_file_path, "error": {"type": type(e).__name__, "message": str(e)}}
+
+
+def parse_many(wdl_file_paths: Iterable[str], processes: Optional[int] = None,
+               cache: Optional[vidarr.cache.Cache] = None,
+               mirror: Optional[vidarr.mirror.Mirror] = None,
+               trust_validated: bool = False) -> Iterator[Dict[str, Any]]:
+    """
+    Read many WDL files and convert each into a Vidarr workflow definition using a pool of worker processes
+
+    :param wdl_file_paths: the paths to the WDL files; glob patterns (including ``**``) are expanded
+    :param processes: the number of worker processes; if not provided, the number of CPUs is used and, if 1, the files
+    are converted in the current process
+    :param cache: if provided, a cache of converted workflow definitions to use; see :func:`parse`
+    :param mirror: the mirror to read imported URLs through; if not provided, URLs are fetched every time
+    :param trust_validated: if true, documents recorded in the cache as having passed typechecking are not
+    typechecked again; see :class:`Loader`
+    :return: a result for each file, in input order, as soon as it is available; each result has the ``path`` and
+    either the Vidarr configuration object as ``workflow`` or a dictionary with the ``type`` and ``message`` of the
+    failure as ``error``
+    """
+    paths = _expand_paths(wdl_file_paths)
+    parse_result = functools.partial(_parse_result, cache=cache, mirror=mirror, trust_validated=trust_validated)
+    processes = min(processes or os.cpu_count() or 1, len(paths))
+    if processes <= 1:
+        yield from map(parse_result, paths)
+        return
+    with multiprocessing.Pool(processes) as pool:
+        yield from pool.imap(parse_result, paths)
+
+
+def _calls(body: List[WDL.Tree.WorkflowNode]) -> Iterator[WDL.Tree.Call]:
+    # Every call in a workflow, including those nested in scatters and conditionals
+    for node in body:
+        if isinstance(node, WDL.Tree.Call):
+            yield node
+        elif isinstance(node, (WDL.Tree.Scatter, WDL.Tree.Conditional)):
+            yield from _calls(node.body)
+
+
+def _parameter_meta_index(workflow: WDL.Workflow, indices: Dict[int, Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Map the fully-qualified name of every input that could be available from a workflow to its ``parameter_meta``
+
+    The names match those in ``workflow.available_inputs``: the workflow's own inputs by name, and the inputs of each
+    call, including calls to imported tasks and subworkflows, by the call name (which is the alias, if any) followed by
+    the name of the input within the callee.
+
+    :param workflow: the typechecked workflow
+    :param indices: the indices already built for subworkflows, by ``id``, so that a subworkflow called many times is
+    only indexed once
+    """
+    index = dict(workflow.parameter_meta)
+    for call in _calls(workflow.body):
+        if isinstance(call.callee, WDL.Workflow):
+            callee_key = id(call.callee)
+            if callee_key not in indices:
+                indices[callee_key] = _parameter_meta_index(call.callee, indices)
+            callee_meta = indices[callee_key]
+        else:
+            callee_meta = call.callee.parameter_meta
+        for (name, meta) in callee_meta.items():
+            index[f"{call.name}.{name}"] = meta
+    return index
+
+
+def _map_inputs(doc: WDL.Document, structures: Dict[str, Any]) -> Dict[str, Any]:
+    workflow_inputs = {}
+    # `workflow.available_inputs` gets all inputs (workflow, task, import), but `workflow.parameter_meta` only has the
+    # workflow's own inputs, so the metadata for the rest is found through the calls
+    parameter_meta = _parameter_meta_index(doc.workflow, {})
     for wf_input in (doc.workflow.available_inputs or []):
-        # `workflow.available_inputs` gets all inputs (workflow, task, import)
-        # `but `workflow.parameter_meta` only gets workflow inputs.
-        input_name = wf_input.name.split(".")
-        meta = None
-        if len(input_name) == 1:
-            meta = doc.workflow.parameter_meta.get(wf_input.name)
-        elif len(input_name) == 2:
-            task_name, parameter_name = input_name[0], input_name[1]
-            for task in doc.tasks:
-                if task.name == task_name:
-                    meta = task.parameter_meta.get(parameter_name)
-                    break
+        meta = parameter_meta.get(wf_input.name)
 
         if meta and isinstance(meta, dict) and "vidarr_type" in meta:
             vidarr_type = meta["vidarr_type"]
@@ -240,10 +792,64 @@ def convert(doc: WDL.Document) -> Dict[str, Any]:
             vidarr_type = {"is": "optional", "inner": vidarr_type}
 
         workflow_inputs[doc.workflow.name + "." + wf_input.name] = vidarr_type
+    return workflow_inputs
+
+
+def _line_offsets(source_text: str) -> List[int]:
+    offsets = [0]
+    for (index, character) in enumerate(source_text):
+        if character == "\n":
+            offsets.append(index + 1)
+    return offsets
+
+
+def _span(line_offsets: List[int], pos: WDL.SourcePosition) -> Tuple[int, int]:
+    """
+    Convert a source position, which has 1-based lines and columns and an exclusive end column, into a half-open
+    range of offsets in the source text
+    """
+    return (line_offsets[pos.line - 1] + pos.column - 1,
+            line_offsets[pos.end_line - 1] + pos.end_column - 1)
+
+
+def _apply_edits(source_text: str, edits: List[Tuple[int, int, str]]) -> str:
+    """
+    Replace ranges of a text in a single pass
+
+    Since every edit refers to offsets in the original text, the edits do not affect each other's positions.
+
+    :param source_text: the original text
+    :param edits: the half-open ranges, as (start, end) offsets in the original text, and the text to replace each
+    with; ranges must not overlap, but an empty range inserts text
+    :return: the edited text
+    """
+    pieces = []
+    position = 0
+    for (start, end, replacement) in sorted(edits, key=lambda edit: (edit[0], edit[1])):
+        if start < position:
+            raise ValueError(f"Overlapping edits at offset {start}")
+        pieces.append(source_text[position:start])
+        pieces.append(replacement)
+        position = end
+    pieces.append(source_text[position:])
+    return "".join(pieces)
+
+
+def _label_outputs(doc: WDL.Document) -> str:
+    """
+    Rewrite the workflow source so that outputs with a ``vidarr_label`` also produce their label
 
+    The document is not modified.
+    """
     output_meta = doc.workflow.meta.get("output_meta", {})
+    source_text = doc.source_text
+    line_offsets = _line_offsets(source_text)
+    edits = []
+
+    def source(element: WDL.SourceNode) -> str:
+        (start, end) = _span(line_offsets, element.pos)
+        return source_text[start:end]
 
-    wdl_doc = doc.source_lines
     add_empty_optional_pair_for_vidarr_labels = False
     # Iterate over each output defined in the workflow
     for output in doc.workflow.outputs:
@@ -254,14 +860,11 @@ def convert(doc: WDL.Document) -> Dict[str, Any]:
 
             if isinstance(output_metadata, dict) and 'vidarr_label' in output_metadata:
                 vidarr_label = output_metadata['vidarr_label']
-
-                source_line = output.pos.line - 1
-                start_position = output.pos.column - 1
-                end_position = output.pos.end_column - 1
+                expr = source(output.expr)
 
                 if isinstance(output.type, WDL.Type.File) and not output.type.optional:
                     output_line = (f'Pair[File, Map[String, String]] {output.name} = '
-                                   f'({output.expr}, {{"vidarr_label": "{vidarr_label}"}})')
+                                   f'({expr}, {{"vidarr_label": "{vidarr_label}"}})')
                 elif isinstance(output.type, WDL.Type.File) and output.type.optional:
                     # Here we need to convert File? to Pair[File, Map[String,String]]?, but the WDL workflow that we are working
                     # with does not have a Pair[File, Map[String,String]]? to reference, and nor does Cromwell (WDL 1.0) support
@@ -275,34 +878,122 @@ def convert(doc: WDL.Document) -> Dict[str, Any]:
                     # and the add_empty_optional_pair_for_vidarr_labels block removed.
                     add_empty_optional_pair_for_vidarr_labels = True
                     output_line = (f'Pair[File, Map[String,String]]? {output.name} = '
-                                   f'if defined({output.expr}) then '
-                                   f'(select_first([{output.expr}]), {{"vidarr_label": "{vidarr_label}"}}) '
+                                   f'if defined({expr}) then '
+                                   f'(select_first([{expr}]), {{"vidarr_label": "{vidarr_label}"}}) '
                                    f'else empty_optional_pair')
+                elif _output_index.get(_type_key(output.type)) == "file-with-labels":
+                    # Already a file with labels, so add the label to the map of labels
+                    if not isinstance(output.expr, WDL.Expr.Pair) or not isinstance(output.expr.right, WDL.Expr.Map):
+                        raise ValueError(f"vidarr_label requires {output.name} to be a pair of a file and a map literal")
+                    labels = output.expr.right
+                    label_entry = f'"vidarr_label": "{vidarr_label}"'
+                    if labels.items:
+                        (_, insert_at) = _span(line_offsets, labels.items[-1][1].pos)
+                        label_entry = ", " + label_entry
+                    else:
+                        (_, insert_at) = _span(line_offsets, labels.pos)
+                        insert_at -= 1
+                    edits.append((insert_at, insert_at, label_entry))
+                    continue
                 else:
                     raise ValueError(f"vidarr_label does not support {output.type}")
 
-                wdl_doc[source_line] = wdl_doc[source_line][:start_position] + output_line + wdl_doc[source_line][end_position + 1:]
+                (start, end) = _span(line_offsets, output.pos)
+                edits.append((start, end, output_line))
 
     if add_empty_optional_pair_for_vidarr_labels:
-        workflow_section_end_position = doc.workflow.pos.end_line - 1
+        # Insert a line before the one that closes the workflow
+        workflow_section_end = line_offsets[doc.workflow.pos.end_line - 1]
         # if(...) Pair[...] empty_optional_pair results in the type for empty_optional_pair being updated to Pair[...]?
         # see https://github.com/openwdl/wdl/blob/legacy/versions/1.0/SPEC.md#conditionals for more details
-        output_line = f'if (false) {{ Pair[File, Map[String,String]] empty_optional_pair = ("",{{}}) }}'
-        wdl_doc.insert(workflow_section_end_position, output_line)
+        output_line = f'if (false) {{ Pair[File, Map[String,String]] empty_optional_pair = ("",{{}}) }}\n'
+        edits.append((workflow_section_end, workflow_section_end, output_line))
+    return _apply_edits(source_text, edits)
+
+
+def _accessory_files(doc: WDL.Document) -> Dict[str, str]:
+    """
+    Collect the source of every file imported by a document, directly or indirectly, exactly once
+
+    Direct imports are named by the URI used to import them. Indirect imports are named by their path relative to the
+    document, which is where a relative import from the file that imports them will look for them, unless they were
+    imported from a URL; a file outside the document's directory has a name starting with ``../``, just like a direct
+    import written that way.
+
+    Files are identified by their resolved path, not their contents: the workflow engine finds each import by its
+    name, so identical files imported under different names, including through a symbolic link, must all be included.
+    """
+    root_directory = os.path.dirname(doc.pos.abspath)
+    files = {}
+    seen = {doc.pos.abspath}
+    pending = []
+    for imported in doc.imports:
+        if imported.doc.pos.abspath not in seen:
+            seen.add(imported.doc.pos.abspath)
+            files[imported.uri] = imported.doc.source_text
+            pending.append(imported.doc)
+    while pending:
+        for imported in pending.pop(0).imports:
+            abspath = imported.doc.pos.abspath
+            if abspath in seen:
+                continue
+            seen.add(abspath)
+            name = abspath if _is_url(abspath) else os.path.relpath(abspath, root_directory)
+            files[name] = imported.doc.source_text
+            pending.append(imported.doc)
+    return files
+
+
+def convert(doc: WDL.Document) -> Dict[str, Any]:
+    """
+    Convert a parsed WDL file into a Vidarr workflow definition
+    :param doc:  the parsed WDL file
+    :return: the Vidarr configuration object
+    """
+    workflow_name = doc.workflow.name
+    with vidarr.timing.phase("structs"):
+        structures = _map_structures(doc.struct_typedefs)
+    vidarr.timing.count("structs", len(structures))
+
+    def read_output(output: WDL.Decl):
+        output_metadata = doc.workflow.meta.get(
+            "output_meta", {}).get(
+            output.name, {})
+        if isinstance(
+                output_metadata,
+                dict) and "vidarr_type" in output_metadata:
+            if "vidarr_label" in output_metadata:
+                # Standard output may be carrying the converted workflows, so warnings must not be written there
+                sys.stderr.write("Warning: There is a label inside output_meta that is being overriden by the specified "
+                                 "vidarr_type\n")
+            return output_metadata["vidarr_type"]
+        else:
+            return _map_output(
+                doc, output, output.type, True, doc.struct_typedefs)
+
+    with vidarr.timing.phase("inputs"):
+        workflow_inputs = _map_inputs(doc, structures)
+    vidarr.timing.count("inputs", len(workflow_inputs))
+
+    with vidarr.timing.phase("outputs"):
+        workflow_source = _label_outputs(doc)
+        outputs = {
+            workflow_name + "." + output.name:
+                read_output(output)
+            for output in doc.workflow.outputs}
+    vidarr.timing.count("outputs", len(outputs))
+    accessory_files = _accessory_files(doc)
+    vidarr.timing.count("imports", len(accessory_files))
 
     workflow = {
         'language': 'WDL_' + str(
             doc.wdl_version).replace(
             ".",
             "_"),
-        'outputs': {
-            workflow_name + "." + output.name:
-                read_output(output)
-            for output in doc.workflow.outputs},
+        'outputs': outputs,
         'parameters': workflow_inputs,
-        'workflow': '\n'.join(wdl_doc),
-        'accessoryFiles': {
-            imported.uri: imported.doc.source_text for imported in doc.imports}}
+        'workflow': workflow_source,
+        'accessoryFiles': accessory_files}
 
     return workflow
 
@@ -314,28 +1005,127 @@ def main():
         "-i",
         "--input-wdl-path",
         required=True,
-        help="Source wdl path")
+        nargs="+",
+        help="Source wdl path; if multiple paths or a glob are provided, all files are converted in batch mode and "
+             "the results are written as JSON lines")
     parser.add_argument(
         "-o",
         "--output-path",
         required=False,
         help="Output a file with contents of the workflow parameter dict")
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        type=int,
+        default=None,
+        help="Number of worker processes to use in batch mode; defaults to the number of CPUs")
+    parser.add_argument(
+        "--cache-dir",
+        default=vidarr.cache.default_directory(),
+        help="Directory to cache converted workflows in")
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Always load and convert the WDL files instead of using previously converted workflows")
+    parser.add_argument(
+        "--trust-validated",
+        action="store_true",
+        help="Skip typechecking any WDL file the cache records as having passed typechecking with the same contents and "
+             "imports; only use this for sources that have already been checked, such as in CI")
+    parser.add_argument(
+        "--json-format",
+        choices=sorted(vidarr.emit.STYLES),
+        default=None,
+        help="Layout of the JSON output: default, pretty (indented with sorted keys), compact (no whitespace), or "
+             "canonical (compact with sorted keys); defaults to pretty on standard output and default otherwise")
+    parser.add_argument(
+        "--timings",
+        nargs="?",
+        const="-",
+        default=None,
+        help=f"Write a JSON report of the time spent in each phase to a file, or standard error if no file is given; "
+             f"may also be set using the {vidarr.timing.TIMINGS_ENV} environment variable")
+    parser.add_argument(
+        "--profile",
+        default=None,
+        help="Profile the conversion and write the cProfile statistics to a file")
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="Keep running and convert the WDL file again each time it or any file it imports changes")
+    parser.add_argument(
+        "--mirror-dir",
+        default=None,
+        help="Read imported URLs through the local copies in this directory, fetching only the ones that are missing; "
+             "with --offline or --prefetch, defaults to the VIDARR_MIRROR_DIR environment variable or imports in the "
+             "cache directory")
+    parser.add_argument(
+        "--offline",
+        action="store_true",
+        help="Only read imported URLs from the mirror instead of fetching ones that are missing")
+    parser.add_argument(
+        "--prefetch",
+        action="store_true",
+        help="Fetch every URL imported by the WDL files into the mirror, replacing any copies already there, instead "
+             "of converting them")
     args = parser.parse_args()
+    vidarr.timing.enable(args.timings)
+    vidarr.timing.profile(args.profile)
+    cache = None if args.no_cache else vidarr.cache.Cache(args.cache_dir)
+    if args.trust_validated and not TRUST_SUPPORTED:
+        sys.stderr.write("--trust-validated has not been tested with the installed miniwdl release; typechecking every "
+                         "file.\n")
+    # The mirror is only used when asked for, so imported URLs are otherwise always fetched fresh
+    mirror = vidarr.mirror.Mirror(args.mirror_dir, offline=args.offline) if args.mirror_dir or args.offline else None
 
-    if args.output_path:
-        workflow = parse(args.input_wdl_path)
-        parent_dir = os.path.dirname(args.output_path)
-        if parent_dir:
-            os.makedirs(parent_dir, exist_ok=True)
-        with open(args.output_path, "w") as output_file:
-            json.dump(workflow, output_file)
-    else:
-        json.dump(
-            parse(
-                args.input_wdl_path),
-            sys.stdout,
-            indent=4,
-            sort_keys=True)
+    if args.prefetch:
+        for path in _expand_paths(args.input_wdl_path):
+            for uri in prefetch(path, args.mirror_dir):
+                print(uri)
+        return
+
+    batch = len(args.input_wdl_path) > 1 or any(glob.has_magic(path) for path in args.input_wdl_path)
+    if args.watch:
+        if batch:
+            parser.error("--watch can only be used with a single WDL file")
+        if args.output_path:
+            watch(args.input_wdl_path[0],
+                  lambda workflow: vidarr.emit.dump(args.output_path, workflow, args.json_format or "default"),
+                  mirror=mirror)
+        else:
+            def write_stdout(workflow: Dict[str, Any]):
+                vidarr.emit.write_stdout(workflow, args.json_format or "pretty")
+                sys.stdout.write("\n")
+
+            watch(args.input_wdl_path[0], write_stdout, mirror=mirror)
+        return
+
+    if batch:
+        if args.json_format == "pretty":
+            parser.error("Batch mode writes one JSON object per line, so it cannot use the pretty format")
+        output_file = open(args.output_path, "wb") if args.output_path else sys.stdout.buffer
+        ok = True
+        try:
+            with vidarr.timing.phase("batch"):
+                for result in parse_many(args.input_wdl_path, args.jobs, cache, mirror, args.trust_validated):
+                    ok = ok and "error" not in result
+                    written = vidarr.emit.write(result, output_file, args.json_format or "default")
+                    output_file.write(b"\n")
+                    output_file.flush()
+                    vidarr.timing.count("files")
+                    vidarr.timing.count("bytes_written", written + 1)
+        finally:
+            if args.output_path:
+                output_file.close()
+        sys.exit(0 if ok else 1)
+
+    workflow = parse(args.input_wdl_path[0], cache, mirror, args.trust_validated)
+    with vidarr.timing.phase("write"):
+        if args.output_path:
+            written = vidarr.emit.dump(args.output_path, workflow, args.json_format or "default")
+        else:
+            written = vidarr.emit.write_stdout(workflow, args.json_format or "pretty")
+    vidarr.timing.count("bytes_written", written)
 
 
 if __name__ == "__main__":